@@ -0,0 +1,122 @@
+"""
+推理服务压测脚本
+以固定并发向 /predict 持续发送同一张图片，统计 QPS、延迟分位数与状态码分布，
+并读取服务端 /metrics 中的平均批大小
+
+用法:
+    python scripts/load_test.py --url http://127.0.0.1:8000/predict --image data/image/bus.jpg
+    python scripts/load_test.py --url http://127.0.0.1:8000/predict --image data/image/bus.jpg --concurrency 32 --duration 30
+    python scripts/load_test.py --url http://127.0.0.1:8000/predict --image data/image/bus.jpg --requests 1000 --output results/load_test.json
+"""
+
+import sys
+import json
+import time
+import asyncio
+import argparse
+from collections import Counter
+from pathlib import Path
+
+try:
+    import aiohttp
+except ImportError:
+    print("❌ 错误: 未安装 'aiohttp'，请运行 pip install -r requirements.txt")
+    sys.exit(1)
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+async def worker(session, url, payload, deadline, budget, latencies, statuses):
+    """单个并发连接：循环发送请求直到超时或请求数用完"""
+    while time.perf_counter() < deadline and budget['left'] > 0:
+        budget['left'] -= 1
+        t0 = time.perf_counter()
+        try:
+            async with session.post(url, data=payload, headers={'Content-Type': 'application/octet-stream'}) as resp:
+                await resp.read()
+                statuses[resp.status] += 1
+                if resp.status == 200:
+                    latencies.append((time.perf_counter() - t0) * 1000)
+        except aiohttp.ClientError as e:
+            statuses[type(e).__name__] += 1
+
+
+async def run(args):
+    payload = Path(args.image).read_bytes()
+    latencies = []
+    statuses = Counter()
+    budget = {'left': args.requests or float('inf')}
+    timeout = aiohttp.ClientTimeout(total=args.timeout)
+    connector = aiohttp.TCPConnector(limit=args.concurrency)
+
+    async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
+        start = time.perf_counter()
+        deadline = start + args.duration
+        await asyncio.gather(*[
+            worker(session, args.url, payload, deadline, budget, latencies, statuses)
+            for _ in range(args.concurrency)
+        ])
+        elapsed = time.perf_counter() - start
+
+        server_metrics = {}
+        metrics_url = args.url.rsplit('/', 1)[0] + '/metrics?format=json'
+        try:
+            async with session.get(metrics_url) as resp:
+                if resp.status == 200:
+                    server_metrics = await resp.json()
+        except aiohttp.ClientError:
+            pass
+
+    latencies.sort()
+    return {
+        'concurrency': args.concurrency,
+        'seconds': round(elapsed, 2),
+        'requests': sum(statuses.values()),
+        'ok': statuses.get(200, 0),
+        'rejected_503': statuses.get(503, 0),
+        'statuses': {str(k): v for k, v in statuses.items()},
+        'qps': round(statuses.get(200, 0) / elapsed, 2) if elapsed > 0 else 0.0,
+        'latency_p50_ms': round(percentile(latencies, 0.5), 2),
+        'latency_p90_ms': round(percentile(latencies, 0.9), 2),
+        'latency_p99_ms': round(percentile(latencies, 0.99), 2),
+        'latency_max_ms': round(latencies[-1], 2) if latencies else 0.0,
+        'server_avg_batch_size': server_metrics.get('avg_batch_size'),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test for the YOLOv8 inference server")
+    parser.add_argument('--url', type=str, default='http://127.0.0.1:8000/predict', help="推理接口地址")
+    parser.add_argument('--image', type=str, required=True, help="发送的测试图片")
+    parser.add_argument('--concurrency', type=int, default=16, help="并发连接数")
+    parser.add_argument('--duration', type=float, default=20.0, help="压测时长（秒）")
+    parser.add_argument('--requests', type=int, default=None, help="总请求数上限（先到者为准）")
+    parser.add_argument('--timeout', type=float, default=30.0, help="单个请求超时（秒）")
+    parser.add_argument('--output', type=str, default=None, help="结果 JSON 输出路径")
+    args = parser.parse_args()
+
+    print(f"🚀 压测 {args.url}: 并发 {args.concurrency}, 时长 {args.duration}s")
+    report = asyncio.run(run(args))
+
+    print("=" * 60)
+    print(f"✅ 成功 {report['ok']} / {report['requests']} 请求，拒绝(503) {report['rejected_503']}")
+    print(f"⚡ QPS: {report['qps']}")
+    print(f"⏱️ 延迟 p50 {report['latency_p50_ms']} ms | p90 {report['latency_p90_ms']} ms | "
+          f"p99 {report['latency_p99_ms']} ms | max {report['latency_max_ms']} ms")
+    if report['server_avg_batch_size'] is not None:
+        print(f"📦 服务端平均批大小: {report['server_avg_batch_size']}")
+    print(f"📊 状态码: {report['statuses']}")
+
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"💾 结果已保存: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,359 @@
+# -*- coding: utf-8 -*-
+"""
+项目配置加载 (Central Config Loader)
+
+功能描述:
+    1. 统一读取 config.yaml，缺失的键使用内置默认值补齐
+    2. 按文件路径与修改时间缓存解析结果，重复调用不再读盘
+    3. 支持环境变量覆盖: MY_YOLO_<SECTION>__<KEY>=value，例如 MY_YOLO_DETECTION__IMG_SIZE=1280
+    4. 支持命令行覆盖: --set detection.max_det=100 --set training.workers=4
+    5. 加载后统一校验类型与取值范围，错误一次性列出
+
+使用方法:
+    from config import load_config, add_config_args, config_from_args
+
+    cfg = load_config('config.yaml')
+    cfg['detection']['conf_threshold']
+
+    parser = argparse.ArgumentParser()
+    add_config_args(parser)              # 增加 --config / --set
+    cfg = config_from_args(parser.parse_args())
+
+    # 覆盖优先级: 命令行专用参数 > --set > 环境变量 > config.yaml > 默认值
+
+作者: my_yolo Team
+日期: 2026-10-16
+"""
+
+import os
+import copy
+import logging
+import argparse
+from functools import lru_cache
+from pathlib import Path
+from typing import List, Optional
+
+import yaml
+
+logger = logging.getLogger(__name__)
+
+ENV_PREFIX = 'MY_YOLO_'
+
+# 与 config.yaml 保持一致的默认值，配置文件缺失或缺键时使用
+DEFAULT_CONFIG = {
+    'models': {
+        'yolov8n': 'yolov8n.pt',
+        'yolov8s': 'yolov8s.pt',
+        'yolov8m': 'yolov8m.pt',
+        'default': 'yolov8n.pt',
+    },
+    'model_pool': {
+        'max_models': 3,
+        'warmup_runs': 1,
+    },
+    'paths': {
+        'weights': 'weights',
+        'datasets': 'datasets',
+        'outputs': 'outputs',
+        'results': 'results',
+        'logs': 'logs',
+    },
+    'detection': {
+        'conf_threshold': 0.25,
+        'iou_threshold': 0.45,
+        'max_det': 300,
+        'img_size': 640,
+        'batch': 1,
+        'half': False,
+    },
+    'slicing': {
+        'tile_size': 640,
+        'overlap': 0.2,
+        'tile_batch': 0,
+        'merge_iou': 0.5,
+        'merge_ios': 0.6,
+        'include_full': True,
+    },
+    'video_io': {
+        'backend': 'opencv',
+        'decode_size': 0,
+        'threads': 0,
+        'hwaccel': False,
+    },
+    'motion': {
+        'method': 'diff',
+        'rois': [],
+        'pixel_threshold': 25,
+        'min_area': 0.002,
+        'downscale_width': 320,
+        'crop': True,
+        'pad': 0.05,
+        'refresh_interval': 30,
+    },
+    'training': {
+        'epochs': 100,
+        'batch_size': 16,
+        'img_size': 640,
+        'patience': 50,
+        'save_period': 10,
+        'workers': 8,
+        'lr0': 0.01,
+        'lrf': 0.01,
+        'mmap_cache': False,
+        'cache': False,
+    },
+    'distillation': {
+        'teacher': 'yolov8m.pt',
+        'teacher_epochs': 0,
+        'alpha': 1.0,
+        'temperature': 2.0,
+        'teacher_cache': False,
+        'pseudo_conf': 0.5,
+        'match_iou': 0.5,
+    },
+    'server': {
+        'host': '127.0.0.1',
+        'port': 8000,
+        'max_batch': 8,
+        'max_wait_ms': 10.0,
+        'max_queue': 64,
+    },
+    'benchmark': {
+        'warmup_runs': 10,
+        'test_runs': 100,
+        'test_image': 'assets/test.jpg',
+    },
+    'applications': {
+        'counter': {
+            'classes': ['person', 'car', 'bicycle'],
+            'line_position': 0.5,
+        },
+        'safety': {
+            'alert_classes': ['person', 'car'],
+            'alert_threshold': 3,
+            'debounce_seconds': 1.0,
+            'cooldown_seconds': 10.0,
+        },
+        'interactive': {
+            'default_classes': ['person', 'car', 'dog', 'cat'],
+        },
+    },
+    'visualization': {
+        'line_thickness': 2,
+        'font_scale': 0.5,
+        'show_conf': True,
+        'show_class': True,
+        'colors': 'auto',
+    },
+}
+
+# 校验规则: 点分路径 -> (类型, 最小值, 最大值)，None 表示不限
+_SCHEMA = {
+    'model_pool.max_models': (int, 1, None),
+    'model_pool.warmup_runs': (int, 0, None),
+    'detection.conf_threshold': (float, 0.0, 1.0),
+    'detection.iou_threshold': (float, 0.0, 1.0),
+    'detection.max_det': (int, 1, None),
+    'detection.img_size': (int, 32, None),
+    'detection.batch': (int, 1, None),
+    'detection.half': (bool, None, None),
+    'slicing.tile_size': (int, 32, None),
+    'slicing.overlap': (float, 0.0, 0.9),
+    'slicing.tile_batch': (int, 0, None),
+    'slicing.merge_iou': (float, 0.0, 1.0),
+    'slicing.merge_ios': (float, 0.0, 1.0),
+    'slicing.include_full': (bool, None, None),
+    'video_io.backend': (str, None, None),
+    'video_io.decode_size': (int, 0, None),
+    'video_io.threads': (int, 0, None),
+    'video_io.hwaccel': (bool, None, None),
+    'motion.method': (str, None, None),
+    'motion.rois': (list, None, None),
+    'motion.pixel_threshold': (int, 0, 255),
+    'motion.min_area': (float, 0.0, 1.0),
+    'motion.downscale_width': (int, 16, None),
+    'motion.crop': (bool, None, None),
+    'motion.pad': (float, 0.0, 0.5),
+    'motion.refresh_interval': (int, 0, None),
+    'training.epochs': (int, 1, None),
+    'training.batch_size': (int, -1, None),   # -1 表示由 ultralytics 自动选择
+    'training.img_size': (int, 32, None),
+    'training.patience': (int, 0, None),
+    'training.save_period': (int, -1, None),  # -1 表示不按周期保存
+    'training.workers': (int, 0, None),
+    'training.lr0': (float, 0.0, None),
+    'training.lrf': (float, 0.0, None),
+    'training.mmap_cache': (bool, None, None),
+    'distillation.teacher': (str, None, None),
+    'distillation.teacher_epochs': (int, 0, None),   # 0 表示与学生训练轮数相同
+    'distillation.alpha': (float, 0.0, None),
+    'distillation.temperature': (float, 0.0, None),
+    'distillation.teacher_cache': (bool, None, None),
+    'distillation.pseudo_conf': (float, 0.0, 1.0),
+    'distillation.match_iou': (float, 0.0, 1.0),
+    'server.host': (str, None, None),
+    'server.port': (int, 1, 65535),
+    'server.max_batch': (int, 1, None),
+    'server.max_wait_ms': (float, 0.0, None),
+    'server.max_queue': (int, 1, None),
+    'benchmark.warmup_runs': (int, 0, None),
+    'benchmark.test_runs': (int, 1, None),
+    'benchmark.test_image': (str, None, None),
+    'applications.counter.classes': (list, None, None),
+    'applications.counter.line_position': (float, 0.0, 1.0),
+    'applications.safety.alert_classes': (list, None, None),
+    'applications.safety.alert_threshold': (int, 1, None),
+    'applications.safety.debounce_seconds': (float, 0.0, None),
+    'applications.safety.cooldown_seconds': (float, 0.0, None),
+}
+
+
+def _deep_update(base: dict, update: dict) -> dict:
+    """递归合并字典，update 中的值覆盖 base"""
+    for key, value in (update or {}).items():
+        if isinstance(value, dict) and isinstance(base.get(key), dict):
+            _deep_update(base[key], value)
+        else:
+            base[key] = value
+    return base
+
+
+def _set_path(cfg: dict, dotted: str, value):
+    """按点分路径设置值，中间层不存在时自动创建"""
+    keys = dotted.split('.')
+    node = cfg
+    for key in keys[:-1]:
+        node = node.setdefault(key, {})
+    node[keys[-1]] = value
+
+
+def _get_path(cfg: dict, dotted: str):
+    node = cfg
+    for key in dotted.split('.'):
+        if not isinstance(node, dict) or key not in node:
+            return None
+        node = node[key]
+    return node
+
+
+@lru_cache(maxsize=8)
+def _read_config_file(path: str, mtime_ns: int) -> dict:
+    """解析配置文件；mtime 参与缓存键，文件修改后自动重新读取"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return yaml.safe_load(f) or {}
+
+
+def _env_overrides() -> List[str]:
+    """把 MY_YOLO_DETECTION__IMG_SIZE=1280 形式的环境变量转为 detection.img_size=1280"""
+    overrides = []
+    for name, value in os.environ.items():
+        if name.startswith(ENV_PREFIX) and '__' in name:
+            dotted = name[len(ENV_PREFIX):].lower().replace('__', '.')
+            overrides.append(f"{dotted}={value}")
+    return sorted(overrides)
+
+
+def apply_overrides(cfg: dict, overrides: Optional[List[str]]) -> dict:
+    """
+    应用 key=value 形式的覆盖项，value 按 YAML 语法解析（数字、布尔、列表均可）
+
+    Args:
+        cfg (dict): 待修改的配置
+        overrides (list): 例如 ['detection.max_det=100', 'applications.counter.classes=[person, car]']
+    """
+    for item in overrides or []:
+        key, sep, raw = item.partition('=')
+        if not sep or not key.strip():
+            raise ValueError(f"Invalid config override '{item}', expected section.key=value")
+        _set_path(cfg, key.strip(), yaml.safe_load(raw) if raw.strip() else None)
+    return cfg
+
+
+def validate_config(cfg: dict) -> dict:
+    """
+    校验并规范化配置（整数写成的浮点项转换为 float）
+
+    Raises:
+        ValueError: 列出全部不合法的配置项
+    """
+    errors = []
+    for dotted, (kind, lo, hi) in _SCHEMA.items():
+        value = _get_path(cfg, dotted)
+        if kind is float and isinstance(value, int) and not isinstance(value, bool):
+            value = float(value)
+            _set_path(cfg, dotted, value)
+        if not isinstance(value, kind) or (kind is int and isinstance(value, bool)):
+            errors.append(f"{dotted}: expected {kind.__name__}, got {value!r}")
+            continue
+        if lo is not None and value < lo or hi is not None and value > hi:
+            errors.append(f"{dotted}: {value} out of range [{lo}, {'inf' if hi is None else hi}]")
+
+    for dotted in ('detection.img_size', 'training.img_size'):
+        value = _get_path(cfg, dotted)
+        if isinstance(value, int) and value % 32:
+            logger.warning(f"⚠️ {dotted}={value} is not a multiple of 32, the model will round it up.")
+
+    if _get_path(cfg, 'training.cache') is True:
+        # ultralytics 中 cache=True 等同于 'ram'
+        _set_path(cfg, 'training.cache', 'ram')
+    if _get_path(cfg, 'training.cache') not in (False, 'ram', 'disk'):
+        errors.append(f"training.cache: expected false, true/'ram' or 'disk', got {_get_path(cfg, 'training.cache')!r}")
+    if _get_path(cfg, 'distillation.temperature') == 0:
+        errors.append("distillation.temperature: must be > 0")
+    if _get_path(cfg, 'video_io.backend') not in ('opencv', 'pyav', 'ffmpeg'):
+        errors.append(f"video_io.backend: expected opencv/pyav/ffmpeg, got {_get_path(cfg, 'video_io.backend')!r}")
+    if _get_path(cfg, 'motion.method') not in ('diff', 'mog2'):
+        errors.append(f"motion.method: expected 'diff' or 'mog2', got {_get_path(cfg, 'motion.method')!r}")
+    for roi in _get_path(cfg, 'motion.rois') or []:
+        if (not isinstance(roi, (list, tuple)) or len(roi) != 4 or
+                not all(isinstance(v, (int, float)) and 0 <= v <= 1 for v in roi) or
+                roi[0] >= roi[2] or roi[1] >= roi[3]):
+            errors.append(f"motion.rois: {roi!r} is not a normalized [x0, y0, x1, y1] box")
+
+    if errors:
+        raise ValueError("Invalid configuration:\n  " + "\n  ".join(errors))
+    return cfg
+
+
+def load_config(config_path: str = 'config.yaml', overrides: Optional[List[str]] = None,
+                use_env: bool = True) -> dict:
+    """
+    加载项目配置
+
+    Args:
+        config_path (str): 配置文件路径，不存在时只使用默认值
+        overrides (list): section.key=value 形式的覆盖项（优先级高于环境变量）
+        use_env (bool): 是否应用 MY_YOLO_ 前缀的环境变量
+
+    Returns:
+        dict: 合并、校验后的配置（每次返回独立副本，可放心修改）
+    """
+    cfg = copy.deepcopy(DEFAULT_CONFIG)
+    path = Path(config_path)
+    if path.is_file():
+        _deep_update(cfg, copy.deepcopy(_read_config_file(str(path.resolve()), path.stat().st_mtime_ns)))
+    else:
+        logger.warning(f"⚠️ Config not found: {config_path}, using default settings.")
+
+    if use_env:
+        apply_overrides(cfg, _env_overrides())
+    apply_overrides(cfg, overrides)
+    return validate_config(cfg)
+
+
+def add_config_args(parser: argparse.ArgumentParser):
+    """为命令行增加 --config 与 --set 参数"""
+    parser.add_argument('--config', type=str, default='config.yaml',
+                        help="项目配置文件路径")
+    parser.add_argument('--set', dest='config_overrides', action='append', default=[], metavar='KEY=VALUE',
+                        help="覆盖配置项，可重复，例如 --set detection.max_det=100")
+
+
+def config_from_args(args: argparse.Namespace) -> dict:
+    """根据 add_config_args 添加的参数加载配置"""
+    return load_config(args.config, args.config_overrides)
+
+
+def pick(value, default):
+    """命令行参数未显式指定 (None) 时回退到配置值"""
+    return default if value is None else value
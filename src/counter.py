@@ -0,0 +1,290 @@
+# -*- coding: utf-8 -*-
+"""
+越线计数 (Line-Crossing Object Counter)
+
+功能描述:
+    1. 读取 config.yaml 中 applications.counter 的计数类别与归一化计数线位置
+    2. 轻量多目标跟踪：匀速运动预测 + NumPy 批量 IoU 关联（按类别门控）
+    3. 按类别统计穿越计数线的目标（向下为 in，向上为 out），每个轨迹只计一次
+    4. 周期性输出计数（日志 + 可选 JSONL），并在视频帧上绘制计数线与计数
+
+使用方法:
+    python task1.py --mode video --source data/video/test.mp4 --count
+    python task1.py --mode camera --realtime --count --count-interval 10 --output results/task1/counts.jsonl
+
+作者: my_yolo Team
+日期: 2026-10-16
+"""
+
+import json
+import time
+import logging
+from pathlib import Path
+from typing import List, Optional, Union
+
+import cv2
+import numpy as np
+
+from config import load_config
+
+logger = logging.getLogger(__name__)
+
+
+def box_iou(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """批量计算两组 xyxy 框的 IoU 矩阵 (N, M)"""
+    tl = np.maximum(a[:, None, :2], b[None, :, :2])
+    br = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    inter = np.prod(np.clip(br - tl, 0, None), axis=2)
+    area_a = np.prod(a[:, 2:] - a[:, :2], axis=1)
+    area_b = np.prod(b[:, 2:] - b[:, :2], axis=1)
+    return inter / (area_a[:, None] + area_b[None, :] - inter + 1e-9)
+
+
+def greedy_match(iou: np.ndarray, threshold: float):
+    """
+    按 IoU 从高到低贪心匹配
+
+    Returns:
+        tuple: (track 下标数组, detection 下标数组)
+    """
+    rows, cols = np.nonzero(iou >= threshold)
+    if len(rows) == 0:
+        return rows, cols
+    # 常见情况：每个轨迹/检测最多只有一个候选，无冲突，直接全部接受
+    if len(np.unique(rows)) == len(rows) and len(np.unique(cols)) == len(cols):
+        return rows, cols
+
+    order = np.argsort(-iou[rows, cols], kind='stable')
+    used_rows, used_cols = set(), set()
+    matched_rows, matched_cols = [], []
+    for r, c in zip(rows[order], cols[order]):
+        if r in used_rows or c in used_cols:
+            continue
+        used_rows.add(r)
+        used_cols.add(c)
+        matched_rows.append(r)
+        matched_cols.append(c)
+    return np.array(matched_rows, dtype=np.int64), np.array(matched_cols, dtype=np.int64)
+
+
+class IoUTracker:
+    """匀速模型 + IoU 关联的轻量多目标跟踪器，所有轨迹状态保存在 NumPy 数组中"""
+
+    def __init__(self, iou_threshold: float = 0.3, max_age: int = 15, momentum: float = 0.5):
+        """
+        Args:
+            iou_threshold (float): 预测框与检测框关联的最小 IoU
+            max_age (int): 轨迹连续多少次未匹配后删除
+            momentum (float): 速度平滑系数，越大越依赖最新位移
+        """
+        self.iou_threshold = iou_threshold
+        self.max_age = max_age
+        self.momentum = momentum
+        self.boxes = np.zeros((0, 4), dtype=np.float32)
+        self.velocity = np.zeros((0, 4), dtype=np.float32)
+        self.classes = np.zeros(0, dtype=np.int64)
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.misses = np.zeros(0, dtype=np.int32)
+        self._next_id = 1
+
+    def update(self, boxes: np.ndarray, classes: np.ndarray) -> dict:
+        """
+        用一帧检测结果更新轨迹
+
+        Args:
+            boxes (np.ndarray): (N, 4) xyxy 检测框
+            classes (np.ndarray): (N,) 类别 ID
+
+        Returns:
+            dict: 本帧匹配上的轨迹 ids / classes、更新前后的框 prev_boxes / boxes，以及被删除的轨迹 removed
+        """
+        boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        classes = np.asarray(classes, dtype=np.int64).reshape(-1)
+
+        # 预测：按平滑速度外推一步
+        predicted = self.boxes + self.velocity
+        if len(predicted) and len(boxes):
+            iou = box_iou(predicted, boxes)
+        else:
+            iou = np.zeros((len(predicted), len(boxes)))
+        if iou.size:
+            iou[self.classes[:, None] != classes[None, :]] = 0.0
+        track_idx, det_idx = greedy_match(iou, self.iou_threshold)
+
+        prev_boxes = self.boxes[track_idx].copy()
+        self.velocity[track_idx] = (self.momentum * (boxes[det_idx] - prev_boxes)
+                                    + (1 - self.momentum) * self.velocity[track_idx])
+        self.boxes[track_idx] = boxes[det_idx]
+        self.misses += 1
+        self.misses[track_idx] = 0
+        matched_ids = self.ids[track_idx]
+
+        # 未匹配的检测创建新轨迹
+        new_mask = np.ones(len(boxes), dtype=bool)
+        new_mask[det_idx] = False
+        n_new = int(new_mask.sum())
+        if n_new:
+            new_ids = np.arange(self._next_id, self._next_id + n_new, dtype=np.int64)
+            self._next_id += n_new
+            self.boxes = np.concatenate([self.boxes, boxes[new_mask]])
+            self.velocity = np.concatenate([self.velocity, np.zeros((n_new, 4), dtype=np.float32)])
+            self.classes = np.concatenate([self.classes, classes[new_mask]])
+            self.ids = np.concatenate([self.ids, new_ids])
+            self.misses = np.concatenate([self.misses, np.zeros(n_new, dtype=np.int32)])
+
+        # 删除长时间未匹配的轨迹
+        alive = self.misses <= self.max_age
+        removed = self.ids[~alive]
+        if len(removed):
+            self.boxes, self.velocity = self.boxes[alive], self.velocity[alive]
+            self.classes, self.ids, self.misses = self.classes[alive], self.ids[alive], self.misses[alive]
+
+        return {
+            'ids': matched_ids,
+            'classes': classes[det_idx],
+            'prev_boxes': prev_boxes,
+            'boxes': boxes[det_idx],
+            'removed': removed,
+        }
+
+    def __len__(self):
+        return len(self.ids)
+
+
+class LineCounter:
+    """
+    水平计数线越线计数器
+
+    作为 YOLODetector.detect_video_stream 的帧回调使用：hook(result, frame, fresh) -> frame，
+    fresh 为 True 时用新的检测结果更新跟踪与计数，每帧都会绘制计数线和当前计数
+    """
+
+    def __init__(self, classes: Optional[List[str]] = None, line_position: float = 0.5,
+                 report_interval: float = 5.0, output_path: Optional[Union[str, Path]] = None,
+                 tracker: Optional[IoUTracker] = None):
+        """
+        Args:
+            classes (list): 参与计数的类别名称，为空时统计全部类别
+            line_position (float): 计数线的归一化纵坐标 (0~1)
+            report_interval (float): 周期性输出计数的间隔（秒）
+            output_path (str): 计数记录 JSONL 输出路径，每个周期追加一行
+            tracker (IoUTracker): 自定义跟踪器，默认使用 IoUTracker()
+        """
+        self.class_names = list(classes or [])
+        self.line_position = float(line_position)
+        self.report_interval = report_interval
+        self.tracker = tracker or IoUTracker()
+        self.names = {}
+        self.class_ids = None
+        self.counts = {}
+        self.frames = 0
+        self.update_seconds = 0.0
+        self._counted = set()
+        self._last_report = time.perf_counter()
+        self._file = None
+        if output_path:
+            Path(output_path).parent.mkdir(parents=True, exist_ok=True)
+            self._file = open(output_path, 'a', encoding='utf-8')
+
+    @classmethod
+    def from_config(cls, cfg: Optional[dict] = None, **kwargs) -> 'LineCounter':
+        """根据项目配置 (config.load_config) 的 applications.counter 创建计数器"""
+        counter_cfg = (cfg or load_config())['applications']['counter']
+        return cls(classes=counter_cfg['classes'], line_position=counter_cfg['line_position'], **kwargs)
+
+    def _resolve_classes(self, names: dict):
+        """把配置中的类别名称映射为模型类别 ID"""
+        self.names = names
+        if not self.class_names:
+            self.class_ids = None
+            return
+        lookup = {name: cid for cid, name in names.items()}
+        missing = [name for name in self.class_names if name not in lookup]
+        if missing:
+            logger.warning(f"⚠️ Counter classes not in model: {missing}")
+        self.class_ids = np.array([lookup[name] for name in self.class_names if name in lookup], dtype=np.int64)
+
+    def update(self, boxes: np.ndarray, classes: np.ndarray, height: int):
+        """
+        用一帧检测结果更新跟踪并统计越线
+
+        Args:
+            boxes (np.ndarray): (N, 4) xyxy 检测框
+            classes (np.ndarray): (N,) 类别 ID
+            height (int): 帧高度，用于换算计数线像素位置
+        """
+        t0 = time.perf_counter()
+        classes = np.asarray(classes, dtype=np.int64).reshape(-1)
+        boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        if self.class_ids is not None:
+            keep = np.isin(classes, self.class_ids)
+            boxes, classes = boxes[keep], classes[keep]
+
+        tracks = self.tracker.update(boxes, classes)
+        line_y = self.line_position * height
+        prev_y = (tracks['prev_boxes'][:, 1] + tracks['prev_boxes'][:, 3]) / 2
+        cur_y = (tracks['boxes'][:, 1] + tracks['boxes'][:, 3]) / 2
+        down = (prev_y < line_y) & (cur_y >= line_y)
+        up = (prev_y >= line_y) & (cur_y < line_y)
+
+        for i in np.nonzero(down | up)[0]:
+            track_id = int(tracks['ids'][i])
+            if track_id in self._counted:
+                continue
+            self._counted.add(track_id)
+            name = self.names.get(int(tracks['classes'][i]), str(tracks['classes'][i]))
+            entry = self.counts.setdefault(name, {'in': 0, 'out': 0})
+            entry['in' if down[i] else 'out'] += 1
+        self._counted.difference_update(tracks['removed'].tolist())
+
+        self.frames += 1
+        self.update_seconds += time.perf_counter() - t0
+        if time.perf_counter() - self._last_report >= self.report_interval:
+            self.report()
+
+    def __call__(self, result, frame: np.ndarray, fresh: bool = True) -> np.ndarray:
+        """帧回调：fresh 时更新计数，并在帧上绘制计数线与计数"""
+        if fresh:
+            if self.class_ids is None and not self.names:
+                self._resolve_classes(result.names)
+            boxes = result.boxes
+            self.update(boxes.xyxy.cpu().numpy(), boxes.cls.cpu().numpy(), result.orig_shape[0])
+        return self.draw(frame)
+
+    def draw(self, frame: np.ndarray) -> np.ndarray:
+        """在帧上绘制计数线与各类别计数（原地绘制）"""
+        h, w = frame.shape[:2]
+        line_y = int(self.line_position * h)
+        cv2.line(frame, (0, line_y), (w, line_y), (0, 255, 255), 2)
+        for i, (name, c) in enumerate(sorted(self.counts.items())):
+            cv2.putText(frame, f"{name}: in {c['in']} / out {c['out']}", (10, 30 + 25 * i),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 255), 2)
+        return frame
+
+    def summary(self) -> dict:
+        """当前计数与跟踪耗时"""
+        return {
+            'counts': {name: dict(c) for name, c in self.counts.items()},
+            'frames': self.frames,
+            'active_tracks': len(self.tracker),
+            'track_ms_per_frame': round(self.update_seconds / self.frames * 1000, 3) if self.frames else 0.0,
+        }
+
+    def report(self):
+        """输出一次周期计数（日志 + JSONL）"""
+        self._last_report = time.perf_counter()
+        summary = self.summary()
+        text = ', '.join(f"{name} in {c['in']}/out {c['out']}" for name, c in sorted(summary['counts'].items()))
+        logger.info(f"🔢 Counts: {text or 'none'} | tracks {summary['active_tracks']} | "
+                    f"tracking {summary['track_ms_per_frame']} ms/frame")
+        if self._file is not None:
+            record = {'time': time.strftime('%Y-%m-%d %H:%M:%S'), **summary}
+            self._file.write(json.dumps(record, ensure_ascii=False) + '\n')
+            self._file.flush()
+
+    def close(self):
+        """输出最终计数并关闭记录文件"""
+        self.report()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
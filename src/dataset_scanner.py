@@ -0,0 +1,361 @@
+# -*- coding: utf-8 -*-
+"""
+数据集校验与标签统计 (YOLO Dataset Scanner)
+
+功能描述:
+    1. 多进程并行遍历图片与标签目录：校验图片能否解码、标签是否缺失/为空/格式错误/类别或坐标越界
+    2. 按内容哈希查找重复图片，统计重复标注行
+    3. 统计各类别实例数与图片数（类别不均衡比）、检测框尺寸直方图（COCO small/medium/large）、图片尺寸分布
+    4. 扫描结果写入索引文件，再次扫描时只重新处理 mtime/大小发生变化的文件
+    5. 训练前自动执行：存在错误时在训练开始前终止，而不是训练数分钟后才失败
+
+使用方法:
+    python src/dataset_scanner.py data/custom_dataset/dataset.yaml
+    python src/dataset_scanner.py datasets/coco128/images/train2017 --nc 80 --workers 8
+    python src/task2.py --mode train --data data/custom_dataset/dataset.yaml   # 训练前自动扫描
+
+作者: my_yolo Team
+日期: 2026-10-16
+"""
+
+import os
+import json
+import time
+import hashlib
+import logging
+import argparse
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+import numpy as np
+import yaml
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+INDEX_VERSION = 1
+IMG_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.bmp', '.webp', '.tif', '.tiff'}
+# COCO 尺度划分（像素面积）
+SMALL_AREA, MEDIUM_AREA = 32 ** 2, 96 ** 2
+# 检测框边长（相对图片较长边 sqrt(w*h)）直方图分箱
+BOX_SIZE_BINS = [0.0, 0.02, 0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0]
+# 会导致训练失败或严重错误的问题，其余为警告
+ERROR_ISSUES = {'corrupt_image', 'bad_label_format', 'class_out_of_range', 'coords_out_of_range'}
+
+
+def label_path_for(image_path: str) -> str:
+    """与 ultralytics 相同的规则：路径中最后一个 /images/ 换成 /labels/，后缀换成 .txt"""
+    sa, sb = f"{os.sep}images{os.sep}", f"{os.sep}labels{os.sep}"
+    return sb.join(image_path.rsplit(sa, 1)).rsplit('.', 1)[0] + '.txt'
+
+
+def _stat(path: str) -> List[int]:
+    try:
+        st = os.stat(path)
+        return [st.st_mtime_ns, st.st_size]
+    except FileNotFoundError:
+        return [0, -1]
+
+
+def scan_file(task: tuple) -> dict:
+    """
+    校验单张图片及其标签（在工作进程中执行）
+
+    Args:
+        task (tuple): (图片路径, 类别数)，类别数为 None 时不检查类别越界
+
+    Returns:
+        dict: 索引记录（文件状态、尺寸、内容哈希、标注框与问题列表）
+    """
+    image_path, nc = task
+    label_path = label_path_for(image_path)
+    record = {'label': label_path, 'image_stat': _stat(image_path), 'label_stat': _stat(label_path),
+              'width': 0, 'height': 0, 'digest': None, 'boxes': [], 'issues': []}
+    issues = record['issues']
+
+    try:
+        data = Path(image_path).read_bytes()
+        record['digest'] = hashlib.blake2b(data, digest_size=16).hexdigest()
+        with Image.open(image_path) as im:
+            im.verify()
+        with Image.open(image_path) as im:
+            im.load()   # verify 不解码像素，截断的 JPEG 需要实际加载才能发现
+            record['width'], record['height'] = im.size
+    except Exception as e:
+        issues.append(f"corrupt_image: {e}")
+        return record
+
+    if record['label_stat'][1] < 0:
+        issues.append('missing_label')
+        return record
+    if record['label_stat'][1] == 0:
+        issues.append('empty_label')
+        return record
+
+    try:
+        with open(label_path, 'r', encoding='utf-8', errors='replace') as f:
+            lines = f.readlines()
+    except OSError as e:
+        issues.append(f"bad_label_format: unreadable ({e})")
+        return record
+
+    rows = []
+    for lineno, line in enumerate(lines, 1):
+        parts = line.split()
+        if not parts:
+            continue
+        try:
+            values = [float(v) for v in parts]
+        except ValueError:
+            issues.append(f"bad_label_format: line {lineno} is not numeric")
+            continue
+        if len(values) < 5 or (len(values) > 5 and len(values) % 2 == 0):
+            issues.append(f"bad_label_format: line {lineno} has {len(values)} values")
+            continue
+        # float() 接受 nan/inf：nan 与任何数比较都为假，会绕过越界检查，int(inf) 还会直接抛异常
+        if not np.isfinite(values).all():
+            issues.append(f"bad_label_format: line {lineno} has non-finite values")
+            continue
+        cls = values[0]
+        if cls != int(cls) or cls < 0 or (nc is not None and cls >= nc):
+            issues.append(f"class_out_of_range: line {lineno} class {cls:g}")
+            continue
+        coords = np.array(values[1:])
+        if coords.min() < 0 or coords.max() > 1:
+            issues.append(f"coords_out_of_range: line {lineno}")
+            continue
+        if len(values) == 5:
+            w, h = values[3], values[4]
+        else:
+            xy = coords.reshape(-1, 2)
+            w, h = np.ptp(xy[:, 0]), np.ptp(xy[:, 1])
+        if w <= 0 or h <= 0:
+            issues.append(f"zero_size_box: line {lineno}")
+            continue
+        rows.append((int(cls), round(float(w), 6), round(float(h), 6), tuple(values[1:])))
+
+    unique = {row[3]: row for row in rows}
+    if len(unique) < len(rows):
+        issues.append(f"duplicate_labels: {len(rows) - len(unique)} repeated rows")
+    record['boxes'] = [[cls, w, h] for cls, w, h, _ in unique.values()]
+    return record
+
+
+def _list_images(img_dir: Path) -> List[str]:
+    return sorted(str(p) for p in img_dir.rglob('*') if p.suffix.lower() in IMG_EXTENSIONS)
+
+
+def resolve_dataset(source: Union[str, Path]) -> tuple:
+    """
+    解析数据集来源
+
+    Args:
+        source (str): 数据集 yaml（读取 path/train/val/test 与 names），或图片目录
+
+    Returns:
+        tuple: ({split: 图片目录}, 类别名列表或 None)
+    """
+    source = Path(source)
+    if source.is_dir():
+        return {source.name: source}, None
+
+    with open(source, 'r', encoding='utf-8') as f:
+        data = yaml.safe_load(f) or {}
+    root = Path(data.get('path') or source.parent)
+    if not root.is_absolute():
+        root = source.parent / root
+    if not root.exists():
+        logger.warning(f"⚠️ Dataset path {root} does not exist, using {source.parent} instead.")
+        root = source.parent
+    names = data.get('names')
+    if isinstance(names, dict):
+        names = [names[k] for k in sorted(names)]
+    splits = {}
+    for split in ('train', 'val', 'test'):
+        for i, rel in enumerate([data[split]] if isinstance(data.get(split), str) else data.get(split) or []):
+            path = Path(rel) if Path(rel).is_absolute() else root / rel
+            splits[split if i == 0 else f"{split}{i}"] = path
+    return splits, names
+
+
+class DatasetScanner:
+    """并行扫描数据集并维护增量索引"""
+
+    def __init__(self, source: Union[str, Path], index_path: Optional[Union[str, Path]] = None,
+                 workers: int = 0, nc: Optional[int] = None):
+        """
+        Args:
+            source (str): 数据集 yaml 或图片目录
+            index_path (str): 索引文件路径，默认 results/dataset_scan/<数据集名>.json
+            workers (int): 进程数，0 表示 CPU 核数
+            nc (int): 类别数，默认取 yaml 中的 names 数量
+        """
+        self.source = Path(source)
+        self.splits, self.names = resolve_dataset(source)
+        self.nc = nc if nc is not None else (len(self.names) if self.names else None)
+        name = self.source.stem if self.source.is_file() else self.source.name
+        self.index_path = Path(index_path or Path('results/dataset_scan') / f"{name}.json")
+        self.workers = workers or os.cpu_count() or 1
+
+    def _load_index(self) -> dict:
+        if not self.index_path.exists():
+            return {}
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            logger.warning(f"⚠️ Unreadable scan index {self.index_path}, rescanning everything.")
+            return {}
+        if index.get('version') != INDEX_VERSION or index.get('nc') != self.nc:
+            return {}
+        return index.get('files', {})
+
+    def _save_index(self, files: dict):
+        self.index_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.index_path.with_suffix('.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'version': INDEX_VERSION, 'nc': self.nc, 'files': files}, f, ensure_ascii=False)
+        os.replace(tmp, self.index_path)
+
+    def scan(self) -> dict:
+        """
+        扫描全部 split，未变化的文件直接复用索引记录
+
+        Returns:
+            dict: 统计报告（同时写入索引同目录的 *_report.json）
+        """
+        start = time.perf_counter()
+        cached = self._load_index()
+        files, split_of, pending = {}, {}, []
+        for split, img_dir in self.splits.items():
+            if not img_dir.is_dir():
+                logger.warning(f"⚠️ Split '{split}' directory not found: {img_dir}")
+                continue
+            for path in _list_images(img_dir):
+                split_of[path] = split
+                old = cached.get(path)
+                if (old is not None and old['image_stat'] == _stat(path) and
+                        old['label_stat'] == _stat(old['label'])):
+                    files[path] = old
+                else:
+                    pending.append(path)
+
+        if pending:
+            chunksize = max(1, len(pending) // (self.workers * 8))
+            with ProcessPoolExecutor(max_workers=self.workers) as pool:
+                for path, record in zip(pending, pool.map(scan_file, [(p, self.nc) for p in pending],
+                                                           chunksize=chunksize)):
+                    files[path] = record
+        self._save_index(files)
+
+        elapsed = time.perf_counter() - start
+        report = self.build_report(files, split_of)
+        report['scan'] = {'files': len(files), 'rescanned': len(pending), 'reused': len(files) - len(pending),
+                          'seconds': round(elapsed, 2), 'workers': self.workers}
+        report_path = self.index_path.with_name(self.index_path.stem + '_report.json')
+        with open(report_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        report['report_path'] = str(report_path)
+        return report
+
+    def build_report(self, files: Dict[str, dict], split_of: Dict[str, str]) -> dict:
+        """汇总问题、类别分布、检测框尺寸与图片尺寸"""
+        issues = defaultdict(list)
+        instances, images_with = Counter(), Counter()
+        size_buckets = Counter()
+        rel_sizes = []
+        image_sizes = Counter()
+        digests = defaultdict(list)
+        per_split = Counter()
+
+        for path, record in files.items():
+            per_split[split_of.get(path, '?')] += 1
+            for issue in record['issues']:
+                issues[issue.split(':', 1)[0]].append(f"{path}: {issue}")
+            if record['digest']:
+                digests[record['digest']].append(path)
+            w0, h0 = record['width'], record['height']
+            if w0 and h0:
+                image_sizes[f"{w0}x{h0}"] += 1
+            for cls in {box[0] for box in record['boxes']}:
+                images_with[cls] += 1
+            for cls, w, h in record['boxes']:
+                instances[cls] += 1
+                area = w * w0 * h * h0
+                size_buckets['small' if area < SMALL_AREA else 'medium' if area < MEDIUM_AREA else 'large'] += 1
+                rel_sizes.append((w * h) ** 0.5)
+
+        duplicates = [paths for paths in digests.values() if len(paths) > 1]
+        if duplicates:
+            issues['duplicate_image'] = [', '.join(paths) for paths in duplicates]
+
+        class_ids = range(self.nc) if self.nc is not None else sorted(instances)
+        classes = [{'id': cid, 'name': self.names[cid] if self.names and cid < len(self.names) else str(cid),
+                    'instances': instances[cid], 'images': images_with[cid]} for cid in class_ids]
+        present = [c['instances'] for c in classes if c['instances']]
+        hist, _ = np.histogram(rel_sizes, bins=BOX_SIZE_BINS)
+        widths = [r['width'] for r in files.values() if r['width']]
+        heights = [r['height'] for r in files.values() if r['height']]
+
+        return {
+            'splits': dict(per_split),
+            'errors': sum(len(v) for k, v in issues.items() if k in ERROR_ISSUES),
+            'warnings': sum(len(v) for k, v in issues.items() if k not in ERROR_ISSUES),
+            'issues': {k: v for k, v in sorted(issues.items())},
+            'classes': classes,
+            'missing_classes': [c['name'] for c in classes if not c['instances']],
+            'imbalance_ratio': round(max(present) / min(present), 2) if present else None,
+            'box_sizes': dict(size_buckets),
+            'box_size_histogram': {f"{lo:.2f}-{hi:.2f}": int(n)
+                                   for lo, hi, n in zip(BOX_SIZE_BINS, BOX_SIZE_BINS[1:], hist)},
+            'image_sizes': {
+                'most_common': image_sizes.most_common(10),
+                'width_range': [min(widths), max(widths)] if widths else None,
+                'height_range': [min(heights), max(heights)] if heights else None,
+            },
+        }
+
+
+def log_report(report: dict, max_examples: int = 5):
+    """打印扫描报告摘要"""
+    scan = report['scan']
+    logger.info(f"🔎 Scanned {scan['files']} images in {scan['seconds']}s with {scan['workers']} workers "
+                f"(rescanned {scan['rescanned']}, reused {scan['reused']}) | splits: {report['splits']}")
+    for name, entries in report['issues'].items():
+        level = logging.ERROR if name in ERROR_ISSUES else logging.WARNING
+        logger.log(level, f"{'❌' if level == logging.ERROR else '⚠️'} {name}: {len(entries)}")
+        for entry in entries[:max_examples]:
+            logger.log(level, f"     {entry}")
+    logger.info(f"📊 {'class':<20} {'instances':>10} {'images':>8}")
+    for c in report['classes']:
+        logger.info(f"   {c['name']:<20} {c['instances']:>10} {c['images']:>8}")
+    if report['missing_classes']:
+        logger.warning(f"⚠️ Classes without any labels: {report['missing_classes']}")
+    logger.info(f"⚖️ Imbalance ratio (max/min instances): {report['imbalance_ratio']}")
+    logger.info(f"📐 Box sizes: {report['box_sizes']} | relative size histogram: {report['box_size_histogram']}")
+    sizes = report['image_sizes']
+    logger.info(f"🖼️ Image sizes: {sizes['most_common'][:3]} | width {sizes['width_range']} | "
+                f"height {sizes['height_range']}")
+    logger.info(f"💾 Report saved to: {report['report_path']}")
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Validate a YOLO-format dataset and collect label statistics")
+    parser.add_argument('source', type=str, help="数据集 yaml 或图片目录")
+    parser.add_argument('--index', type=str, default=None, help="索引文件路径，默认 results/dataset_scan/<名称>.json")
+    parser.add_argument('--workers', type=int, default=0, help="扫描进程数，0 表示 CPU 核数")
+    parser.add_argument('--nc', type=int, default=None, help="类别数 (图片目录模式下用于检查类别越界)")
+    parser.add_argument('--strict', action='store_true', help="存在警告也以非零状态码退出")
+    args = parser.parse_args()
+
+    report = DatasetScanner(args.source, index_path=args.index, workers=args.workers, nc=args.nc).scan()
+    log_report(report)
+    if report['errors'] or (args.strict and report['warnings']):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
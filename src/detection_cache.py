@@ -0,0 +1,249 @@
+# -*- coding: utf-8 -*-
+"""
+检测结果缓存 (Detection Cache)
+
+功能描述:
+    1. 以 (图片内容哈希, 权重哈希, conf, iou, imgsz, max_det, half) 为键持久化检测框、类别与置信度
+    2. 基于 SQLite 的本地单文件存储，按总大小进行 LRU 淘汰；每次写入是独立的短事务，
+       总大小记录在库内，多个进程（分片推理）可同时读写同一个缓存库
+    3. 权重文件内容变化时自动清除旧权重对应的缓存
+
+使用方法:
+    python task1.py --mode image --source data/image --cache results/cache/detections.db
+    python task2.py --mode predict --source data/custom_dataset/images/test --cache results/cache/detections.db
+
+作者: my_yolo Team
+日期: 2026-10-16
+"""
+
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional, Union
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# 缓存键或表结构变化时递增，旧版本的缓存表整体丢弃重建
+SCHEMA_VERSION = 2
+
+
+def file_digest(path: Union[str, Path], chunk_size: int = 1 << 20) -> str:
+    """计算文件内容哈希 (blake2b-128)，用于识别图片与权重是否变化"""
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class DetectionCache:
+    """基于 SQLite 的持久化检测结果缓存"""
+
+    _KEY_WHERE = ("image_hash = ? AND weights_hash = ? AND conf = ? AND iou = ? AND imgsz = ? "
+                  "AND max_det = ? AND half = ?")
+
+    def __init__(self, db_path: Union[str, Path], weights_path: Union[str, Path], max_size_mb: float = 512):
+        """
+        打开（或创建）缓存库
+
+        Args:
+            db_path (str): SQLite 数据库文件路径
+            weights_path (str): 模型权重路径，其内容哈希参与缓存键
+            max_size_mb (float): 缓存中检测数据的总大小上限，超出后按最近最少使用淘汰
+        """
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = int(max_size_mb * 1024 * 1024)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        weights_path = Path(weights_path)
+        if weights_path.is_file():
+            self.weights_hash = file_digest(weights_path)
+        else:
+            # 权重尚未落盘（如自动下载的官方模型名），退化为按名称区分
+            logger.warning(f"⚠️ Weights file not found for hashing, keying cache by name: {weights_path}")
+            self.weights_hash = hashlib.blake2b(str(weights_path).encode(), digest_size=16).hexdigest()
+
+        # isolation_level=None: 自动提交，写操作只在显式的短事务内持有写锁，
+        # 多进程共享时其他进程最多等待一次写入的时间（timeout 只是兜底）
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False, timeout=30,
+                                     isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._transaction():
+            self._create_schema()
+            self._invalidate_stale_weights(str(weights_path.resolve()))
+
+    @contextmanager
+    def _transaction(self):
+        """BEGIN IMMEDIATE 立即取得写锁，块结束即提交，出错回滚"""
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        self._conn.execute("COMMIT")
+
+    def _create_schema(self):
+        if self._conn.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+            self._conn.execute("DROP TABLE IF EXISTS detections")
+            self._conn.execute("DROP TABLE IF EXISTS meta")
+            self._conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        # executescript 会先提交当前事务，这里逐条执行以保持在同一事务内
+        for statement in """
+            CREATE TABLE IF NOT EXISTS detections (
+                image_hash   TEXT NOT NULL,
+                weights_hash TEXT NOT NULL,
+                conf         REAL NOT NULL,
+                iou          REAL NOT NULL,
+                imgsz        INTEGER NOT NULL,
+                max_det      INTEGER NOT NULL,
+                half         INTEGER NOT NULL,
+                height       INTEGER NOT NULL,
+                width        INTEGER NOT NULL,
+                boxes        BLOB NOT NULL,
+                classes      BLOB NOT NULL,
+                scores       BLOB NOT NULL,
+                nbytes       INTEGER NOT NULL,
+                last_access  REAL NOT NULL,
+                PRIMARY KEY (image_hash, weights_hash, conf, iou, imgsz, max_det, half)
+            );
+            CREATE INDEX IF NOT EXISTS idx_detections_last_access ON detections(last_access);
+            CREATE TABLE IF NOT EXISTS weights (
+                path TEXT PRIMARY KEY,
+                hash TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS meta (
+                key   TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            );
+            INSERT OR IGNORE INTO meta (key, value)
+                SELECT 'total_bytes', COALESCE(SUM(nbytes), 0) FROM detections
+        """.split(';'):
+            self._conn.execute(statement)
+
+    def _add_total_bytes(self, delta: int) -> int:
+        """在当前事务内更新库内记录的检测数据总大小，返回更新后的值"""
+        self._conn.execute("UPDATE meta SET value = value + ? WHERE key = 'total_bytes'", (delta,))
+        return self._conn.execute("SELECT value FROM meta WHERE key = 'total_bytes'").fetchone()[0]
+
+    @property
+    def total_bytes(self) -> int:
+        return self._conn.execute("SELECT value FROM meta WHERE key = 'total_bytes'").fetchone()[0]
+
+    def _invalidate_stale_weights(self, weights_key: str):
+        """同一路径的权重内容变化时，删除旧权重产生的全部缓存"""
+        row = self._conn.execute("SELECT hash FROM weights WHERE path = ?", (weights_key,)).fetchone()
+        if row and row[0] != self.weights_hash:
+            freed = self._conn.execute("SELECT COALESCE(SUM(nbytes), 0) FROM detections WHERE weights_hash = ?",
+                                       (row[0],)).fetchone()[0]
+            removed = self._conn.execute("DELETE FROM detections WHERE weights_hash = ?", (row[0],)).rowcount
+            self._add_total_bytes(-freed)
+            logger.info(f"♻️ Weights changed, invalidated {removed} cached detections.")
+        self._conn.execute("INSERT OR REPLACE INTO weights (path, hash) VALUES (?, ?)",
+                           (weights_key, self.weights_hash))
+
+    def _key(self, image_hash: str, conf: float, iou: float, imgsz: int, max_det: int, half: bool) -> tuple:
+        return (image_hash, self.weights_hash, round(conf, 4), round(iou, 4), int(imgsz), int(max_det), int(half))
+
+    def get(self, image_hash: str, conf: float, iou: float, imgsz: int, max_det: int = 300,
+            half: bool = False) -> Optional[dict]:
+        """
+        查询缓存（所有影响检测结果的推理参数都参与匹配）
+
+        Returns:
+            dict | None: 命中时返回 boxes (N,4 xyxy), classes (N,), scores (N,), shape (h, w)
+        """
+        key = self._key(image_hash, conf, iou, imgsz, max_det, half)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT height, width, boxes, classes, scores FROM detections "
+                f"WHERE {self._KEY_WHERE}", key
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            try:
+                # 单条语句自动提交；LRU 时间戳只是提示，其他进程正长时间写入时放弃更新
+                self._conn.execute(f"UPDATE detections SET last_access = ? WHERE {self._KEY_WHERE}",
+                                   (time.time(),) + key)
+            except sqlite3.OperationalError as e:
+                logger.debug(f"Cache access time not updated: {e}")
+
+        height, width, boxes, classes, scores = row
+        return {
+            'boxes': np.frombuffer(boxes, dtype=np.float32).reshape(-1, 4),
+            'classes': np.frombuffer(classes, dtype=np.int16).astype(np.int64),
+            'scores': np.frombuffer(scores, dtype=np.float32),
+            'shape': (height, width),
+        }
+
+    def put(self, image_hash: str, conf: float, iou: float, imgsz: int, boxes: np.ndarray,
+            classes: np.ndarray, scores: np.ndarray, shape: tuple, max_det: int = 300, half: bool = False):
+        """写入一条检测结果（紧凑的 float32/int16 二进制存储）；写入失败只记录警告，不影响检测本身"""
+        boxes_blob = np.ascontiguousarray(boxes, dtype=np.float32).tobytes()
+        classes_blob = np.ascontiguousarray(classes, dtype=np.int16).tobytes()
+        scores_blob = np.ascontiguousarray(scores, dtype=np.float32).tobytes()
+        nbytes = len(boxes_blob) + len(classes_blob) + len(scores_blob)
+
+        key = self._key(image_hash, conf, iou, imgsz, max_det, half)
+        try:
+            with self._lock, self._transaction():
+                old = self._conn.execute(f"SELECT nbytes FROM detections WHERE {self._KEY_WHERE}", key).fetchone()
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO detections VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    key + (int(shape[0]), int(shape[1]), boxes_blob, classes_blob, scores_blob, nbytes, time.time())
+                )
+                total = self._add_total_bytes(nbytes - (old[0] if old else 0))
+                if total > self.max_bytes:
+                    self._evict(total)
+        except sqlite3.OperationalError as e:
+            logger.warning(f"⚠️ Failed to write detection cache: {e}")
+
+    def put_result(self, image_hash: str, result, conf: float, iou: float, imgsz: int, max_det: int = 300,
+                   half: bool = False):
+        """从 ultralytics Results 对象提取检测框并写入缓存"""
+        boxes = result.boxes
+        self.put(image_hash, conf, iou, imgsz,
+                 boxes.xyxy.cpu().numpy(), boxes.cls.cpu().numpy(), boxes.conf.cpu().numpy(),
+                 result.orig_shape, max_det=max_det, half=half)
+
+    def _evict(self, total: int):
+        """按 last_access 从旧到新淘汰，直到总大小降到上限的 90%（留出余量减少频繁淘汰）"""
+        target = int(self.max_bytes * 0.9)
+        cursor = self._conn.execute("SELECT rowid, nbytes FROM detections ORDER BY last_access")
+        victims, freed = [], 0
+        for rowid, nbytes in cursor:
+            if total - freed <= target:
+                break
+            victims.append((rowid,))
+            freed += nbytes
+        self._conn.executemany("DELETE FROM detections WHERE rowid = ?", victims)
+        self._add_total_bytes(-freed)
+        logger.info(f"🧹 Cache evicted {len(victims)} entries (LRU).")
+
+    def close(self):
+        """关闭数据库（每次写入已各自提交）"""
+        with self._lock:
+            stored = self.total_bytes
+            self._conn.close()
+        total = self.hits + self.misses
+        if total:
+            logger.info(f"💾 Cache: {self.hits}/{total} hits ({self.hits / total:.0%}), "
+                        f"{stored / 1e6:.2f} MB stored in {self.db_path}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
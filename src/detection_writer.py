@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+"""
+结构化检测结果输出 (Structured Detection Output)
+
+功能描述:
+    1. 将每张图片的检测框、类别、置信度、图片 ID 与耗时写为结构化记录
+    2. 支持追加写入的 JSONL，以及列式存储的 Parquet（需安装 pyarrow）
+    3. 按批缓冲写出，避免逐条刷盘；输出可直接用 pandas 读取
+
+使用方法:
+    python task1.py --mode image --source data/image --output results/task1/detections.jsonl --no-render
+    python task2.py --mode predict --source data/custom_dataset/images/test --output results/task2/detections.parquet
+
+    # 读取
+    pd.read_json('results/task1/detections.jsonl', lines=True)
+    pd.read_parquet('results/task2/detections.parquet')   # Parquet 输出为目录，每次运行追加一个分片
+
+作者: my_yolo Team
+日期: 2026-10-16
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+from pathlib import Path
+from typing import Optional, Union
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_FORMATS = ('jsonl', 'parquet')
+
+
+def _parquet_schema():
+    """固定的 Parquet 列定义，避免首批全为空检测时列类型被推断为 null"""
+    import pyarrow as pa
+    return pa.schema([
+        ('image_id', pa.string()),
+        ('path', pa.string()),
+        ('height', pa.int32()),
+        ('width', pa.int32()),
+        ('num_det', pa.int32()),
+        ('boxes', pa.list_(pa.list_(pa.float32()))),
+        ('classes', pa.list_(pa.int32())),
+        ('names', pa.list_(pa.string())),
+        ('scores', pa.list_(pa.float32())),
+        ('preprocess_ms', pa.float64()),
+        ('inference_ms', pa.float64()),
+        ('postprocess_ms', pa.float64()),
+        ('cached', pa.bool_()),
+    ])
+
+
+class DetectionWriter:
+    """批量缓冲的结构化检测结果写出器（线程安全）"""
+
+    def __init__(self, path: Union[str, Path], fmt: Optional[str] = None, batch_size: int = 256,
+                 names: Optional[dict] = None):
+        """
+        Args:
+            path (str): 输出路径。jsonl 为单个追加文件；parquet 为目录，每次运行写入一个新分片
+            fmt (str): 'jsonl' 或 'parquet'，默认根据后缀推断
+            batch_size (int): 缓冲多少条记录后写出一次
+            names (dict): 类别 ID -> 名称映射，用于缓存命中等没有 Results 对象的记录
+        """
+        self.path = Path(path)
+        self.fmt = (fmt or self.path.suffix.lstrip('.') or 'jsonl').lower()
+        if self.fmt not in SUPPORTED_FORMATS:
+            raise ValueError(f"Unsupported output format: {self.fmt} (choose from {SUPPORTED_FORMATS})")
+        self.batch_size = max(1, batch_size)
+        self.names = names or {}
+        self.count = 0
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._parquet_writer = None
+
+        if self.fmt == 'parquet':
+            try:
+                import pyarrow  # noqa: F401
+                import pyarrow.parquet  # noqa: F401
+            except ImportError:
+                raise ImportError("Parquet output requires 'pyarrow'. Please run: pip install pyarrow")
+            self.path.mkdir(parents=True, exist_ok=True)
+            self._part_path = self.path / f"part-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}.parquet"
+        else:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._file = open(self.path, 'a', encoding='utf-8')
+
+    def write(self, image_id: str, path: str, boxes: np.ndarray, classes: np.ndarray, scores: np.ndarray,
+              shape: tuple, speed: Optional[dict] = None, cached: bool = False):
+        """
+        写入一张图片的检测结果
+
+        Args:
+            boxes (np.ndarray): (N, 4) xyxy 像素坐标
+            classes (np.ndarray): (N,) 类别 ID
+            scores (np.ndarray): (N,) 置信度
+            shape (tuple): 原图 (h, w)
+            speed (dict): 各阶段耗时 (ms)，键为 preprocess / inference / postprocess
+            cached (bool): 是否来自检测缓存
+        """
+        speed = speed or {}
+        classes = np.asarray(classes).astype(int).tolist()
+        record = {
+            'image_id': image_id,
+            'path': path,
+            'height': int(shape[0]),
+            'width': int(shape[1]),
+            'num_det': len(classes),
+            'boxes': np.round(np.asarray(boxes, dtype=np.float32), 2).tolist(),
+            'classes': classes,
+            'names': [self.names.get(c, str(c)) for c in classes],
+            'scores': np.round(np.asarray(scores, dtype=np.float32), 4).tolist(),
+            'preprocess_ms': round(speed.get('preprocess') or 0.0, 3),
+            'inference_ms': round(speed.get('inference') or 0.0, 3),
+            'postprocess_ms': round(speed.get('postprocess') or 0.0, 3),
+            'cached': cached,
+        }
+        with self._lock:
+            self._buffer.append(record)
+            self.count += 1
+            if len(self._buffer) >= self.batch_size:
+                self._flush_locked()
+
+    def write_result(self, image_id: str, result, path: Optional[str] = None):
+        """从 ultralytics Results 对象写入一条记录（内存图片推理时通过 path 指定真实路径）"""
+        if not self.names:
+            self.names = result.names
+        boxes = result.boxes
+        self.write(image_id, path or result.path, boxes.xyxy.cpu().numpy(), boxes.cls.cpu().numpy(),
+                   boxes.conf.cpu().numpy(), result.orig_shape, speed=result.speed)
+
+    def _flush_locked(self):
+        if not self._buffer:
+            return
+        if self.fmt == 'jsonl':
+            self._file.write(''.join(json.dumps(r, ensure_ascii=False) + '\n' for r in self._buffer))
+            self._file.flush()
+        else:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            schema = _parquet_schema()
+            if self._parquet_writer is None:
+                self._parquet_writer = pq.ParquetWriter(str(self._part_path), schema)
+            # 每批写为一个 row group
+            self._parquet_writer.write_table(pa.Table.from_pylist(self._buffer, schema=schema))
+        self._buffer = []
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def close(self):
+        """写出剩余记录并关闭文件"""
+        with self._lock:
+            self._flush_locked()
+            if self.fmt == 'jsonl':
+                self._file.close()
+            elif self._parquet_writer is not None:
+                self._parquet_writer.close()
+        logger.info(f"🗂️ Wrote {self.count} detection records to: {self.path}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
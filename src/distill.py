@@ -0,0 +1,363 @@
+# -*- coding: utf-8 -*-
+"""
+知识蒸馏 (Knowledge Distillation)
+
+功能描述:
+    1. 在线蒸馏：训练学生模型 (yolov8n) 时，同一批增强后的图片送入冻结的教师模型 (yolov8m 或自定义 best.pt)，
+       在检测头输出上增加蒸馏损失：类别 logits 的软标签 BCE + 按教师前景置信度加权的 DFL 边框分布 KL
+    2. 缓存教师预测：教师只在训练集上推理一次并缓存，把高置信度且未与标注重合的教师检测作为伪标签
+       并入标签，生成蒸馏数据集；之后的训练不再运行教师，耗时与普通训练相同
+    3. 对比教师、普通训练的学生、蒸馏后的学生的 mAP 与推理延迟，
+       报告蒸馏找回的精度比例 (distilled - baseline) / (teacher - baseline)，以及学生推理开销不变
+
+使用方法:
+    python task2.py --mode distill --data data/custom_dataset/dataset.yaml --teacher results/task2/train_m/weights/best.pt
+    python task2.py --mode distill --data data/custom_dataset/dataset.yaml --teacher yolov8m.pt --teacher-cache
+
+作者: my_yolo Team
+日期: 2026-10-16
+"""
+
+import os
+import json
+import hashlib
+import logging
+from pathlib import Path
+from typing import Union
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+import yaml
+
+from ultralytics import YOLO
+from ultralytics.models.yolo.detect import DetectionTrainer
+from ultralytics.utils.loss import v8DetectionLoss
+
+from counter import box_iou
+from dataset_scanner import label_path_for, resolve_dataset
+from detection_cache import file_digest
+from packed_dataset import list_image_files, parse_label_file
+
+logger = logging.getLogger(__name__)
+
+CACHE_VERSION = 1
+
+
+def _xywh2xyxy(boxes: np.ndarray) -> np.ndarray:
+    xy, wh = boxes[:, :2], boxes[:, 2:4] / 2
+    return np.concatenate([xy - wh, xy + wh], axis=1)
+
+
+def load_teacher(weights: Union[str, Path]) -> torch.nn.Module:
+    """加载冻结的教师网络（eval 模式，不计算梯度）"""
+    teacher = YOLO(str(weights)).model.float().eval()
+    for p in teacher.parameters():
+        p.requires_grad_(False)
+    return teacher
+
+
+class DistillationLoss:
+    """
+    包装 v8DetectionLoss：原始检测损失 + alpha * 蒸馏损失
+
+    教师与学生的检测头在相同 imgsz 下输出相同的 3 个尺度特征图 (B, 4 * reg_max + nc, H, W)，
+    逐位置对齐：类别部分做温度软化后的 BCE，边框分布部分做 KL（按教师前景置信度加权，背景不约束回归）
+    """
+
+    def __init__(self, model: torch.nn.Module, teacher: torch.nn.Module, alpha: float = 1.0,
+                 temperature: float = 2.0):
+        """
+        Args:
+            model (nn.Module): 学生 DetectionModel
+            teacher (nn.Module): 冻结的教师 DetectionModel，类别数与 reg_max 必须与学生一致
+            alpha (float): 蒸馏损失权重
+            temperature (float): 软化温度
+        """
+        self.model = model
+        self.teacher = teacher
+        self.alpha = alpha
+        self.temperature = temperature
+        self.base = None
+        self.kd_sum = 0.0
+        self.kd_steps = 0
+
+    def __deepcopy__(self, memo):
+        # ultralytics 的 EMA 与 checkpoint 会深拷贝学生模型，共享同一个损失对象而不是复制教师
+        return self
+
+    def __reduce__(self):
+        # 保存 checkpoint 时不序列化教师；加载后 criterion 为 None，由 ultralytics 按需重建普通检测损失
+        return type(None), ()
+
+    def __call__(self, preds, batch: dict):
+        if self.base is None:
+            # 首次调用时模型已在训练设备上，v8DetectionLoss 据此放置内部张量
+            self.base = v8DetectionLoss(self.model)
+        loss, items = self.base(preds, batch)
+        if isinstance(preds, tuple):
+            # 验证阶段 (eval 前向返回 (y, feats))：只计算检测损失
+            return loss, items
+
+        img = batch['img']
+        if next(self.teacher.parameters()).device != img.device:
+            self.teacher.to(img.device)
+        with torch.no_grad():
+            t_out = self.teacher(img)
+        t_feats = t_out[1] if isinstance(t_out, tuple) else t_out
+        kd = sum(self._level_loss(s, t) for s, t in zip(preds, t_feats)) / len(preds)
+        self.kd_sum += float(kd.detach())
+        self.kd_steps += 1
+        # ultralytics 的检测损失按 batch size 缩放，蒸馏项保持同一量级
+        return loss + self.alpha * kd * img.shape[0], items
+
+    def _level_loss(self, s: torch.Tensor, t: torch.Tensor) -> torch.Tensor:
+        reg_max = self.base.reg_max
+        reg, T = 4 * reg_max, self.temperature
+        B, _, H, W = s.shape
+        s, t = s.float(), t.float()
+        s_cls, t_cls = s[:, reg:], t[:, reg:]
+        cls_kd = F.binary_cross_entropy_with_logits(s_cls / T, torch.sigmoid(t_cls / T)) * T * T
+
+        weight = torch.sigmoid(t_cls).amax(dim=1)  # (B, H, W) 教师前景置信度
+        s_dist = s[:, :reg].view(B, 4, reg_max, H, W)
+        t_dist = t[:, :reg].view(B, 4, reg_max, H, W)
+        kl = F.kl_div(F.log_softmax(s_dist / T, dim=2), F.softmax(t_dist / T, dim=2),
+                      reduction='none').sum(dim=2).mean(dim=1)
+        box_kd = (kl * weight).sum() / weight.sum().clamp(min=1.0) * T * T
+        return cls_kd + box_kd
+
+    def epoch_mean(self) -> float:
+        """本 epoch 平均蒸馏损失，读取后清零"""
+        mean = self.kd_sum / max(1, self.kd_steps)
+        self.kd_sum, self.kd_steps = 0.0, 0
+        return mean
+
+
+def distill_trainer(teacher_weights: Union[str, Path], alpha: float = 1.0, temperature: float = 2.0):
+    """
+    构造在线蒸馏的 DetectionTrainer 子类，用于 model.train(trainer=...)
+
+    Args:
+        teacher_weights (str): 教师权重，类别数须与数据集一致
+        alpha (float): 蒸馏损失权重
+        temperature (float): 软化温度
+    """
+    teacher = load_teacher(teacher_weights)
+
+    class DistillationTrainer(DetectionTrainer):
+        def get_model(self, cfg=None, weights=None, verbose=True):
+            model = super().get_model(cfg, weights, verbose)
+            if teacher.model[-1].reg_max != model.model[-1].reg_max:
+                raise ValueError("teacher and student detection heads differ (reg_max)")
+            # .nc 要到 set_model_attributes() 才设置，这里以检测头的类别数为准
+            teacher_nc, student_nc = teacher.model[-1].nc, model.model[-1].nc
+            if teacher_nc != student_nc:
+                raise ValueError(f"teacher has {teacher_nc} classes but dataset has {student_nc}")
+            model.criterion = DistillationLoss(model, teacher, alpha, temperature)
+            self.add_callback('on_train_epoch_end', self._log_kd)
+            return model
+
+        def _log_kd(self, trainer):
+            criterion = getattr(self.model, 'criterion', None)
+            if isinstance(criterion, DistillationLoss):
+                logger.info(f"🧪 Epoch {trainer.epoch + 1} mean distillation loss: {criterion.epoch_mean():.4f}")
+
+    return DistillationTrainer
+
+
+class TeacherCache:
+    """
+    教师预测缓存与伪标签数据集
+
+    教师对训练集推理一次，结果存入 teacher_predictions.npz（按教师权重哈希、imgsz、conf 与图片
+    mtime/大小 指纹失效）；再把未与同类标注框重合的高置信度教师检测追加到标签，生成蒸馏数据集 yaml
+    """
+
+    def __init__(self, teacher_weights: Union[str, Path], data_yaml: Union[str, Path],
+                 cache_dir: Union[str, Path], imgsz: int = 640, conf: float = 0.5, match_iou: float = 0.5,
+                 batch: int = 16):
+        """
+        Args:
+            teacher_weights (str): 教师权重
+            data_yaml (str): 原始数据集配置
+            cache_dir (str): 缓存与蒸馏数据集输出目录
+            imgsz (int): 教师推理尺寸
+            conf (float): 伪标签最低置信度
+            match_iou (float): 与同类标注框 IoU 不低于该值的教师检测视为已标注，不重复添加
+            batch (int): 教师推理批大小
+        """
+        self.teacher_weights = Path(teacher_weights)
+        self.data_yaml = Path(data_yaml)
+        self.cache_dir = Path(cache_dir)
+        self.imgsz = imgsz
+        self.conf = conf
+        self.match_iou = match_iou
+        self.batch = batch
+
+    def _fingerprint(self, images: list) -> str:
+        h = hashlib.blake2b(digest_size=16)
+        h.update(json.dumps([CACHE_VERSION, file_digest(self.teacher_weights), self.imgsz, self.conf]).encode())
+        for path in images:
+            st = os.stat(path)
+            h.update(f"{path}|{st.st_mtime_ns}|{st.st_size}\n".encode())
+        return h.hexdigest()
+
+    def predictions(self, images: list) -> dict:
+        """教师在训练图片上的检测结果 {图片路径: (N, 6) [cls, x, y, w, h, conf]}，命中缓存时不推理"""
+        cache_file = self.cache_dir / 'teacher_predictions.npz'
+        fingerprint = self._fingerprint(images)
+        if cache_file.exists():
+            with np.load(cache_file, allow_pickle=False) as cached:
+                if str(cached['fingerprint']) == fingerprint:
+                    logger.info(f"💾 Teacher predictions loaded from cache: {cache_file}")
+                    offsets = cached['offsets']
+                    rows = cached['rows']
+                    return {str(p): rows[offsets[i]:offsets[i + 1]] for i, p in enumerate(cached['images'])}
+
+        logger.info(f"🧑‍🏫 Running teacher {self.teacher_weights.name} on {len(images)} training images...")
+        model = YOLO(str(self.teacher_weights))
+        preds = {}
+        for start in range(0, len(images), self.batch):
+            chunk = images[start:start + self.batch]
+            for path, result in zip(chunk, model.predict(chunk, imgsz=self.imgsz, conf=self.conf, verbose=False)):
+                boxes = result.boxes
+                preds[path] = np.concatenate([boxes.cls.cpu().numpy()[:, None], boxes.xywhn.cpu().numpy(),
+                                              boxes.conf.cpu().numpy()[:, None]], axis=1).astype(np.float32)
+
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        offsets = np.cumsum([0] + [len(preds[p]) for p in images])
+        rows = np.concatenate([preds[p] for p in images]) if images else np.zeros((0, 6), np.float32)
+        tmp = cache_file.with_suffix('.tmp.npz')
+        np.savez(tmp, fingerprint=np.array(fingerprint), images=np.array(images), offsets=offsets,
+                 rows=rows.reshape(-1, 6))
+        os.replace(tmp, cache_file)
+        logger.info(f"💾 Teacher predictions cached to: {cache_file}")
+        return preds
+
+    def _merge(self, gt: np.ndarray, teacher: np.ndarray) -> np.ndarray:
+        """返回未与同类标注框匹配的教师检测 (cls, x, y, w, h)"""
+        if not len(teacher):
+            return teacher[:, :5]
+        keep = np.ones(len(teacher), dtype=bool)
+        if len(gt):
+            iou = box_iou(_xywh2xyxy(teacher[:, 1:5]), _xywh2xyxy(gt[:, 1:5]))
+            same_cls = teacher[:, None, 0] == gt[None, :, 0]
+            keep = ~((iou >= self.match_iou) & same_cls).any(axis=1)
+        return teacher[keep, :5]
+
+    def build(self) -> Path:
+        """生成蒸馏数据集（训练图片以符号链接引用，验证集沿用原路径），返回其 yaml 路径"""
+        splits, names = resolve_dataset(self.data_yaml)
+        if 'train' not in splits:
+            raise ValueError(f"no train split in {self.data_yaml}")
+        train_dir = Path(splits['train'])
+        images = list_image_files(train_dir)
+        preds = self.predictions(images)
+
+        root = self.cache_dir / 'dataset'
+        img_root, label_root = root / 'images' / 'train', root / 'labels' / 'train'
+        added = 0
+        for path in images:
+            rel = Path(path).relative_to(train_dir)
+            img_link, label_file = img_root / rel, (label_root / rel).with_suffix('.txt')
+            img_link.parent.mkdir(parents=True, exist_ok=True)
+            label_file.parent.mkdir(parents=True, exist_ok=True)
+            if not os.path.lexists(img_link):
+                try:
+                    os.symlink(os.path.abspath(path), img_link)
+                except OSError:
+                    # 不支持符号链接的文件系统 (Windows 非管理员) 退化为硬链接
+                    os.link(path, img_link)
+
+            gt_path = label_path_for(path)
+            gt_text = Path(gt_path).read_text(encoding='utf-8').rstrip() if os.path.exists(gt_path) else ''
+            extra = self._merge(parse_label_file(gt_path), preds[path])
+            added += len(extra)
+            lines = [gt_text] if gt_text else []
+            lines += [f"{int(c)} {x:.6f} {y:.6f} {w:.6f} {h:.6f}" for c, x, y, w, h in extra]
+            label_file.write_text('\n'.join(lines) + ('\n' if lines else ''), encoding='utf-8')
+
+        # 标签已变化，删除 ultralytics 的旧 labels.cache
+        stale = label_root.parent / 'train.cache'
+        if stale.exists():
+            stale.unlink()
+        data = {'path': str(root.resolve()), 'train': 'images/train', 'names': dict(enumerate(names or []))}
+        for split in ('val', 'test'):
+            if split in splits:
+                data[split] = str(Path(splits[split]).resolve())
+        data_yaml = self.cache_dir / 'distill_dataset.yaml'
+        with open(data_yaml, 'w', encoding='utf-8') as f:
+            yaml.safe_dump(data, f, allow_unicode=True, sort_keys=False)
+        logger.info(f"🏷️ Added {added} teacher pseudo-labels across {len(images)} images -> {data_yaml}")
+        return data_yaml
+
+
+def evaluate(weights: Union[str, Path], data_yaml: str, imgsz: int, image, warmup_runs: int = 10,
+             test_runs: int = 50, device: str = 'cpu') -> dict:
+    """在验证集上评估 mAP，并测量单图推理延迟"""
+    from task3 import measure_latency
+
+    model = YOLO(str(weights))
+    metrics = model.val(data=data_yaml, split='val', imgsz=imgsz, batch=1, device=device, verbose=False)
+    latency = measure_latency(model, image, batch_size=1, imgsz=imgsz, warmup_runs=warmup_runs,
+                              test_runs=test_runs, device=device)
+    params = sum(p.numel() for p in model.model.parameters())
+    return {
+        'weights': str(weights),
+        'params (M)': round(params / 1e6, 2),
+        'mAP50': round(float(metrics.box.map50), 4),
+        'mAP50-95': round(float(metrics.box.map), 4),
+        'p50 (ms)': latency['p50 (ms)'],
+        'Mean (ms)': latency['Mean (ms)'],
+    }
+
+
+def report_distillation(teacher: str, baseline: str, distilled: str, data_yaml: str, output_dir: Union[str, Path],
+                        imgsz: int = 640, warmup_runs: int = 10, test_runs: int = 50,
+                        device: str = 'cpu') -> dict:
+    """
+    对比教师、普通训练学生与蒸馏学生，写入 distill_report.json / distill_report.md
+
+    Returns:
+        dict: 各模型指标，以及 recovered（蒸馏找回的教师-学生 mAP50-95 差距比例）
+              与 student_latency_ratio（蒸馏学生 / 普通学生 延迟，应约等于 1）
+    """
+    import cv2
+    from task3 import dataset_images
+
+    val_images = dataset_images(data_yaml, split='val')
+    if not val_images:
+        raise ValueError(f"no validation images found for {data_yaml}")
+    image = cv2.imread(str(val_images[0]))
+
+    report = {}
+    for label, weights in (('teacher', teacher), ('baseline', baseline), ('distilled', distilled)):
+        logger.info(f"📏 Evaluating {label}: {weights}")
+        report[label] = evaluate(weights, data_yaml, imgsz, image, warmup_runs, test_runs, device)
+
+    gap = report['teacher']['mAP50-95'] - report['baseline']['mAP50-95']
+    gain = report['distilled']['mAP50-95'] - report['baseline']['mAP50-95']
+    report['recovered'] = round(gain / gap, 3) if gap > 0 else None
+    base_ms = report['baseline']['Mean (ms)']
+    report['student_latency_ratio'] = round(report['distilled']['Mean (ms)'] / base_ms, 3) if base_ms else None
+
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    with open(output_dir / 'distill_report.json', 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    columns = ['params (M)', 'mAP50', 'mAP50-95', 'p50 (ms)', 'Mean (ms)']
+    lines = ['| model | ' + ' | '.join(columns) + ' |', '|' + '---|' * (len(columns) + 1)]
+    for label in ('teacher', 'baseline', 'distilled'):
+        lines.append(f"| {label} | " + ' | '.join(str(report[label][c]) for c in columns) + ' |')
+    recovered = f"{report['recovered']:.1%}" if report['recovered'] is not None else 'n/a (teacher not better)'
+    lines += ['', f"Accuracy recovered: {recovered}",
+              f"Student latency ratio (distilled / baseline): {report['student_latency_ratio']}"]
+    (output_dir / 'distill_report.md').write_text('\n'.join(lines) + '\n', encoding='utf-8')
+
+    logger.info("=" * 60)
+    for line in lines:
+        logger.info(line)
+    logger.info(f"💾 Distillation report saved to: {output_dir / 'distill_report.md'}")
+    return report
@@ -0,0 +1,374 @@
+# -*- coding: utf-8 -*-
+"""
+本地 HTTP 推理服务 (Headless Inference Server with Dynamic Batching)
+
+功能描述:
+    1. 基于 asyncio + aiohttp 的无界面推理服务，通过 HTTP 上传图片，返回 JSON 检测结果
+    2. 动态批处理：把并发请求合并为微批次，受最大批大小 (max_batch) 与最长等待 (max_wait_ms) 约束
+    3. 背压：待处理队列满时立即返回 503 + Retry-After，而不是无限堆积导致延迟失控
+    4. /metrics 输出请求数、拒绝数、批大小分布、排队/推理/端到端延迟分位数 (Prometheus 文本格式，?format=json 为 JSON)
+
+使用方法:
+    python src/inference_server.py --model yolov8n.pt --port 8000 --max-batch 8 --max-wait-ms 10
+
+    curl -X POST --data-binary @data/image/bus.jpg http://127.0.0.1:8000/predict
+    curl -F image=@data/image/bus.jpg http://127.0.0.1:8000/predict
+    curl http://127.0.0.1:8000/metrics
+
+    # 压测（测 QPS 与尾延迟）
+    python scripts/load_test.py --url http://127.0.0.1:8000/predict --image data/image/bus.jpg --concurrency 16
+
+作者: my_yolo Team
+日期: 2026-10-16
+"""
+
+import sys
+import time
+import asyncio
+import logging
+import argparse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+import cv2
+import numpy as np
+
+try:
+    from aiohttp import web
+except ImportError:
+    print("❌ Error: 'aiohttp' not found. Please install requirements: pip install -r requirements.txt")
+    sys.exit(1)
+
+from config import add_config_args, config_from_args, pick
+from model_registry import get_registry
+
+# 配置日志
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S'
+)
+logger = logging.getLogger(__name__)
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+class ServerMetrics:
+    """服务指标：计数器 + 最近 window 个请求的延迟样本"""
+
+    def __init__(self, max_batch: int, window: int = 2048):
+        self.started = time.time()
+        self.requests = 0
+        self.responses = 0
+        self.rejected = 0
+        self.errors = 0
+        self.batches = 0
+        self.batched_images = 0
+        self.batch_sizes = [0] * (max_batch + 1)
+        self.latency = {name: deque(maxlen=window) for name in ('queue_ms', 'inference_ms', 'total_ms')}
+
+    def observe_batch(self, size: int, inference_ms: float):
+        self.batches += 1
+        self.batched_images += size
+        self.batch_sizes[size] += 1
+        self.latency['inference_ms'].append(inference_ms)
+
+    def snapshot(self, queue_depth: int) -> dict:
+        uptime = time.time() - self.started
+        summary = {
+            'uptime_seconds': round(uptime, 1),
+            'requests_total': self.requests,
+            'responses_total': self.responses,
+            'rejected_total': self.rejected,
+            'errors_total': self.errors,
+            'queue_depth': queue_depth,
+            'batches_total': self.batches,
+            'avg_batch_size': round(self.batched_images / self.batches, 2) if self.batches else 0.0,
+            'batch_size_counts': {str(i): n for i, n in enumerate(self.batch_sizes) if n},
+            'qps': round(self.responses / uptime, 2) if uptime > 0 else 0.0,
+        }
+        for name, samples in self.latency.items():
+            values = sorted(samples)
+            for q in (0.5, 0.9, 0.99):
+                summary[f"{name[:-3]}_p{int(q * 100)}_ms"] = round(_percentile(values, q), 2)
+        return summary
+
+    def prometheus(self, queue_depth: int) -> str:
+        """Prometheus 文本格式"""
+        snap = self.snapshot(queue_depth)
+        lines = []
+        for key in ('requests_total', 'responses_total', 'rejected_total', 'errors_total', 'batches_total'):
+            lines.append(f"# TYPE yolo_{key} counter")
+            lines.append(f"yolo_{key} {snap[key]}")
+        for key in ('queue_depth', 'avg_batch_size', 'qps', 'uptime_seconds'):
+            lines.append(f"# TYPE yolo_{key} gauge")
+            lines.append(f"yolo_{key} {snap[key]}")
+        lines.append("# TYPE yolo_batch_size_count counter")
+        for size, n in snap['batch_size_counts'].items():
+            lines.append(f'yolo_batch_size_count{{size="{size}"}} {n}')
+        for name in self.latency:
+            metric = f"yolo_{name[:-3]}_latency_ms"
+            lines.append(f"# TYPE {metric} summary")
+            for q in (0.5, 0.9, 0.99):
+                lines.append(f'{metric}{{quantile="{q}"}} {snap[f"{name[:-3]}_p{int(q * 100)}_ms"]}')
+        return '\n'.join(lines) + '\n'
+
+
+class MicroBatcher:
+    """
+    动态批处理器
+
+    请求线程把解码后的帧放入有界队列；批处理协程取到第一帧后，最多再等待 max_wait_ms
+    凑满 max_batch 帧，然后在单独的推理线程中一次前向。推理期间到达的请求会自然积累为下一批。
+    """
+
+    def __init__(self, model, predict_args: dict, metrics: ServerMetrics, max_batch: int = 8,
+                 max_wait_ms: float = 10.0, max_queue: int = 64):
+        """
+        Args:
+            model (YOLO): 已加载的模型
+            predict_args (dict): 推理参数 (conf, iou, imgsz, max_det, half)
+            metrics (ServerMetrics): 指标收集器
+            max_batch (int): 每批最多的图片数
+            max_wait_ms (float): 第一帧到达后等待凑批的最长时间
+            max_queue (int): 待处理请求上限，超出后拒绝新请求（背压）
+        """
+        self.model = model
+        self.predict_args = predict_args
+        self.metrics = metrics
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait_ms / 1000.0
+        self.queue = asyncio.Queue(maxsize=max_queue)
+        self._arrival = asyncio.Event()
+        # 模型实例不是线程安全的，所有前向都在这一个线程里串行执行
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='infer')
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._executor.shutdown(wait=True)
+
+    async def submit(self, frame: np.ndarray):
+        """
+        提交一帧并等待结果
+
+        Raises:
+            asyncio.QueueFull: 队列已满（调用方应返回 503）
+
+        Returns:
+            tuple: (Results, timing dict)
+        """
+        future = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait((frame, future, time.perf_counter()))
+        self._arrival.set()
+        return await future
+
+    async def _collect(self) -> list:
+        """取第一帧后在 max_wait 内尽量凑满一批"""
+        loop = asyncio.get_running_loop()
+        batch = [await self.queue.get()]
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch:
+            try:
+                batch.append(self.queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            self._arrival.clear()
+            try:
+                await asyncio.wait_for(self._arrival.wait(), remaining)
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            # 客户端已断开的请求不再推理
+            batch = [item for item in await self._collect() if not item[1].done()]
+            if not batch:
+                continue
+
+            frames = [frame for frame, _, _ in batch]
+            t0 = time.perf_counter()
+            try:
+                results = await loop.run_in_executor(
+                    self._executor, lambda: self.model.predict(frames, verbose=False, **self.predict_args))
+            except Exception as e:
+                logger.error(f"❌ Batch inference failed: {e}")
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            t_done = time.perf_counter()
+            inference_ms = (t_done - t0) * 1000
+            self.metrics.observe_batch(len(batch), inference_ms)
+
+            for (_, future, t_enqueue), result in zip(batch, results):
+                if not future.done():
+                    future.set_result((result, {
+                        'batch_size': len(batch),
+                        'queue_ms': round((t0 - t_enqueue) * 1000, 2),
+                        'inference_ms': round(inference_ms, 2),
+                    }))
+
+
+def result_to_json(result) -> dict:
+    """ultralytics Results -> 可序列化的检测结果"""
+    boxes = result.boxes
+    xyxy = boxes.xyxy.cpu().numpy().round(2).tolist()
+    classes = boxes.cls.cpu().numpy().astype(int).tolist()
+    scores = boxes.conf.cpu().numpy().round(4).tolist()
+    return {
+        'shape': list(result.orig_shape),
+        'detections': [
+            {'box': box, 'class_id': cid, 'name': result.names.get(cid, str(cid)), 'score': score}
+            for box, cid, score in zip(xyxy, classes, scores)
+        ],
+    }
+
+
+def _decode(data: bytes) -> Optional[np.ndarray]:
+    return cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+
+
+async def handle_predict(request: web.Request) -> web.Response:
+    """POST /predict：请求体为原始图片字节，或 multipart 表单中的 image 字段"""
+    app = request.app
+    metrics: ServerMetrics = app['metrics']
+    batcher: MicroBatcher = app['batcher']
+    t_start = time.perf_counter()
+    metrics.requests += 1
+
+    # 先检查背压，队列已满时不再读取与解码请求体
+    if batcher.queue.full():
+        metrics.rejected += 1
+        return web.json_response({'error': 'server busy'}, status=503, headers={'Retry-After': '1'})
+
+    if request.content_type.startswith('multipart/'):
+        form = await request.post()
+        field = form.get('image')
+        data = field.file.read() if field is not None and hasattr(field, 'file') else b''
+    else:
+        data = await request.read()
+    if not data:
+        metrics.errors += 1
+        return web.json_response({'error': 'empty request body'}, status=400)
+
+    frame = await asyncio.get_running_loop().run_in_executor(None, _decode, data)
+    if frame is None:
+        metrics.errors += 1
+        return web.json_response({'error': 'could not decode image'}, status=400)
+
+    try:
+        result, timing = await batcher.submit(frame)
+    except asyncio.QueueFull:
+        metrics.rejected += 1
+        return web.json_response({'error': 'server busy'}, status=503, headers={'Retry-After': '1'})
+    except Exception as e:
+        metrics.errors += 1
+        return web.json_response({'error': str(e)}, status=500)
+
+    total_ms = (time.perf_counter() - t_start) * 1000
+    metrics.responses += 1
+    metrics.latency['queue_ms'].append(timing['queue_ms'])
+    metrics.latency['total_ms'].append(total_ms)
+    payload = result_to_json(result)
+    payload.update(timing, total_ms=round(total_ms, 2))
+    return web.json_response(payload)
+
+
+async def handle_metrics(request: web.Request) -> web.Response:
+    """GET /metrics：Prometheus 文本格式，?format=json 返回 JSON"""
+    metrics: ServerMetrics = request.app['metrics']
+    depth = request.app['batcher'].queue.qsize()
+    if request.query.get('format') == 'json':
+        snapshot = metrics.snapshot(depth)
+        snapshot['models'] = get_registry().metrics()
+        return web.json_response(snapshot)
+    return web.Response(text=metrics.prometheus(depth), content_type='text/plain')
+
+
+async def handle_health(request: web.Request) -> web.Response:
+    return web.json_response({'status': 'ok'})
+
+
+def create_app(model, predict_args: dict, max_batch: int = 8, max_wait_ms: float = 10.0,
+               max_queue: int = 64, max_body_mb: float = 32) -> web.Application:
+    """
+    创建推理服务应用
+
+    Args:
+        model (YOLO): 已加载的模型
+        predict_args (dict): 推理参数
+        max_batch (int): 每批最多图片数
+        max_wait_ms (float): 凑批最长等待时间
+        max_queue (int): 待处理请求上限（背压阈值）
+        max_body_mb (float): 单个请求体大小上限
+    """
+    app = web.Application(client_max_size=int(max_body_mb * 1024 * 1024))
+    app['metrics'] = ServerMetrics(max_batch)
+    app['batcher'] = MicroBatcher(model, predict_args, app['metrics'], max_batch=max_batch,
+                                  max_wait_ms=max_wait_ms, max_queue=max_queue)
+
+    async def on_startup(app):
+        app['batcher'].start()
+
+    async def on_cleanup(app):
+        await app['batcher'].stop()
+
+    app.on_startup.append(on_startup)
+    app.on_cleanup.append(on_cleanup)
+    app.router.add_post('/predict', handle_predict)
+    app.router.add_get('/metrics', handle_metrics)
+    app.router.add_get('/health', handle_health)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="YOLOv8 HTTP inference server with dynamic batching")
+    parser.add_argument('--model', type=str, default=None, help="模型权重，默认 models.default")
+    parser.add_argument('--host', type=str, default=None, help="监听地址，默认 server.host")
+    parser.add_argument('--port', type=int, default=None, help="监听端口，默认 server.port")
+    parser.add_argument('--max-batch', type=int, default=None, help="每批最多图片数，默认 server.max_batch")
+    parser.add_argument('--max-wait-ms', type=float, default=None,
+                        help="凑批最长等待 (ms)，默认 server.max_wait_ms")
+    parser.add_argument('--max-queue', type=int, default=None, help="待处理请求上限，默认 server.max_queue")
+    add_config_args(parser)
+    args = parser.parse_args()
+
+    cfg = config_from_args(args)
+    server_cfg, det_cfg = cfg['server'], cfg['detection']
+    model_name = pick(args.model, cfg['models']['default'])
+    predict_args = {'conf': det_cfg['conf_threshold'], 'iou': det_cfg['iou_threshold'],
+                    'imgsz': det_cfg['img_size'], 'max_det': det_cfg['max_det'], 'half': det_cfg['half']}
+    max_batch = pick(args.max_batch, server_cfg['max_batch'])
+
+    model = get_registry(cfg).get(model_name, imgsz=predict_args['imgsz'])
+    app = create_app(model, predict_args, max_batch=max_batch,
+                     max_wait_ms=pick(args.max_wait_ms, server_cfg['max_wait_ms']),
+                     max_queue=pick(args.max_queue, server_cfg['max_queue']))
+
+    host, port = pick(args.host, server_cfg['host']), pick(args.port, server_cfg['port'])
+    logger.info(f"🌐 Serving {model_name} on http://{host}:{port} (max batch {max_batch})")
+    web.run_app(app, host=host, port=port, print=None)
+
+
+if __name__ == "__main__":
+    main()
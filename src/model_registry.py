@@ -0,0 +1,272 @@
+# -*- coding: utf-8 -*-
+"""
+模型注册表与预热模型池 (Model Registry & Warm Model Pool)
+
+功能描述:
+    1. 进程级模型注册表：以 (权重路径, 权重内容哈希) 为键，同一权重在进程内只加载一次
+    2. 懒加载：首次请求时加载，并按配置的 imgsz 执行预热推理，消除首帧延迟
+    3. 有界 LRU：最多保留 max_models 个热模型，超出时淘汰最久未使用的模型
+    4. 记录每个模型的加载耗时、预热耗时、命中与淘汰次数，以及池中模型的参数内存与进程常驻内存
+    5. 同一实例被多个线程共享时（如 Web UI 各会话与后台任务），提供每个模型一把推理锁，
+       ultralytics 的 predictor 不是线程安全的，所有 predict 调用都应在锁内执行
+
+使用方法:
+    from model_registry import get_registry
+
+    model = get_registry().get('yolov8n.pt', imgsz=640)
+    with get_registry().predict_lock(model):
+        results = model.predict(image)
+    get_registry().log_metrics()
+
+    # 池大小与预热次数读取 config.yaml 的 model_pool 段
+
+作者: my_yolo Team
+日期: 2026-10-16
+"""
+
+import gc
+import os
+import sys
+import time
+import logging
+import threading
+import weakref
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+from config import load_config
+from detection_cache import file_digest
+
+logger = logging.getLogger(__name__)
+
+
+def current_rss_mb() -> float:
+    """当前进程常驻内存 (MB)"""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / 1024 / 1024
+    except ImportError:
+        pass
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 / 1024
+    except (OSError, ValueError):
+        import resource  # 退化为峰值内存
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 1024 / 1024 if sys.platform == 'darwin' else peak / 1024
+
+
+class ModelRegistry:
+    """线程安全的有界 LRU 模型池"""
+
+    def __init__(self, max_models: int = 3, warmup_runs: int = 1, imgsz: int = 640):
+        """
+        Args:
+            max_models (int): 同时保留的热模型数量上限
+            warmup_runs (int): 每个模型在每个输入尺寸下的预热推理次数，0 表示不预热
+            imgsz (int): 未指定时使用的预热输入尺寸
+        """
+        self.max_models = max(1, max_models)
+        self.warmup_runs = warmup_runs
+        self.imgsz = imgsz
+        self._models = OrderedDict()   # key -> {'model', 'warm_sizes'}
+        self._metrics = {}             # key -> 加载/预热/命中统计（淘汰后保留）
+        self._digests = {}             # (path, mtime_ns, size) -> 内容哈希，避免重复读大文件
+        self._lock = threading.Lock()
+        self._key_locks = {}           # key -> [加载锁, 正在使用的调用数]，不在池中且无人使用时删除
+        self._predict_locks = weakref.WeakKeyDictionary()   # 模型实例 -> 推理锁（随实例回收）
+
+    def model_key(self, weights: str) -> tuple:
+        """权重的注册表键：本地文件为 (绝对路径, 内容哈希)，官方模型名为 (名称, None)"""
+        path = Path(weights)
+        if not path.is_file():
+            return (str(weights), None)
+        stat = path.stat()
+        resolved = str(path.resolve())
+        stamp = (resolved, stat.st_mtime_ns, stat.st_size)
+        digest = self._digests.get(stamp)
+        if digest is None:
+            digest = file_digest(path)
+            self._digests[stamp] = digest
+        return (resolved, digest)
+
+    def get(self, weights: str, imgsz: Optional[int] = None, warmup: bool = True):
+        """
+        获取（必要时加载并预热）模型
+
+        Args:
+            weights (str): 权重路径或官方模型名 (如 yolov8n.pt)
+            imgsz (int): 预热输入尺寸，默认使用注册表的 imgsz
+            warmup (bool): 是否确保模型已在该尺寸下预热
+
+        Returns:
+            YOLO: 已加载的模型（同一键的调用方共享同一实例）
+        """
+        key = self.model_key(weights)
+        imgsz = imgsz or self.imgsz
+        with self._lock:
+            slot = self._key_locks.setdefault(key, [threading.Lock(), 0])
+            slot[1] += 1
+
+        try:
+            with slot[0]:
+                with self._lock:
+                    entry = self._models.get(key)
+                    if entry is not None:
+                        self._models.move_to_end(key)
+                        self._metrics[key]['hits'] += 1
+
+                if entry is None:
+                    entry = self._load(key, weights)
+                if warmup and self.warmup_runs > 0 and imgsz not in entry['warm_sizes']:
+                    self._warmup(key, entry, imgsz)
+                return entry['model']
+        finally:
+            with self._lock:
+                slot[1] -= 1
+                self._prune_key_lock(key)
+
+    def _prune_key_lock(self, key: tuple):
+        """删除已不在池中且没有调用方等待的键锁，长期运行的服务中锁表不随请求过的键无限增长（需持有 self._lock）"""
+        slot = self._key_locks.get(key)
+        if slot is not None and slot[1] == 0 and key not in self._models:
+            del self._key_locks[key]
+
+    def predict_lock(self, model) -> threading.RLock:
+        """模型实例的推理锁：共享同一实例的线程在调用 predict 前获取（可重入）"""
+        with self._lock:
+            lock = self._predict_locks.get(model)
+            if lock is None:
+                lock = self._predict_locks[model] = threading.RLock()
+            return lock
+
+    def _load(self, key: tuple, weights: str) -> dict:
+        from ultralytics import YOLO
+
+        t0 = time.perf_counter()
+        model = YOLO(weights)
+        load_seconds = time.perf_counter() - t0
+        entry = {'model': model, 'warm_sizes': set()}
+
+        with self._lock:
+            metrics = self._metrics.setdefault(key, {
+                'weights': str(weights), 'loads': 0, 'hits': 0, 'evictions': 0,
+                'load_seconds': 0.0, 'warmup_seconds': 0.0,
+            })
+            metrics['loads'] += 1
+            metrics['load_seconds'] = round(load_seconds, 3)
+            self._models[key] = entry
+            evicted = []
+            while len(self._models) > self.max_models:
+                old_key, _ = self._models.popitem(last=False)
+                self._metrics[old_key]['evictions'] += 1
+                self._prune_key_lock(old_key)
+                evicted.append(old_key)
+
+        logger.info(f"📦 Model loaded: {weights} in {load_seconds:.2f}s")
+        if evicted:
+            for old_key in evicted:
+                logger.info(f"🧹 Evicted cold model: {self._metrics[old_key]['weights']}")
+            self._release_memory()
+        return entry
+
+    def _warmup(self, key: tuple, entry: dict, imgsz: int):
+        """用空白图片执行预热推理（首次推理会触发算子选择与内存分配）"""
+        dummy = np.zeros((imgsz, imgsz, 3), dtype=np.uint8)
+        t0 = time.perf_counter()
+        with self.predict_lock(entry['model']):
+            for _ in range(self.warmup_runs):
+                entry['model'].predict(dummy, imgsz=imgsz, verbose=False)
+        warmup_seconds = time.perf_counter() - t0
+        entry['warm_sizes'].add(imgsz)
+        with self._lock:
+            metrics = self._metrics[key]
+            metrics['warmup_seconds'] = round(metrics['warmup_seconds'] + warmup_seconds, 3)
+        logger.info(f"🔥 Model warmed up at imgsz={imgsz} in {warmup_seconds:.2f}s ({self.warmup_runs} runs)")
+
+    @staticmethod
+    def _release_memory():
+        gc.collect()
+        try:
+            import torch
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+        except ImportError:
+            pass
+
+    def evict(self, weights: str) -> bool:
+        """主动从池中移除模型，返回是否存在"""
+        key = self.model_key(weights)
+        with self._lock:
+            entry = self._models.pop(key, None)
+            if entry is not None:
+                self._metrics[key]['evictions'] += 1
+            self._prune_key_lock(key)
+        if entry is not None:
+            self._release_memory()
+        return entry is not None
+
+    def clear(self):
+        """清空模型池"""
+        with self._lock:
+            self._models.clear()
+            for key in list(self._key_locks):
+                self._prune_key_lock(key)
+        self._release_memory()
+
+    def loaded(self) -> list:
+        """当前池中的模型（从冷到热）"""
+        with self._lock:
+            return [self._metrics[key]['weights'] for key in self._models]
+
+    def metrics(self) -> list:
+        """每个模型的加载耗时、预热耗时、命中与淘汰次数"""
+        with self._lock:
+            return [dict(m, loaded=key in self._models) for key, m in self._metrics.items()]
+
+    def memory_usage(self) -> list:
+        """池中每个模型的参数与缓冲区内存 (MB)，从冷到热"""
+        with self._lock:
+            entries = [(self._metrics[key]['weights'], entry['model']) for key, entry in self._models.items()]
+        usage = []
+        for weights, model in entries:
+            module = getattr(model, 'model', None)
+            nbytes = 0
+            if hasattr(module, 'parameters'):
+                tensors = list(module.parameters()) + list(module.buffers())
+                nbytes = sum(t.numel() * t.element_size() for t in tensors)
+            usage.append({'weights': weights, 'param_mb': round(nbytes / 1024 / 1024, 1)})
+        return usage
+
+    def log_metrics(self):
+        for m in self.metrics():
+            logger.info(f"📊 {m['weights']}: load {m['load_seconds']}s | warmup {m['warmup_seconds']}s | "
+                        f"loads {m['loads']} | hits {m['hits']} | evictions {m['evictions']}")
+
+    def __len__(self):
+        return len(self._models)
+
+
+_REGISTRY = None
+_REGISTRY_LOCK = threading.Lock()
+
+
+def get_registry(cfg: Optional[dict] = None) -> ModelRegistry:
+    """
+    进程级单例注册表
+
+    Args:
+        cfg (dict): 项目配置 (config.load_config)，仅首次创建时使用 model_pool / detection 段；
+                    未提供时读取默认的 config.yaml
+    """
+    global _REGISTRY
+    with _REGISTRY_LOCK:
+        if _REGISTRY is None:
+            cfg = cfg or load_config()
+            _REGISTRY = ModelRegistry(max_models=cfg['model_pool']['max_models'],
+                                      warmup_runs=cfg['model_pool']['warmup_runs'],
+                                      imgsz=cfg['detection']['img_size'])
+        return _REGISTRY
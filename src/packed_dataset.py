@@ -0,0 +1,332 @@
+# -*- coding: utf-8 -*-
+"""
+打包的内存映射数据集 (Packed Memory-Mapped Dataset Store)
+
+功能描述:
+    1. 一次性把数据集图片解码并按训练 imgsz 缩放（长边 = imgsz，尺寸取整与插值方式跟随已安装的
+       ultralytics load_image），连续写入单个 uint8 文件，索引记录偏移与形状
+    2. 训练时以 copy-on-write 内存映射读取，每个 epoch 不再重复 JPEG 解码与缩放，图片为零拷贝视图
+    3. 记录源图片的 mtime 与大小，数据集变化后自动重建
+    4. 提供 ultralytics 自定义 Trainer：增强流水线与标签处理（含 ultralytics 自身的标签缓存）保持不变，
+       只替换图片读取，因此标签不打包
+    5. 分别用原始目录与打包存储训练若干 epoch，对比每个 epoch 的耗时
+
+使用方法:
+    python task2.py --mode train --data data/custom_dataset/dataset.yaml --mmap-cache
+    python task2.py --mode train --data data/custom_dataset/dataset.yaml --compare-epochs 2
+
+作者: my_yolo Team
+日期: 2026-10-16
+"""
+
+import os
+import json
+import time
+import shutil
+import hashlib
+import inspect
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List, Optional, Union
+
+import cv2
+import numpy as np
+
+from ultralytics.data.base import BaseDataset
+from ultralytics.data.dataset import YOLODataset
+from ultralytics.data.utils import IMG_FORMATS
+from ultralytics.models.yolo.detect import DetectionTrainer
+
+logger = logging.getLogger(__name__)
+
+STORE_VERSION = 2
+
+
+def _file_stat(path: str) -> tuple:
+    try:
+        st = os.stat(path)
+        return st.st_mtime_ns, st.st_size
+    except FileNotFoundError:
+        return 0, -1
+
+
+def parse_label_file(path: str) -> np.ndarray:
+    """读取 YOLO 标签文件为 (N, 5) [cls, x, y, w, h]；分割多边形标签取外接框"""
+    rows = []
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                values = [float(v) for v in line.split()]
+                if len(values) == 5:
+                    rows.append(values)
+                elif len(values) > 5:
+                    xy = np.array(values[1:len(values) - (len(values) - 1) % 2]).reshape(-1, 2)
+                    (x0, y0), (x1, y1) = xy.min(axis=0), xy.max(axis=0)
+                    rows.append([values[0], (x0 + x1) / 2, (y0 + y1) / 2, x1 - x0, y1 - y0])
+    return np.array(rows, dtype=np.float32).reshape(-1, 5)
+
+
+def shrink_interpolation(augment: bool) -> int:
+    """
+    已安装的 ultralytics load_image 缩小图片时使用的插值方式：新版本统一 INTER_LINEAR，
+    旧版本在不做增强（验证集）时用 INTER_AREA。原始目录与打包存储训练的像素必须一致，对比才有意义
+    """
+    try:
+        source = inspect.getsource(BaseDataset.load_image)
+    except (OSError, TypeError):
+        return cv2.INTER_LINEAR
+    return cv2.INTER_AREA if 'INTER_AREA' in source and not augment else cv2.INTER_LINEAR
+
+
+def _load_resized(path: str, imgsz: int, interpolation: int = cv2.INTER_LINEAR) -> tuple:
+    """解码并按长边缩放到 imgsz（放大用 INTER_LINEAR，缩小用 interpolation），返回 (图片, 原始 (h, w))"""
+    im = cv2.imread(path)
+    if im is None:
+        raise ValueError(f"unreadable image: {path}")
+    h0, w0 = im.shape[:2]
+    r = imgsz / max(h0, w0)
+    if r != 1:
+        w, h = min(int(np.ceil(w0 * r)), imgsz), min(int(np.ceil(h0 * r)), imgsz)
+        im = cv2.resize(im, (w, h), interpolation=cv2.INTER_LINEAR if r > 1 else interpolation)
+    return np.ascontiguousarray(im), (h0, w0)
+
+
+def list_image_files(img_dir: Union[str, Path]) -> List[str]:
+    """与 ultralytics 一致地递归列出目录中的图片"""
+    return sorted(str(p) for p in Path(img_dir).rglob('*.*') if p.suffix[1:].lower() in IMG_FORMATS)
+
+
+def _listing_digest(image_files: List[str]) -> str:
+    """目录文件列表的摘要（含构建时跳过的无法解码的图片）"""
+    return hashlib.blake2b('\n'.join(image_files).encode(), digest_size=16).hexdigest()
+
+
+class PackedImageStore:
+    """
+    目录结构:
+        images.bin   所有缩放后图片的 BGR 像素，依次连续存放
+        index.npz    文件列表、像素偏移、缩放后/原始形状、源图片 mtime 与大小
+        meta.json    版本、imgsz、缩小插值方式、图片数与构建耗时
+    """
+
+    def __init__(self, root: Union[str, Path]):
+        self._open(root)
+
+    def __getstate__(self):
+        # dataloader 以 spawn 方式启动时只传路径，子进程重新映射，避免把整个存储序列化
+        return {'root': str(self.root)}
+
+    def __setstate__(self, state):
+        self._open(state['root'])
+
+    def _open(self, root: Union[str, Path]):
+        self.root = Path(root)
+        with open(self.root / 'meta.json', 'r', encoding='utf-8') as f:
+            self.meta = json.load(f)
+        index = np.load(self.root / 'index.npz')
+        self.files = [str(f) for f in index['files']]
+        self.offsets = index['offsets']
+        self.shapes = index['shapes']
+        self.orig_shapes = index['orig_shapes']
+        self.image_stats = index['image_stats']
+        # copy-on-write: 读取为零拷贝视图，个别增强若原地修改只影响内存中的页，不会写回文件
+        if self.meta['bytes']:
+            self.data = np.memmap(self.root / 'images.bin', dtype=np.uint8, mode='c')
+        else:
+            self.data = np.zeros(0, dtype=np.uint8)   # 空文件无法映射
+        self._lookup = {f: i for i, f in enumerate(self.files)}
+
+    def __len__(self) -> int:
+        return len(self.files)
+
+    @property
+    def imgsz(self) -> int:
+        return self.meta['imgsz']
+
+    def image(self, i: int) -> np.ndarray:
+        """第 i 张缩放后的图片 (h, w, 3)，内存映射视图"""
+        h, w = self.shapes[i]
+        start = self.offsets[i]
+        return self.data[start:start + h * w * 3].reshape(h, w, 3)
+
+    def index_of(self, path: str) -> int:
+        """图片在存储中的序号，未打包（构建时无法解码）返回 -1"""
+        return self._lookup.get(str(path), -1)
+
+    def size_mb(self) -> float:
+        return self.data.nbytes / 1024 / 1024
+
+    def is_fresh(self, image_files: List[str], imgsz: int, interpolation: int = cv2.INTER_LINEAR) -> bool:
+        """文件列表、imgsz、插值方式与每张源图片的 mtime/大小都未变化（标签变化由 ultralytics 标签缓存处理）"""
+        if (self.meta.get('version') != STORE_VERSION or self.imgsz != imgsz or
+                self.meta.get('interpolation') != interpolation or
+                self.meta.get('listing') != _listing_digest(image_files)):
+            return False
+        return all(tuple(s) == _file_stat(f) for f, s in zip(self.files, self.image_stats))
+
+    @classmethod
+    def build(cls, img_dir: Union[str, Path], root: Union[str, Path], imgsz: int,
+              workers: int = 8, image_files: Optional[List[str]] = None,
+              interpolation: int = cv2.INTER_LINEAR) -> 'PackedImageStore':
+        """
+        解码、缩放并打包整个图片目录
+
+        Args:
+            img_dir (str): 图片目录
+            root (str): 存储目录
+            imgsz (int): 训练输入尺寸
+            workers (int): 解码线程数（OpenCV 解码释放 GIL）
+            image_files (list): 已列出的图片文件，省略时扫描 img_dir
+            interpolation (int): 缩小图片的插值方式，见 shrink_interpolation
+        """
+        start = time.perf_counter()
+        root = Path(root)
+        image_files = image_files if image_files is not None else list_image_files(img_dir)
+        tmp = root.with_name(root.name + f".{os.getpid()}.tmp")
+        shutil.rmtree(tmp, ignore_errors=True)
+        tmp.mkdir(parents=True)
+
+        offsets, shapes, orig_shapes = [], [], []
+        files, image_stats = [], []
+        offset = 0
+        window = max(1, workers) * 4
+        with open(tmp / 'images.bin', 'wb') as f, ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            # 分窗口提交，解码并行、按顺序写入，内存中最多保留一个窗口的图片
+            for i in range(0, len(image_files), window):
+                chunk = image_files[i:i + window]
+                futures = [pool.submit(_load_resized, path, imgsz, interpolation) for path in chunk]
+                for path, future in zip(chunk, futures):
+                    try:
+                        im, orig = future.result()
+                    except ValueError as e:
+                        logger.warning(f"⚠️ Skipping {e}")
+                        continue
+                    f.write(im.data)
+                    offsets.append(offset)
+                    offset += im.nbytes
+                    shapes.append(im.shape[:2])
+                    orig_shapes.append(orig)
+                    files.append(path)
+                    image_stats.append(_file_stat(path))
+
+        np.savez(tmp / 'index.npz', files=np.array(files, dtype=str),
+                 offsets=np.array(offsets, dtype=np.int64).reshape(-1),
+                 shapes=np.array(shapes, dtype=np.int32).reshape(-1, 2),
+                 orig_shapes=np.array(orig_shapes, dtype=np.int32).reshape(-1, 2),
+                 image_stats=np.array(image_stats, dtype=np.int64).reshape(-1, 2))
+        elapsed = time.perf_counter() - start
+        with open(tmp / 'meta.json', 'w', encoding='utf-8') as f:
+            json.dump({'version': STORE_VERSION, 'imgsz': imgsz, 'interpolation': interpolation,
+                       'source': str(img_dir), 'images': len(files),
+                       'listing': _listing_digest(image_files), 'bytes': offset,
+                       'build_seconds': round(elapsed, 2)}, f, ensure_ascii=False, indent=2)
+
+        shutil.rmtree(root, ignore_errors=True)
+        root.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(tmp, root)
+        logger.info(f"📦 Packed {len(files)} images ({offset / 1024 / 1024:.1f} MB at imgsz {imgsz}) "
+                    f"into {root} in {elapsed:.1f}s")
+        return cls(root)
+
+    @classmethod
+    def open_or_build(cls, img_dir: Union[str, Path], cache_root: Union[str, Path], imgsz: int,
+                      workers: int = 8, augment: bool = True) -> 'PackedImageStore':
+        """
+        打开图片目录对应的存储，不存在或已过期时重建
+
+        Args:
+            augment (bool): 数据集是否做增强（训练集），决定与 ultralytics 一致的缩小插值方式
+        """
+        img_dir = Path(img_dir).resolve()
+        interpolation = shrink_interpolation(augment)
+        key = hashlib.blake2b(str(img_dir).encode(), digest_size=6).hexdigest()
+        suffix = '_area' if interpolation == cv2.INTER_AREA else ''
+        root = Path(cache_root) / f"{img_dir.name}_{key}_{imgsz}{suffix}"
+        image_files = list_image_files(img_dir)
+        if (root / 'meta.json').exists():
+            store = cls(root)
+            if store.is_fresh(image_files, imgsz, interpolation):
+                logger.info(f"📦 Using packed dataset {root} ({len(store)} images, {store.size_mb():.1f} MB)")
+                return store
+            logger.info(f"♻️ Dataset changed since {root} was built, rebuilding.")
+        return cls.build(img_dir, root, imgsz, workers=workers, image_files=image_files,
+                         interpolation=interpolation)
+
+
+class MmapYOLODataset(YOLODataset):
+    """从 PackedImageStore 读取图片的 YOLODataset，标签与增强流水线沿用 ultralytics 原实现"""
+
+    @classmethod
+    def wrap(cls, dataset: YOLODataset, store: PackedImageStore) -> 'MmapYOLODataset':
+        """把 ultralytics 构建好的数据集切换为从打包存储读图（不同版本构造参数差异较大，故不自行构造）"""
+        dataset.__class__ = cls
+        dataset.store = store
+        dataset.store_index = [store.index_of(f) for f in dataset.im_files]
+        missing = dataset.store_index.count(-1)
+        if missing:
+            logger.warning(f"⚠️ {missing}/{len(dataset.im_files)} images not in {store.root}, reading them raw.")
+        return dataset
+
+    def load_image(self, i: int, rect_mode: bool = True):
+        j = self.store_index[i]
+        if j < 0:
+            return super().load_image(i, rect_mode)
+        im = self.store.image(j)
+        if self.augment:
+            # Mosaic 从 buffer 中抽取拼接对象，保持与原实现相同的缓冲行为（图片本身不需要缓存）
+            self.buffer.append(i)
+            if len(self.buffer) > self.max_buffer_length:
+                self.buffer.pop(0)
+        return im, tuple(self.store.orig_shapes[j]), im.shape[:2]
+
+
+def mmap_trainer(cache_root: Union[str, Path], workers: int = 8) -> type:
+    """
+    创建使用打包存储的 DetectionTrainer 子类，传给 model.train(trainer=...)
+
+    Args:
+        cache_root (str): 打包存储根目录
+        workers (int): 构建存储时的解码线程数
+    """
+
+    class MmapDetectionTrainer(DetectionTrainer):
+        def build_dataset(self, img_path, mode='train', batch=None):
+            dataset = super().build_dataset(img_path, mode, batch)
+            if not isinstance(img_path, (str, Path)) or not Path(img_path).is_dir():
+                logger.warning(f"⚠️ Packed dataset needs an image directory, got {img_path}; reading raw files.")
+                return dataset
+            store = PackedImageStore.open_or_build(img_path, cache_root, self.args.imgsz, workers=workers,
+                                                   augment=dataset.augment)
+            return MmapYOLODataset.wrap(dataset, store)
+
+    return MmapDetectionTrainer
+
+
+class EpochTimer:
+    """通过训练回调记录每个 epoch 的耗时"""
+
+    def __init__(self):
+        self.epoch_seconds = []
+        self._start = None
+
+    def attach(self, model):
+        model.add_callback('on_train_epoch_start', self._on_start)
+        model.add_callback('on_train_epoch_end', self._on_end)
+
+    def _on_start(self, trainer):
+        self._start = time.perf_counter()
+
+    def _on_end(self, trainer):
+        if self._start is not None:
+            self.epoch_seconds.append(time.perf_counter() - self._start)
+
+    def summary(self) -> dict:
+        seconds = self.epoch_seconds
+        # 首个 epoch 含 dataloader 进程启动等一次性开销，稳态耗时取其余 epoch 的平均
+        steady = seconds[1:] or seconds
+        return {
+            'epochs': len(seconds),
+            'epoch_seconds': [round(s, 2) for s in seconds],
+            'mean_epoch_seconds': round(sum(steady) / len(steady), 2) if steady else 0.0,
+        }
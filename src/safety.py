@@ -0,0 +1,265 @@
+# -*- coding: utf-8 -*-
+"""
+安全警报引擎 (Safety Alert Engine)
+
+功能描述:
+    1. 读取 config.yaml 中 applications.safety 的警报类别与数量阈值
+    2. 逐帧检测结果只做轻量统计后放入无阻塞队列，规则评估在独立线程中进行
+    3. 时间窗口去抖：条件持续满足 debounce_seconds 才触发，触发后 cooldown_seconds 内不重复；
+       视频文件按画面时间（帧序号 / FPS）计时，摄像头按墙钟时间计时
+    4. 可插拔的警报输出：日志、JSONL 文件、本地 Webhook (HTTP POST JSON)
+
+使用方法:
+    python task1.py --mode camera --realtime --safety
+    python task1.py --mode video --source data/video/test.mp4 --safety --alert-sink jsonl:results/task1/alerts.jsonl
+    python task1.py --mode camera --safety --alert-sink log --alert-sink webhook:http://127.0.0.1:8080/alerts
+
+作者: my_yolo Team
+日期: 2026-10-16
+"""
+
+import json
+import time
+import queue
+import logging
+import threading
+import urllib.request
+from pathlib import Path
+from typing import List, Optional, Union
+
+import cv2
+import numpy as np
+
+from config import load_config
+
+logger = logging.getLogger(__name__)
+
+
+# ================= 警报输出 =================
+
+class LogSink:
+    """把警报写入日志（可选同时追加到独立的日志文件）"""
+
+    def __init__(self, path: Optional[Union[str, Path]] = None):
+        self._file = None
+        if path:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            self._file = open(path, 'a', encoding='utf-8')
+
+    def emit(self, alert: dict):
+        counts = ', '.join(f"{name}={n}" for name, n in alert['counts'].items())
+        message = (f"🚨 Safety alert: {alert['total']} objects (>= {alert['threshold']}) [{counts}] "
+                   f"at frame {alert['frame']}")
+        logger.warning(message)
+        if self._file is not None:
+            self._file.write(f"{alert['time']} {message}\n")
+            self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+
+
+class JsonlSink:
+    """把警报逐条追加为 JSONL 记录"""
+
+    def __init__(self, path: Union[str, Path]):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def emit(self, alert: dict):
+        self._file.write(json.dumps(alert, ensure_ascii=False) + '\n')
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class WebhookSink:
+    """以 HTTP POST JSON 的方式把警报发送到（本地）Webhook 地址"""
+
+    def __init__(self, url: str, timeout: float = 2.0):
+        self.url = url
+        self.timeout = timeout
+
+    def emit(self, alert: dict):
+        request = urllib.request.Request(self.url, data=json.dumps(alert).encode('utf-8'),
+                                         headers={'Content-Type': 'application/json'}, method='POST')
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout):
+                pass
+        except OSError as e:
+            logger.error(f"❌ Webhook delivery failed ({self.url}): {e}")
+
+    def close(self):
+        pass
+
+
+def build_sink(spec: str):
+    """
+    根据字符串创建警报输出
+
+    Args:
+        spec (str): 'log' | 'log:<path>' | 'jsonl:<path>' | 'webhook:<url>'
+    """
+    kind, _, target = spec.partition(':')
+    if kind == 'log':
+        return LogSink(target or None)
+    if kind == 'jsonl' and target:
+        return JsonlSink(target)
+    if kind == 'webhook' and target:
+        return WebhookSink(target)
+    raise ValueError(f"Unsupported alert sink: {spec} (use log[:path], jsonl:<path> or webhook:<url>)")
+
+
+# ================= 警报引擎 =================
+
+class SafetyMonitor:
+    """
+    安全警报监视器
+
+    作为 YOLODetector.detect_video_stream 的帧回调使用：hook(result, frame, fresh) -> frame。
+    回调内只统计警报类别数量并无阻塞入队，规则评估与警报发送都在后台线程完成
+    """
+
+    def __init__(self, alert_classes: List[str], alert_threshold: int, debounce_seconds: float = 1.0,
+                 cooldown_seconds: float = 10.0, sinks: Optional[list] = None, queue_size: int = 256):
+        """
+        Args:
+            alert_classes (list): 参与警报的类别名称
+            alert_threshold (int): 单帧警报类别目标总数达到该值视为条件满足
+            debounce_seconds (float): 条件需持续满足的时长，过滤单帧误检
+            cooldown_seconds (float): 两次警报之间的最短间隔
+            sinks (list): 警报输出，默认 [LogSink()]
+            queue_size (int): 评估队列长度，满时丢弃新帧而不阻塞调用方
+        """
+        self.alert_classes = list(alert_classes)
+        self.alert_threshold = int(alert_threshold)
+        self.debounce_seconds = debounce_seconds
+        self.cooldown_seconds = cooldown_seconds
+        self.sinks = sinks if sinks is not None else [LogSink()]
+        self.class_ids = None
+        self.names = {}
+        self.alerts = 0
+        self.frames = 0
+        self.dropped = 0
+        self.hook_seconds = 0.0
+        self.active = False
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._frame_idx = 0
+        self._media_frame = 0     # 回调收到的帧序号（含复用结果的帧），即输出视频中的帧位置
+        self.media_fps = None     # 非 None 时按画面时间计时，见 use_media_clock
+        self._thread = threading.Thread(target=self._evaluate_loop, name='safety', daemon=True)
+        self._thread.start()
+
+    @classmethod
+    def from_config(cls, cfg: Optional[dict] = None, **kwargs) -> 'SafetyMonitor':
+        """根据项目配置 (config.load_config) 的 applications.safety 创建监视器"""
+        safety_cfg = (cfg or load_config())['applications']['safety']
+        return cls(alert_classes=safety_cfg['alert_classes'], alert_threshold=safety_cfg['alert_threshold'],
+                   debounce_seconds=safety_cfg['debounce_seconds'],
+                   cooldown_seconds=safety_cfg['cooldown_seconds'], **kwargs)
+
+    def use_media_clock(self, fps: float):
+        """
+        视频文件按画面时间计时：处理速度快于或慢于实时时，去抖与冷却时长仍按视频时间计算
+        （由 YOLODetector.detect_video_stream 对文件源调用；摄像头保持墙钟时间）
+
+        Args:
+            fps (float): 视频帧率
+        """
+        self.media_fps = float(fps) if fps else None
+
+    def _resolve_classes(self, names: dict):
+        """把配置中的类别名称映射为模型类别 ID"""
+        self.names = names
+        lookup = {name: cid for cid, name in names.items()}
+        missing = [name for name in self.alert_classes if name not in lookup]
+        if missing:
+            logger.warning(f"⚠️ Safety alert classes not in model: {missing}")
+        self.class_ids = np.array([lookup[name] for name in self.alert_classes if name in lookup], dtype=np.int64)
+
+    def __call__(self, result, frame: np.ndarray, fresh: bool = True) -> np.ndarray:
+        """帧回调：统计警报类别数量并入队；警报持续期间在帧上标注"""
+        frame_no = self._media_frame
+        self._media_frame += 1
+        if fresh:
+            t0 = time.perf_counter()
+            if self.class_ids is None:
+                self._resolve_classes(result.names)
+            classes = result.boxes.cls.cpu().numpy().astype(np.int64)
+            counts = {int(cid): int(n) for cid, n in zip(*np.unique(classes[np.isin(classes, self.class_ids)],
+                                                                   return_counts=True))}
+            try:
+                wall = time.time()
+                t = frame_no / self.media_fps if self.media_fps else wall
+                self._queue.put_nowait((t, wall, frame_no, counts))
+            except queue.Full:
+                self.dropped += 1
+            self._frame_idx += 1
+            self.hook_seconds += time.perf_counter() - t0
+        if self.active:
+            cv2.putText(frame, 'SAFETY ALERT', (10, frame.shape[0] - 20),
+                        cv2.FONT_HERSHEY_SIMPLEX, 1.0, (0, 0, 255), 3)
+        return frame
+
+    def _evaluate_loop(self):
+        """后台线程：去抖判定并向各输出发送警报，收到 None 时退出"""
+        since = None          # 条件开始持续满足的时间（画面时间或墙钟时间）
+        last_alert = -float('inf')
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            t, wall, frame_idx, counts = item
+            self.frames += 1
+            total = sum(counts.values())
+            if total < self.alert_threshold:
+                since = None
+                self.active = False
+                continue
+
+            since = t if since is None else since
+            if t - since >= self.debounce_seconds and t - last_alert >= self.cooldown_seconds:
+                last_alert = t
+                self.active = True
+                alert = {
+                    'time': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(wall)),
+                    'timestamp': wall,
+                    'frame': frame_idx,
+                    'total': total,
+                    'threshold': self.alert_threshold,
+                    'counts': {self.names.get(cid, str(cid)): n for cid, n in counts.items()},
+                    'sustained_seconds': round(t - since, 3),
+                }
+                if self.media_fps:
+                    alert['media_seconds'] = round(t, 3)
+                self._fire(alert)
+
+    def _fire(self, alert: dict):
+        self.alerts += 1
+        for sink in self.sinks:
+            try:
+                sink.emit(alert)
+            except Exception as e:
+                logger.error(f"❌ Alert sink {type(sink).__name__} failed: {e}")
+
+    def summary(self) -> dict:
+        """警报次数与回调开销"""
+        calls = self._frame_idx
+        return {
+            'alerts': self.alerts,
+            'frames_evaluated': self.frames,
+            'frames_dropped': self.dropped,
+            'hook_ms_per_frame': round(self.hook_seconds / calls * 1000, 4) if calls else 0.0,
+        }
+
+    def close(self):
+        """处理完队列中剩余的帧后停止后台线程并关闭输出"""
+        self._queue.put(None)
+        self._thread.join()
+        for sink in self.sinks:
+            sink.close()
+        summary = self.summary()
+        logger.info(f"🛡️ Safety: {summary['alerts']} alerts over {summary['frames_evaluated']} frames "
+                    f"(dropped {summary['frames_dropped']}) | hook cost {summary['hook_ms_per_frame']} ms/frame")
@@ -0,0 +1,254 @@
+# -*- coding: utf-8 -*-
+"""
+切片推理 (Tiled / Sliced Inference)
+
+功能描述:
+    1. 将高分辨率图片切成带重叠的固定尺寸切片，避免整图缩放到 640 后小目标消失
+    2. 所有切片（可选再加一张整图缩略）按 tile_batch 组批送入模型，默认一次前向完成
+    3. 切片坐标批量平移回原图，被切片边界截断的同类框先按 IoS（交集/较小框面积）合并为外接框，
+       再使用 torchvision batched_nms 按类别做跨切片 NMS
+    4. 合并结果封装为 ultralytics Results，可直接 plot() / 写入缓存与结构化输出
+    5. 测量不同切片批大小下的吞吐，用于选择 tile_batch
+
+使用方法:
+    python task1.py --mode image --source data/image_4k --slice --tile 640 --tile-overlap 0.2 --tile-batch 8
+    python task1.py --mode image --source data/image_4k --slice --tile 640 --tile-bench 1 2 4 8 16
+
+作者: my_yolo Team
+日期: 2026-10-16
+"""
+
+import time
+import logging
+from typing import List, Optional, Tuple
+
+import numpy as np
+import torch
+import torchvision
+
+logger = logging.getLogger(__name__)
+
+
+def tile_grid(height: int, width: int, tile: int, overlap: float) -> List[Tuple[int, int, int, int]]:
+    """
+    计算覆盖整图的切片窗口，末尾切片向内对齐，保证每块都是完整尺寸（图片小于切片时除外）
+
+    Returns:
+        list: (x0, y0, x1, y1) 列表
+    """
+    stride = max(1, int(tile * (1 - overlap)))
+
+    def starts(size: int) -> List[int]:
+        if size <= tile:
+            return [0]
+        points = list(range(0, size - tile, stride))
+        points.append(size - tile)
+        return points
+
+    return [(x, y, min(x + tile, width), min(y + tile, height))
+            for y in starts(height) for x in starts(width)]
+
+
+def touches_tile_edge(boxes: torch.Tensor, window: Tuple[int, int, int, int], width: int, height: int,
+                      margin: float = 2.0) -> torch.Tensor:
+    """
+    判断框是否贴住切片的内部边界（即被切片截断；贴住原图边界的不算）
+
+    Args:
+        boxes (torch.Tensor): (N, 4) 原图坐标
+        window (tuple): 切片窗口 (x0, y0, x1, y1)
+
+    Returns:
+        torch.Tensor: (N,) bool
+    """
+    x0, y0, x1, y1 = window
+    cut = torch.zeros(len(boxes), dtype=torch.bool)
+    if x0 > 0:
+        cut |= boxes[:, 0] <= x0 + margin
+    if y0 > 0:
+        cut |= boxes[:, 1] <= y0 + margin
+    if x1 < width:
+        cut |= boxes[:, 2] >= x1 - margin
+    if y1 < height:
+        cut |= boxes[:, 3] >= y1 - margin
+    return cut
+
+
+def merge_cut_boxes(boxes: torch.Tensor, scores: torch.Tensor, classes: torch.Tensor,
+                    cut: torch.Tensor, ios: float) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+    """
+    合并被切片边界截断的同类框：同一目标在相邻切片里各检出一部分，两框 IoU 很低、NMS 无法去重，
+    但较小的部分框基本落在另一框内。按置信度从高到低，把 IoS（交集/较小框面积）不低于阈值、
+    且至少一方被截断的同类框并入外接框，置信度取最大值
+
+    Args:
+        cut (torch.Tensor): (N,) bool，框是否贴住切片内部边界（见 touches_tile_edge）
+        ios (float): IoS 阈值，<= 0 表示不合并
+
+    Returns:
+        tuple: 合并后的 (boxes, scores, classes)
+    """
+    if ios <= 0 or not bool(cut.any()):
+        return boxes, scores, classes
+    order = scores.argsort(descending=True)
+    boxes, scores, classes, cut = boxes[order].clone(), scores[order], classes[order], cut[order]
+
+    lt = torch.max(boxes[:, None, :2], boxes[None, :, :2])
+    rb = torch.min(boxes[:, None, 2:], boxes[None, :, 2:])
+    inter = (rb - lt).clamp(min=0).prod(dim=2)
+    area = torchvision.ops.box_area(boxes)
+    smaller = torch.min(area[:, None], area[None, :]).clamp(min=1e-6)
+    mergeable = ((inter / smaller) >= ios) & (classes[:, None] == classes[None, :]) & (cut[:, None] | cut[None, :])
+    mergeable.fill_diagonal_(False)
+
+    absorbed = torch.zeros(len(boxes), dtype=torch.bool)
+    for i in range(len(boxes)):
+        if absorbed[i]:
+            continue
+        members = (mergeable[i] & ~absorbed).nonzero().flatten()
+        if len(members):
+            group = torch.cat([boxes[i:i + 1], boxes[members]])
+            boxes[i, :2] = group[:, :2].min(dim=0).values
+            boxes[i, 2:] = group[:, 2:].max(dim=0).values
+            absorbed[members] = True
+    keep = ~absorbed
+    return boxes[keep], scores[keep], classes[keep]
+
+
+def merge_detections(boxes: torch.Tensor, scores: torch.Tensor, classes: torch.Tensor,
+                     iou: float, max_det: int = 300, cut: Optional[torch.Tensor] = None,
+                     merge_ios: float = 0.0) -> torch.Tensor:
+    """
+    按类别做跨切片 NMS；给出 cut 时先用 merge_cut_boxes 合并被切片边界截断的框
+
+    Returns:
+        torch.Tensor: (N, 6) [x1, y1, x2, y2, conf, cls]，即 ultralytics Boxes 的数据格式
+    """
+    if boxes.numel() == 0:
+        return torch.zeros((0, 6), dtype=torch.float32)
+    if cut is not None:
+        boxes, scores, classes = merge_cut_boxes(boxes, scores, classes, cut, merge_ios)
+    keep = torchvision.ops.batched_nms(boxes, scores, classes.long(), iou)[:max_det]
+    return torch.cat([boxes[keep], scores[keep, None], classes[keep, None].float()], dim=1)
+
+
+class SlicedPredictor:
+    """对单张大图执行切片推理"""
+
+    def __init__(self, model, tile: int = 640, overlap: float = 0.2, tile_batch: Optional[int] = None,
+                 merge_iou: float = 0.5, merge_ios: float = 0.6, include_full: bool = True,
+                 predict_args: Optional[dict] = None):
+        """
+        Args:
+            model (YOLO): 已加载的模型
+            tile (int): 切片边长（像素），同时作为推理输入尺寸
+            overlap (float): 相邻切片的重叠比例，应大于待检测目标尺寸占切片的比例
+            tile_batch (int): 每次前向的切片数，None 表示全部切片一次前向
+            merge_iou (float): 跨切片 NMS 的 IoU 阈值
+            merge_ios (float): 被切片边界截断的同类框按 IoS 合并的阈值，0 表示不合并
+            include_full (bool): 是否额外对整图缩略推理一次，召回跨越多块切片的大目标
+            predict_args (dict): 其余推理参数 (conf, iou, max_det, half)
+        """
+        self.model = model
+        self.tile = tile
+        self.overlap = overlap
+        self.tile_batch = tile_batch
+        self.merge_iou = merge_iou
+        self.merge_ios = merge_ios
+        self.include_full = include_full
+        self.predict_args = {k: v for k, v in (predict_args or {}).items() if k != 'imgsz'}
+        self.last_stats = {}
+
+    def predict(self, image: np.ndarray, path: str = ''):
+        """
+        切片推理一张 BGR 图片
+
+        Returns:
+            Results: 合并后的检测结果（坐标为原图像素）
+        """
+        from ultralytics.engine.results import Results
+
+        t_start = time.perf_counter()
+        h, w = image.shape[:2]
+        windows = tile_grid(h, w, self.tile, self.overlap)
+        crops = [image[y0:y1, x0:x1] for x0, y0, x1, y1 in windows]
+        offsets = torch.tensor([[x0, y0, x0, y0] for x0, y0, _, _ in windows], dtype=torch.float32)
+
+        batch = self.tile_batch or len(crops)
+        tile_results = []
+        forward_passes = 0
+        for i in range(0, len(crops), batch):
+            tile_results.extend(self.model.predict(crops[i:i + batch], imgsz=self.tile, verbose=False,
+                                                   **self.predict_args))
+            forward_passes += 1
+
+        boxes, scores, classes, cut = [], [], [], []
+        for window, offset, result in zip(windows, offsets, tile_results):
+            data = result.boxes.data.cpu()
+            if len(data):
+                boxes.append(data[:, :4] + offset)
+                scores.append(data[:, 4])
+                classes.append(data[:, 5])
+                cut.append(touches_tile_edge(boxes[-1], window, w, h))
+
+        if self.include_full and len(windows) > 1:
+            full = self.model.predict(image, imgsz=self.tile, verbose=False, **self.predict_args)[0].boxes.data.cpu()
+            forward_passes += 1
+            if len(full):
+                boxes.append(full[:, :4])
+                scores.append(full[:, 4])
+                classes.append(full[:, 5])
+                cut.append(torch.zeros(len(full), dtype=torch.bool))
+        t_infer = time.perf_counter()
+
+        if boxes:
+            merged = merge_detections(torch.cat(boxes), torch.cat(scores), torch.cat(classes),
+                                      self.merge_iou, self.predict_args.get('max_det', 300),
+                                      cut=torch.cat(cut), merge_ios=self.merge_ios)
+        else:
+            merged = torch.zeros((0, 6), dtype=torch.float32)
+        t_done = time.perf_counter()
+
+        raw = int(sum(len(b) for b in boxes))
+        self.last_stats = {
+            'tiles': len(windows),
+            'forward_passes': forward_passes,
+            'raw_detections': raw,
+            'merged_detections': len(merged),
+            'inference_ms': round((t_infer - t_start) * 1000, 2),
+            'merge_ms': round((t_done - t_infer) * 1000, 2),
+        }
+        result = Results(orig_img=image, path=path, names=self.model.names, boxes=merged)
+        result.speed = {'preprocess': None, 'inference': self.last_stats['inference_ms'],
+                        'postprocess': self.last_stats['merge_ms']}
+        return result
+
+    def benchmark_tile_batches(self, image: np.ndarray, batch_sizes: List[int], repeats: int = 3) -> List[dict]:
+        """
+        测量不同切片批大小下的吞吐（每个批大小先预热一次）
+
+        Returns:
+            list: 每个批大小的 tiles/s、单图耗时
+        """
+        original = self.tile_batch
+        rows = []
+        try:
+            for batch in batch_sizes:
+                self.tile_batch = batch
+                self.predict(image)
+                t0 = time.perf_counter()
+                for _ in range(repeats):
+                    self.predict(image)
+                per_image = (time.perf_counter() - t0) / repeats
+                tiles = self.last_stats['tiles']
+                rows.append({
+                    'tile_batch': batch,
+                    'tiles': tiles,
+                    'image_ms': round(per_image * 1000, 1),
+                    'tiles_per_sec': round(tiles / per_image, 2) if per_image > 0 else 0.0,
+                })
+                logger.info(f"   tile_batch={batch:<3} {rows[-1]['image_ms']:>8.1f} ms/image | "
+                            f"{rows[-1]['tiles_per_sec']:>7.2f} tiles/s ({tiles} tiles)")
+        finally:
+            self.tile_batch = original
+        return rows
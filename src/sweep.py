@@ -0,0 +1,383 @@
+# -*- coding: utf-8 -*-
+"""
+超参数搜索 (Hyperparameter Sweep Runner)
+
+功能描述:
+    1. 读取搜索配置文件 (sweep.yaml)：搜索空间可包含 lr0、imgsz、batch、模型大小、增强强度等任意训练参数
+    2. 网格搜索或随机搜索生成试验；多个试验在独立进程中并行训练，按进程划分 CPU 线程避免核间争抢
+    3. 中位数剪枝：每个 epoch 结束时读取其他试验的 results.csv，
+       若本试验至今最佳指标低于同一 epoch 其他试验的指定分位数，提前停止
+    4. 已完成/已剪枝的试验记录在 trials.json 中，中断后以同一配置重跑会跳过这些试验
+    5. 汇总为排行榜 (leaderboard.csv / leaderboard.json)
+
+使用方法:
+    python task2.py --mode sweep --sweep-spec sweep.yaml
+    python task2.py --mode sweep --sweep-spec sweep.yaml --sweep-parallel 8
+
+作者: my_yolo Team
+日期: 2026-10-16
+"""
+
+import os
+import csv
+import json
+import math
+import time
+import random
+import shutil
+import hashlib
+import logging
+import itertools
+import multiprocessing
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import List, Optional, Union
+
+import yaml
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_METRIC = 'metrics/mAP50-95(B)'
+
+# 增强强度预设，default 即 ultralytics 默认值
+AUG_PRESETS = {
+    'none': {'hsv_h': 0.0, 'hsv_s': 0.0, 'hsv_v': 0.0, 'degrees': 0.0, 'translate': 0.0, 'scale': 0.0,
+             'fliplr': 0.0, 'mosaic': 0.0, 'mixup': 0.0},
+    'light': {'hsv_h': 0.01, 'hsv_s': 0.4, 'hsv_v': 0.2, 'degrees': 0.0, 'translate': 0.05, 'scale': 0.25,
+              'fliplr': 0.5, 'mosaic': 0.5, 'mixup': 0.0},
+    'default': {'hsv_h': 0.015, 'hsv_s': 0.7, 'hsv_v': 0.4, 'degrees': 0.0, 'translate': 0.1, 'scale': 0.5,
+                'fliplr': 0.5, 'mosaic': 1.0, 'mixup': 0.0},
+    'heavy': {'hsv_h': 0.02, 'hsv_s': 0.9, 'hsv_v': 0.5, 'degrees': 10.0, 'translate': 0.2, 'scale': 0.9,
+              'fliplr': 0.5, 'mosaic': 1.0, 'mixup': 0.15},
+}
+
+
+def aug_args(strength: Union[str, float]) -> dict:
+    """
+    增强强度转为 ultralytics 训练参数：预设名称，或以 default 为 1.0 的缩放系数（概率类参数截断到 1）
+
+    数值强度不缩放 fliplr：翻转概率不是强度，0.5 时增强最充分，1.0 等于每张都翻转、反而没有增强
+    """
+    if isinstance(strength, str):
+        if strength not in AUG_PRESETS:
+            raise ValueError(f"unknown augmentation preset: {strength} (choose from {list(AUG_PRESETS)})")
+        return dict(AUG_PRESETS[strength])
+    scaled = {k: round(v * float(strength), 4) for k, v in AUG_PRESETS['default'].items()}
+    scaled['fliplr'] = AUG_PRESETS['default']['fliplr'] if float(strength) > 0 else 0.0
+    for key in ('hsv_h', 'hsv_s', 'hsv_v', 'mosaic', 'scale'):
+        scaled[key] = min(scaled[key], 1.0)
+    return scaled
+
+
+def load_spec(path: Union[str, Path]) -> dict:
+    """读取并补全搜索配置"""
+    with open(path, 'r', encoding='utf-8') as f:
+        spec = yaml.safe_load(f) or {}
+    if not spec.get('space'):
+        raise ValueError(f"{path}: sweep spec needs a non-empty 'space'")
+    spec.setdefault('name', Path(path).stem)
+    spec.setdefault('strategy', 'grid')
+    spec.setdefault('trials', 8)
+    spec.setdefault('seed', 0)
+    spec.setdefault('parallel', 2)
+    spec.setdefault('threads_per_trial', 0)
+    spec.setdefault('metric', DEFAULT_METRIC)
+    spec.setdefault('fixed', {})
+    spec['prune'] = {'enabled': True, 'min_epochs': 5, 'min_trials': 3, 'percentile': 50,
+                     **(spec.get('prune') or {})}
+    if spec['strategy'] not in ('grid', 'random'):
+        raise ValueError(f"{path}: strategy must be 'grid' or 'random', got {spec['strategy']!r}")
+    if spec['strategy'] == 'grid':
+        ranges = [k for k, v in spec['space'].items() if not isinstance(v, list)]
+        if ranges:
+            raise ValueError(f"{path}: grid search needs value lists, got ranges for {ranges}")
+    return spec
+
+
+def _sample(values, rng: random.Random):
+    """列表为离散取值；{low, high, log, int} 为连续区间"""
+    if isinstance(values, list):
+        return rng.choice(values)
+    low, high = float(values['low']), float(values['high'])
+    if values.get('log'):
+        value = math.exp(rng.uniform(math.log(low), math.log(high)))
+    else:
+        value = rng.uniform(low, high)
+    return int(round(value)) if values.get('int') else round(value, 6)
+
+
+def generate_trials(spec: dict) -> List[dict]:
+    """按搜索策略生成试验参数列表"""
+    space = spec['space']
+    keys = sorted(space)
+    if spec['strategy'] == 'grid':
+        combos = [dict(zip(keys, values)) for values in itertools.product(*(space[k] for k in keys))]
+    else:
+        rng = random.Random(spec['seed'])
+        combos = []
+        seen = set()
+        # 离散空间可能小于试验数，有限次尝试后停止去重
+        for _ in range(spec['trials'] * 20):
+            params = {k: _sample(space[k], rng) for k in keys}
+            key = json.dumps(params, sort_keys=True)
+            if key not in seen:
+                seen.add(key)
+                combos.append(params)
+            if len(combos) >= spec['trials']:
+                break
+    return [{'id': f"trial_{i:03d}", 'params': params} for i, params in enumerate(combos)]
+
+
+def _percentile(values: List[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q / 100 * len(values)))]
+
+
+def read_metric_history(csv_path: Path, metric: str) -> List[float]:
+    """读取 ultralytics results.csv 中某一指标的逐 epoch 数值（列名可能带前导空格）"""
+    if not csv_path.exists():
+        return []
+    with open(csv_path, 'r', encoding='utf-8', newline='') as f:
+        rows = [{k.strip(): v for k, v in row.items()} for row in csv.DictReader(f)]
+    history = []
+    for row in rows:
+        try:
+            history.append(float(row[metric]))
+        except (KeyError, TypeError, ValueError):
+            history.append(float('nan'))
+    return history
+
+
+class MedianPruner:
+    """
+    中位数剪枝（可配置分位数）：达到 min_epochs 后，若本试验至今最佳指标
+    低于其他试验在同一 epoch 时至今最佳指标的 percentile 分位数，则停止
+    """
+
+    def __init__(self, sweep_dir: Path, trial_id: str, metric: str, min_epochs: int = 5,
+                 min_trials: int = 3, percentile: float = 50, **_):
+        self.sweep_dir = sweep_dir
+        self.trial_id = trial_id
+        self.metric = metric
+        self.min_epochs = min_epochs
+        self.min_trials = min_trials
+        self.percentile = percentile
+        self.history = []
+        self.pruned_at = None
+
+    def _peer_best(self, epoch: int) -> List[float]:
+        values = []
+        for csv_path in self.sweep_dir.glob('trial_*/results.csv'):
+            if csv_path.parent.name == self.trial_id:
+                continue
+            history = [v for v in read_metric_history(csv_path, self.metric)[:epoch] if v == v]
+            if len(history) >= epoch:
+                values.append(max(history))
+        return values
+
+    def __call__(self, trainer):
+        """on_fit_epoch_end 回调"""
+        value = (trainer.metrics or {}).get(self.metric)
+        if value is None:
+            return
+        self.history.append(float(value))
+        epoch = len(self.history)
+        if epoch < self.min_epochs:
+            return
+        peers = self._peer_best(epoch)
+        if len(peers) < self.min_trials:
+            return
+        threshold = _percentile(peers, self.percentile)
+        best = max(self.history)
+        if best < threshold:
+            self.pruned_at = epoch
+            trainer.stop = True
+            logger.info(f"✂️ {self.trial_id} pruned at epoch {epoch}: best {self.metric} {best:.4f} < "
+                        f"p{self.percentile:g} of {len(peers)} peers ({threshold:.4f})")
+
+
+THREAD_ENV_VARS = ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS')
+
+
+@contextmanager
+def _thread_env(threads: int):
+    """
+    在父进程中临时设置线程数环境变量，由 spawn 出的工作进程继承。
+    spawn 子进程在执行 initializer 之前就会以 __mp_main__ 重新导入主模块（task2.py 会导入 torch），
+    OpenMP/MKL 只在首次加载时读取这些变量，在 initializer 里设置已经太晚
+    """
+    saved = {var: os.environ.get(var) for var in THREAD_ENV_VARS}
+    os.environ.update({var: str(threads) for var in THREAD_ENV_VARS})
+    try:
+        yield
+    finally:
+        for var, value in saved.items():
+            if value is None:
+                os.environ.pop(var, None)
+            else:
+                os.environ[var] = value
+
+
+def _init_trial_worker(threads: int):
+    """工作进程初始化：限制 torch/cv2 线程数，每个试验只使用分配到的核（环境变量由 _thread_env 在父进程设置）"""
+    import cv2
+    import torch
+    torch.set_num_threads(threads)
+    cv2.setNumThreads(1)
+
+
+def run_trial(trial: dict, spec: dict, sweep_dir: str) -> dict:
+    """
+    在工作进程中训练一个试验
+
+    Returns:
+        dict: 试验记录（参数、状态、最佳指标、运行 epoch 数、耗时）
+    """
+    from ultralytics import YOLO
+
+    sweep_dir = Path(sweep_dir)
+    params = dict(trial['params'])
+    model_name = params.pop('model', spec['fixed'].get('model', 'yolov8n.pt'))
+    train_args = {k: v for k, v in spec['fixed'].items() if k != 'model'}
+    if 'aug' in params:
+        train_args.update(aug_args(params.pop('aug')))
+    train_args.update(params)
+    train_args.setdefault('epochs', spec.get('epochs', 30))
+    train_args.setdefault('workers', 2)
+
+    # ultralytics 会向已有的 results.csv 追加：重试失败的试验前清掉上一次的输出，
+    # 否则旧 epoch 会混入本次的 epochs_run / best_metric，也会被其他试验的剪枝器读到
+    shutil.rmtree(sweep_dir / trial['id'], ignore_errors=True)
+    start = time.perf_counter()
+    model = YOLO(model_name)
+    pruner = None
+    if spec['prune']['enabled']:
+        pruner = MedianPruner(sweep_dir, trial['id'], spec['metric'], **spec['prune'])
+        model.add_callback('on_fit_epoch_end', pruner)
+    model.train(data=spec['data'], project=str(sweep_dir), name=trial['id'], exist_ok=True,
+                plots=False, verbose=False, **train_args)
+
+    history = read_metric_history(sweep_dir / trial['id'] / 'results.csv', spec['metric'])
+    valid = [(v, i) for i, v in enumerate(history, 1) if v == v]
+    best, best_epoch = max(valid) if valid else (None, None)
+    return {
+        'id': trial['id'],
+        'params': trial['params'],
+        'status': 'pruned' if pruner is not None and pruner.pruned_at else 'completed',
+        'epochs_run': len(history),
+        'best_metric': round(best, 5) if best is not None else None,
+        'best_epoch': best_epoch,
+        'seconds': round(time.perf_counter() - start, 1),
+        'pid': os.getpid(),
+    }
+
+
+def _save_manifest(manifest: dict, path: Path):
+    tmp = path.with_suffix('.tmp')
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+
+def run_sweep(spec_path: Union[str, Path], results_dir: Union[str, Path] = 'results/task2/sweeps',
+              parallel: Optional[int] = None, data: Optional[str] = None) -> List[dict]:
+    """
+    执行搜索并输出排行榜
+
+    Args:
+        spec_path (str): 搜索配置文件
+        results_dir (str): 搜索结果根目录，每个搜索写入 <results_dir>/<name>/
+        parallel (int): 并行试验数，默认取配置文件 parallel
+        data (str): 数据集 yaml，默认取配置文件 data
+
+    Returns:
+        list: 按指标排序的试验记录
+    """
+    spec = load_spec(spec_path)
+    if data:
+        spec['data'] = data
+    if not spec.get('data') or not Path(spec['data']).exists():
+        raise FileNotFoundError(f"Dataset config not found: {spec.get('data')}")
+    parallel = max(1, parallel or spec['parallel'])
+    threads = spec['threads_per_trial'] or max(1, (os.cpu_count() or 1) // parallel)
+
+    sweep_dir = Path(results_dir) / spec['name']
+    sweep_dir.mkdir(parents=True, exist_ok=True)
+    manifest_path = sweep_dir / 'trials.json'
+    trials = generate_trials(spec)
+
+    # 配置指纹：搜索空间或训练参数变化时不能复用旧的试验记录
+    spec_key = hashlib.blake2b(json.dumps(spec, sort_keys=True, default=str).encode('utf-8'),
+                               digest_size=16).hexdigest()
+    manifest = {}
+    if manifest_path.exists():
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    if manifest.get('spec_key') != spec_key:
+        # 配置变化后旧试验目录不再可比，删除以免剪枝器把它们当作同组试验
+        stale = [d for d in sweep_dir.glob('trial_*') if d.is_dir()]
+        for trial_dir in stale:
+            shutil.rmtree(trial_dir, ignore_errors=True)
+        if stale:
+            logger.info(f"🧹 Sweep spec changed, removed {len(stale)} old trial directories.")
+        manifest = {'spec_key': spec_key, 'spec': spec, 'trials': {}}
+    todo = [t for t in trials if t['id'] not in manifest['trials']]
+
+    logger.info(f"🔬 Sweep '{spec['name']}': {len(trials)} trials ({spec['strategy']}), "
+                f"{parallel} parallel x {threads} threads, metric {spec['metric']}")
+    if len(todo) < len(trials):
+        logger.info(f"♻️ Resuming: {len(trials) - len(todo)} trials already finished, {len(todo)} remaining.")
+
+    start = time.perf_counter()
+    if todo:
+        ctx = multiprocessing.get_context('spawn')
+        with _thread_env(threads), ProcessPoolExecutor(max_workers=parallel, mp_context=ctx,
+                                                       initializer=_init_trial_worker,
+                                                       initargs=(threads,)) as pool:
+            futures = {pool.submit(run_trial, t, spec, str(sweep_dir)): t for t in todo}
+            for future in as_completed(futures):
+                trial = futures[future]
+                try:
+                    record = future.result()
+                except Exception as e:
+                    logger.error(f"❌ {trial['id']} failed ({trial['params']}): {e}")
+                    continue
+                manifest['trials'][trial['id']] = record
+                _save_manifest(manifest, manifest_path)
+                logger.info(f"✅ {record['id']} {record['status']} after {record['epochs_run']} epochs: "
+                            f"{spec['metric']} {record['best_metric']} in {record['seconds']}s "
+                            f"[{len(manifest['trials'])}/{len(trials)}]")
+    logger.info(f"⏱️ Sweep wall time this run: {time.perf_counter() - start:.1f}s")
+
+    leaderboard = write_leaderboard(list(manifest['trials'].values()), sweep_dir, spec['metric'])
+    failed = len(trials) - len(manifest['trials'])
+    if failed:
+        logger.warning(f"⚠️ {failed} trials failed. Re-run the same command to retry them.")
+    return leaderboard
+
+
+def write_leaderboard(records: List[dict], sweep_dir: Path, metric: str, top: int = 10) -> List[dict]:
+    """按最佳指标降序排列，写出 CSV/JSON 并打印前 top 名"""
+    ranked = sorted(records, key=lambda r: (r['best_metric'] is not None, r['best_metric'] or 0), reverse=True)
+    param_keys = sorted({k for r in ranked for k in r['params']})
+    with open(sweep_dir / 'leaderboard.csv', 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['rank', 'id', *param_keys, 'status', 'epochs_run', 'best_epoch', metric, 'seconds'])
+        for rank, r in enumerate(ranked, 1):
+            writer.writerow([rank, r['id'], *(r['params'].get(k) for k in param_keys), r['status'],
+                             r['epochs_run'], r['best_epoch'], r['best_metric'], r['seconds']])
+    with open(sweep_dir / 'leaderboard.json', 'w', encoding='utf-8') as f:
+        json.dump(ranked, f, ensure_ascii=False, indent=2)
+
+    logger.info("=" * 60)
+    logger.info(f"🏆 Leaderboard ({metric}):")
+    for rank, r in enumerate(ranked[:top], 1):
+        params = ', '.join(f"{k}={r['params'][k]}" for k in param_keys if k in r['params'])
+        logger.info(f"   {rank:>2}. {r['id']} {r['best_metric']} ({r['status']}, {r['epochs_run']} ep) | {params}")
+    pruned = sum(r['status'] == 'pruned' for r in ranked)
+    if ranked:
+        logger.info(f"✂️ Pruned {pruned}/{len(ranked)} trials | "
+                    f"epochs run {sum(r['epochs_run'] for r in ranked)}")
+    logger.info(f"💾 Leaderboard saved to: {sweep_dir / 'leaderboard.csv'}")
+    return ranked
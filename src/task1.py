@@ -10,8 +10,21 @@ Task 1: 环境搭建与模型体验 (Environment Setup & Model Experience)
 
 使用方法:
     python task1.py --mode image --source data/image
+    python task1.py --mode image --source data/image --batch 16 --readers 4 --writers 2
+    python task1.py --mode image --source data/image --cache results/cache/detections.db
+    python task1.py --mode image --source data/image --output results/task1/detections.jsonl --no-render
+    python task1.py --mode image --source data/image --workers 8 --batch 8 --output results/task1/detections.jsonl
     python task1.py --mode video --source data/video/test.mp4
+    python task1.py --mode video --source data/video/test.mp4 --pipeline
     python task1.py --mode camera
+    python task1.py --mode camera --realtime --latency-budget 0.15
+    python task1.py --mode video --source data/video/test.mp4 --count
+    python task1.py --mode camera --realtime --safety --alert-sink jsonl:results/task1/alerts.jsonl
+    python task1.py --mode image --source data/image --set detection.img_size=1280 --set detection.max_det=100
+    python task1.py --mode image --source data/image_4k --slice --tile 640 --tile-batch 8
+    python task1.py --mode image --source data/image_4k --slice --tile-bench 1 2 4 8 16
+
+    未显式指定的 --conf / --iou / --imgsz / --max-det / --batch / --model 取自 config.yaml (detection / models)
 
 作者: my_yolo Team
 日期: 2023-12-22
@@ -19,11 +32,18 @@ Task 1: 环境搭建与模型体验 (Environment Setup & Model Experience)
 
 import os
 import sys
+import json
 import time
+import queue
+import shutil
+import hashlib
 import logging
 import argparse
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import Union
+from typing import Callable, List, Optional, Union
 
 # 尝试导入核心库
 try:
@@ -38,6 +58,16 @@ except ImportError:
     print("❌ Error: 'ultralytics' not found. Please install requirements: pip install -r requirements.txt")
     sys.exit(1)
 
+from detection_cache import DetectionCache, file_digest
+from detection_writer import DetectionWriter
+from config import add_config_args, config_from_args, pick
+from model_registry import get_registry
+from slicing import SlicedPredictor
+from motion import MotionGate
+from video_io import BACKENDS, open_video
+from counter import LineCounter
+from safety import SafetyMonitor, build_sink
+
 # 配置日志
 logging.basicConfig(
     level=logging.INFO,
@@ -47,19 +77,117 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+def list_images(source_dir: str) -> List[Path]:
+    """列出目录下的图片（按文件名排序，保证多进程分片稳定）"""
+    # 支持常见图片格式
+    img_extensions = {'.jpg', '.jpeg', '.png', '.bmp', '.webp'}
+    return sorted(p for p in Path(source_dir).iterdir() if p.suffix.lower() in img_extensions)
+
+
+class StageStats:
+    """流水线单个阶段的耗时统计（每个阶段只由一个线程更新，无需加锁）"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+
+    @property
+    def avg_ms(self) -> float:
+        return self.total / self.count * 1000 if self.count else 0.0
+
+    def as_dict(self, wall: float) -> dict:
+        return {
+            'frames': self.count,
+            'avg_ms': round(self.avg_ms, 2),
+            'max_fps': round(1000.0 / self.avg_ms, 1) if self.avg_ms else 0.0,
+            'busy_pct': round(self.total / wall * 100, 1) if wall > 0 else 0.0,
+        }
+
+
+def _put_frame(q: queue.Queue, item, drop_policy: str, stop_event: threading.Event) -> int:
+    """
+    按丢帧策略写入有界队列
+
+    Args:
+        drop_policy (str): 'drop_oldest' 队列满时丢弃最旧的一帧（实时摄像头），
+                           'block' 队列满时阻塞等待（视频文件，保证不丢帧）；
+                           下游线程出错时会设置 stop_event，阻塞等待随之退出
+
+    Returns:
+        int: 本次被丢弃的帧数
+    """
+    if drop_policy == 'drop_oldest':
+        dropped = 0
+        while True:
+            try:
+                q.put_nowait(item)
+                return dropped
+            except queue.Full:
+                try:
+                    q.get_nowait()
+                    dropped += 1
+                except queue.Empty:
+                    pass
+
+    while not stop_event.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return 0
+        except queue.Full:
+            continue
+    return 0
+
+
+def _iter_queue(q: queue.Queue, producer_done, stop_event: threading.Event):
+    """持续从队列取数据，直到上游结束且队列清空，或收到停止信号"""
+    while not stop_event.is_set():
+        try:
+            yield q.get(timeout=0.1)
+        except queue.Empty:
+            if producer_done() and q.empty():
+                return
+
+
+def _guarded(target: Callable, errors: list, stop_event: threading.Event) -> Callable:
+    """
+    包装流水线线程函数：出错时记录异常并设置 stop_event，通知其他阶段退出，
+    由主线程在回收线程后重新抛出
+    """
+    def run():
+        try:
+            target()
+        except BaseException as e:
+            logger.error(f"❌ Pipeline thread '{threading.current_thread().name}' failed: {e}")
+            errors.append(e)
+            stop_event.set()
+    return run
+
+
 class YOLODetector:
     """YOLOv8 检测器类，封装核心检测逻辑"""
 
-    def __init__(self, model_name: str = 'yolov8n.pt', results_dir: str = 'results'):
+    def __init__(self, model_name: str = 'yolov8n.pt', results_dir: str = 'results', iou: float = 0.7,
+                 imgsz: int = 640, max_det: int = 300, half: bool = False):
         """
         初始化检测器
         
         Args:
             model_name (str): 模型名称，初次使用会自动下载
             results_dir (str): 结果保存的根目录
+            iou (float): NMS 的 IoU 阈值
+            imgsz (int): 推理输入尺寸
+            max_det (int): 每张图片的最大检测数
+            half (bool): 是否使用 FP16 推理（仅 GPU）
         """
         self.model_name = model_name
         self.results_dir = Path(results_dir)
+        # 所有推理调用共用的参数（置信度按调用传入）
+        self.predict_args = {'iou': iou, 'imgsz': imgsz, 'max_det': max_det, 'half': half}
         self.detect_img_dir = self.results_dir / 'task1' / 'images'
         self.detect_video_dir = self.results_dir / 'task1' / 'videos'
         
@@ -68,7 +196,8 @@ class YOLODetector:
         
         logger.info(f"⏳ Loading model: {model_name}...")
         try:
-            self.model = YOLO(model_name)
+            # 从进程级模型池获取：同一权重只加载一次，并按推理尺寸预热
+            self.model = get_registry().get(model_name, imgsz=imgsz)
             logger.info("✅ Model loaded successfully.")
         except Exception as e:
             logger.error(f"❌ Failed to load model: {e}")
@@ -89,47 +218,279 @@ class YOLODetector:
             return False
         return True
 
-    def detect_images(self, source_dir: str, conf: float = 0.25):
+    def detect_images(self, source_dir: str, conf: float = 0.25, **kwargs):
         """
         批量检测图片
         
         Args:
             source_dir (str): 图片目录路径
             conf (float): 置信度阈值
+            **kwargs: 透传给 detect_image_list 的批量/缓存/输出参数
+
+        Returns:
+            dict: 吞吐统计 (images, cached, seconds, images_per_sec)
         """
         if not self.check_source(source_dir):
             return
 
-        source_path = Path(source_dir)
-        # 支持常见图片格式
-        img_extensions = {'.jpg', '.jpeg', '.png', '.bmp', '.webp'}
-        images = [p for p in source_path.iterdir() if p.suffix.lower() in img_extensions]
-        
+        images = list_images(source_dir)
         if not images:
             logger.warning(f"⚠️ No images found in {source_dir}")
             return
             
         logger.info(f"🔍 Found {len(images)} images. Starting detection...")
+        return self.detect_image_list(images, conf=conf, **kwargs)
+
+    def detect_image_list(self, images: List[Path], conf: float = 0.25, batch: int = 1,
+                          readers: int = 4, writers: int = 2, iou: Optional[float] = None,
+                          imgsz: Optional[int] = None,
+                          cache: Optional[DetectionCache] = None, output: Optional[DetectionWriter] = None,
+                          render: bool = True, slicer: Optional[SlicedPredictor] = None) -> dict:
+        """
+        检测给定的图片列表（多进程分片模式下每个分片直接调用）
         
+        Args:
+            images (list): 图片路径列表
+            conf (float): 置信度阈值
+            batch (int): 每次送入模型的图片数量，大于 1 时启用读取/推理/写出流水线
+            readers (int): 批量模式下的图片解码线程数
+            writers (int): 批量模式下的结果绘制与写出线程数
+            iou (float): NMS 的 IoU 阈值，默认使用检测器的设置
+            imgsz (int): 推理输入尺寸，默认使用检测器的设置
+            cache (DetectionCache): 检测结果缓存，命中的图片直接跳过推理与保存
+            output (DetectionWriter): 结构化结果输出 (JSONL/Parquet)
+            render (bool): 是否绘制并保存标注图片，只需要结构化结果时可关闭以省去 JPEG 编码
+            slicer (SlicedPredictor): 切片推理器，提供时逐张切片推理（高分辨率小目标），不使用缓存
+
+        Returns:
+            dict: 吞吐统计 (images, cached, seconds, images_per_sec)
+        """
+        start_time = time.perf_counter()
+        iou = pick(iou, self.predict_args['iou'])
+        imgsz = pick(imgsz, self.predict_args['imgsz'])
+        predict_args = {**self.predict_args, 'conf': conf, 'iou': iou, 'imgsz': imgsz}
+        cached = 0
+        image_hashes = {}
+        if cache is not None and slicer is not None:
+            # 缓存键不含切片参数，切片结果不能与整图结果混用
+            logger.warning("⚠️ Detection cache is ignored in sliced mode.")
+            cache = None
+        if cache is not None:
+            image_hashes = {p: file_digest(p) for p in images}
+            pending = []
+            for img_path in images:
+                entry = cache.get(image_hashes[img_path], conf, iou, imgsz,
+                                  max_det=predict_args['max_det'], half=predict_args['half'])
+                if entry is None:
+                    pending.append(img_path)
+                elif output is not None:
+                    output.write(img_path.name, str(img_path), entry['boxes'], entry['classes'],
+                                 entry['scores'], entry['shape'], cached=True)
+            cached = len(images) - len(pending)
+            logger.info(f"💾 Cache hits: {cached}, to infer: {len(pending)}")
+            images = pending
+
+        def on_result(img_path: Path, result):
+            if cache is not None:
+                cache.put_result(image_hashes[img_path], result, conf, iou, imgsz,
+                                 max_det=predict_args['max_det'], half=predict_args['half'])
+            if output is not None:
+                output.write_result(img_path.name, result, path=str(img_path))
+
+        if not images:
+            processed = 0
+        elif slicer is not None:
+            processed = self._detect_images_sliced(images, slicer, on_result, render)
+        elif batch > 1:
+            processed = self._detect_images_batched(images, predict_args, batch, max(1, readers),
+                                                    max(1, writers), on_result, render)
+        else:
+            processed = self._detect_images_sequential(images, predict_args, on_result, render)
+        processed += cached
+        elapsed = time.perf_counter() - start_time
+
+        stats = {
+            'images': processed,
+            'cached': cached,
+            'seconds': round(elapsed, 3),
+            'images_per_sec': round(processed / elapsed, 2) if elapsed > 0 else 0.0,
+        }
+        if render:
+            logger.info(f"🎉 Image detection complete. Results saved to: {self.detect_img_dir}")
+        else:
+            logger.info("🎉 Image detection complete (rendering disabled).")
+        logger.info(f"⚡ Throughput: {stats['images_per_sec']} images/s "
+                    f"({processed} images in {elapsed:.1f}s, batch={batch})")
+        return stats
+
+    def _detect_images_sequential(self, images: List[Path], predict_args: dict,
+                                  on_result: Optional[Callable] = None, render: bool = True) -> int:
+        """逐张检测（原始模式），返回成功处理的图片数"""
+        processed = 0
         for img_path in images:
             try:
                 # 执行推理
                 results = self.model.predict(
                     source=str(img_path),
-                    conf=conf,
-                    save=True,
+                    save=render,
                     project=str(self.detect_img_dir.parent),
                     name='images',
                     exist_ok=True,
-                    verbose=False
+                    verbose=False,
+                    **predict_args
                 )
+                if on_result is not None:
+                    on_result(img_path, results[0])
+                processed += 1
                 logger.info(f"✅ Processed: {img_path.name}")
             except Exception as e:
                 logger.error(f"❌ Error processing {img_path.name}: {e}")
-        
-        logger.info(f"🎉 Image detection complete. Results saved to: {self.detect_img_dir}")
+        return processed
 
-    def detect_video_stream(self, source: Union[str, int], duration: int = 30, conf: float = 0.25):
+    def _detect_images_sliced(self, images: List[Path], slicer: SlicedPredictor,
+                              on_result: Optional[Callable] = None, render: bool = True) -> int:
+        """逐张切片推理：每张图的全部切片组批前向，跨切片 NMS 合并后输出"""
+        processed = 0
+        for img_path in images:
+            try:
+                image = cv2.imread(str(img_path))
+                if image is None:
+                    raise ValueError("unreadable image")
+                result = slicer.predict(image, path=str(img_path))
+                if on_result is not None:
+                    on_result(img_path, result)
+                if render:
+                    self._write_result(img_path, result)
+                processed += 1
+                st = slicer.last_stats
+                logger.info(f"✅ Processed: {img_path.name} ({st['tiles']} tiles, {st['forward_passes']} passes, "
+                            f"{st['raw_detections']} -> {st['merged_detections']} boxes, "
+                            f"{st['inference_ms']:.0f} + {st['merge_ms']:.1f} ms)")
+            except Exception as e:
+                logger.error(f"❌ Error processing {img_path.name}: {e}")
+        return processed
+
+    def _detect_images_batched(self, images: List[Path], predict_args: dict, batch: int,
+                               readers: int, writers: int, on_result: Optional[Callable] = None,
+                               render: bool = True) -> int:
+        """
+        批量流水线检测：读取线程池 -> 有界队列 -> 批量推理 -> 写出线程池
+
+        Returns:
+            int: 成功推理的图片数
+        """
+        path_queue = queue.Queue()
+        for img_path in images:
+            path_queue.put(img_path)
+        for _ in range(readers):
+            path_queue.put(None)  # 每个读取线程一个结束标记
+
+        # 有界队列：解码速度快于推理时自动阻塞，内存占用不会随目录大小增长
+        frame_queue = queue.Queue(maxsize=batch * 2)
+        reader_errors = []
+        stop_event = threading.Event()
+        reader_threads = [
+            threading.Thread(target=self._read_worker,
+                             args=(path_queue, frame_queue, reader_errors, stop_event),
+                             name=f'reader-{i}', daemon=True)
+            for i in range(readers)
+        ]
+        for t in reader_threads:
+            t.start()
+
+        # 限制尚未写出的结果数量，避免写盘慢时结果堆积在内存中
+        write_slots = threading.BoundedSemaphore(batch * 2)
+        processed = 0
+        finished_readers = 0
+        pending = []
+
+        try:
+            with ThreadPoolExecutor(max_workers=writers, thread_name_prefix='writer') as write_pool:
+                while finished_readers < readers:
+                    item = frame_queue.get()
+                    if item is None:
+                        finished_readers += 1
+                    else:
+                        pending.append(item)
+
+                    if len(pending) >= batch or (pending and finished_readers == readers):
+                        processed += self._predict_batch(pending, predict_args, write_pool, write_slots,
+                                                         on_result, render)
+                        pending = []
+        except BaseException:
+            # 消费端出错（如缓存/结构化输出写入失败）后不再有人取帧，通知读取线程退出，
+            # 否则它们会带着已解码的帧一直阻塞在 put 上（常驻的 Web 服务中每次失败都会泄漏线程）
+            stop_event.set()
+            raise
+        finally:
+            for t in reader_threads:
+                t.join()
+        if reader_errors:
+            # 其余读取线程已处理完剩余图片，这里把读取线程的异常交还给调用方
+            raise reader_errors[0]
+        return processed
+
+    def _read_worker(self, path_queue: queue.Queue, frame_queue: queue.Queue, errors: list,
+                     stop_event: threading.Event):
+        """
+        读取线程：解码图片并放入有界帧队列
+
+        Args:
+            errors (list): 输出参数，记录本线程的异常；无论是否出错，退出时都会放入结束标记，
+                           否则消费端会一直等待
+            stop_event (threading.Event): 消费端出错退出时设置，读取线程随即停止，不再阻塞在满队列上
+        """
+        try:
+            while not stop_event.is_set():
+                img_path = path_queue.get()
+                if img_path is None:
+                    return
+                frame = cv2.imread(str(img_path))
+                if frame is None:
+                    logger.error(f"❌ Failed to decode: {img_path.name}")
+                    continue
+                _put_frame(frame_queue, (img_path, frame), 'block', stop_event)
+        except BaseException as e:
+            logger.error(f"❌ Reader thread failed: {e}")
+            errors.append(e)
+        finally:
+            _put_frame(frame_queue, None, 'block', stop_event)
+
+    def _predict_batch(self, pending: list, predict_args: dict, write_pool: ThreadPoolExecutor,
+                       write_slots: threading.BoundedSemaphore, on_result: Optional[Callable] = None,
+                       render: bool = True) -> int:
+        """对一批已解码的图片执行一次前向推理，并把结果交给写出线程池"""
+        paths = [p for p, _ in pending]
+        frames = [f for _, f in pending]
+        try:
+            results = self.model.predict(frames, verbose=False, **predict_args)
+        except Exception as e:
+            logger.error(f"❌ Error processing batch starting at {paths[0].name}: {e}")
+            return 0
+
+        for img_path, result in zip(paths, results):
+            if on_result is not None:
+                on_result(img_path, result)
+            if not render:
+                continue
+            write_slots.acquire()
+            future = write_pool.submit(self._write_result, img_path, result)
+            future.add_done_callback(lambda _: write_slots.release())
+        logger.info(f"✅ Processed batch of {len(paths)} (last: {paths[-1].name})")
+        return len(paths)
+
+    def _write_result(self, img_path: Path, result):
+        """写出线程：绘制检测框并保存"""
+        try:
+            cv2.imwrite(str(self.detect_img_dir / img_path.name), result.plot())
+        except Exception as e:
+            logger.error(f"❌ Error saving {img_path.name}: {e}")
+
+    def detect_video_stream(self, source: Union[str, int], duration: int = 30, conf: float = 0.25,
+                            pipeline: bool = False, drop_policy: str = 'auto', queue_size: int = 8,
+                            realtime: bool = False, latency_budget: float = 0.2,
+                            frame_hooks: Optional[List[Callable]] = None,
+                            motion_gate: Optional[MotionGate] = None, decode_args: Optional[dict] = None):
         """
         视频流实时检测（支持文件和摄像头）
         
@@ -137,12 +498,29 @@ class YOLODetector:
             source (str|int): 视频文件路径或摄像头ID(0)
             duration (int): 录制时长（秒）
             conf (float): 置信度阈值
+            pipeline (bool): 是否启用 采集 / 推理 / 绘制编码 三线程流水线
+            drop_policy (str): 流水线队列满时的策略: auto / block / drop_oldest，
+                               auto 表示摄像头丢弃最旧帧、视频文件阻塞等待
+            queue_size (int): 流水线各阶段之间的队列长度
+            realtime (bool): 实时模式，始终对最新帧推理，跳过的帧复用上一次检测结果绘制
+            latency_budget (float): 实时模式的延迟预算（秒），采集后超过该时长的帧不再推理
+            frame_hooks (list): 帧回调 hook(result, frame, fresh) -> frame，在推理之后的绘制阶段调用
+                                （流水线/实时模式下位于编码线程），fresh 表示该结果是否首次出现，
+                                可用于越线计数等应用并在帧上叠加信息
+            motion_gate (MotionGate): 运动门控，静止画面跳过推理并复用上一次检测结果（以 fresh=False 传给回调），
+                                      有运动时只推理 ROI / 运动区域
+            decode_args (dict): 解码后端参数 (backend, decode_size, threads, hwaccel)，见 video_io.open_video；
+                                decode_size 非 0 时输出视频也为缩放后的分辨率
+
+        Returns:
+            dict: 流水线/实时模式下返回各阶段耗时统计
         """
         input_source = 0 if source in ['0', 'camera'] else source
         if not self.check_source(str(source)):
             return
 
-        cap = cv2.VideoCapture(input_source)
+        # 环形缓冲区需覆盖流水线各级队列中同时在途的帧
+        cap = open_video(input_source, buffers=2 * queue_size + 4, **(decode_args or {}))
         if not cap.isOpened():
             logger.error("❌ Failed to open video source.")
             return
@@ -161,49 +539,540 @@ class YOLODetector:
         # 初始化视频写入器 (使用 mp4v 编码，兼容性较好)
         fourcc = cv2.VideoWriter_fourcc(*'mp4v')
         out = cv2.VideoWriter(str(save_path), fourcc, fps, (width, height))
+
+        if drop_policy == 'auto':
+            drop_policy = 'drop_oldest' if input_source == 0 else 'block'
+        if input_source != 0:
+            # 文件源的处理速度与实时无关，需要计时的回调（安全警报去抖/冷却）改按画面时间计时
+            for hook in frame_hooks or ():
+                if hasattr(hook, 'use_media_clock'):
+                    hook.use_media_clock(fps)
+        if realtime and input_source == 0:
+            # 尽量减少驱动侧缓存，否则 read() 拿到的是几秒前的旧帧
+            cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
         
         logger.info(f"🎥 Starting video detection (Duration: {duration}s)...")
         logger.info("👉 Press 'q' to stop early.")
 
+        stats = None
+        try:
+            if realtime:
+                logger.info(f"⚡ Real-time mode enabled (latency budget: {latency_budget * 1000:.0f} ms)")
+                stats = self._run_video_realtime(cap, out, duration, conf, fps, latency_budget,
+                                                 queue_size, paced=input_source != 0, hooks=frame_hooks,
+                                                 gate=motion_gate)
+            elif pipeline:
+                logger.info(f"🧵 Pipeline mode enabled (drop policy: {drop_policy}, queue: {queue_size})")
+                stats = self._run_video_pipeline(cap, out, duration, conf, drop_policy, queue_size,
+                                                 hooks=frame_hooks, gate=motion_gate)
+            else:
+                self._run_video_serial(cap, out, duration, conf, hooks=frame_hooks, gate=motion_gate)
+        except KeyboardInterrupt:
+            logger.info("🛑 Interrupted by user.")
+        finally:
+            cap.release()
+            out.release()
+            cv2.destroyAllWindows()
+            logger.info(f"\n✅ Video detection complete. Saved to: {save_path}")
+        decode_stats = cap.timing()
+        logger.info(f"🎞️ Decode ({decode_stats['backend']}, {decode_stats['source_size'][0]}x"
+                    f"{decode_stats['source_size'][1]} -> {decode_stats['output_size'][0]}x"
+                    f"{decode_stats['output_size'][1]}): decode {decode_stats['decode_ms']} ms | "
+                    f"resize {decode_stats['resize_ms']} ms | convert {decode_stats['convert_ms']} ms | "
+                    f"copy {decode_stats['copy_ms']} ms per frame")
+        if stats is not None:
+            stats['decode'] = decode_stats
+        if motion_gate is not None:
+            motion_stats = motion_gate.report()
+            if stats is not None:
+                stats['motion'] = motion_stats
+        return stats
+
+    def _infer_frame(self, frame, conf: float, gate: Optional[MotionGate] = None):
+        """
+        推理单帧，配置了运动门控时由门控决定是否推理
+
+        Returns:
+            tuple: (results, fresh)，fresh=False 表示复用了上一次的检测结果
+        """
+        if gate is None:
+            return self.model.predict(frame, conf=conf, verbose=False, **self.predict_args), True
+        return gate.predict(self.model, frame, conf=conf, **self.predict_args)
+
+    @staticmethod
+    def _apply_hooks(hooks: Optional[List[Callable]], result, frame, fresh: bool = True):
+        """依次调用帧回调，每个回调返回（可能已叠加绘制的）帧"""
+        for hook in hooks or ():
+            frame = hook(result, frame, fresh)
+        return frame
+
+    def _run_video_serial(self, cap, out, duration: int, conf: float,
+                          hooks: Optional[List[Callable]] = None, gate: Optional[MotionGate] = None):
+        """串行模式：读取、推理、绘制、写入依次执行"""
         start_time = time.time()
         frame_count = 0
 
-        try:
-            while cap.isOpened():
+        while cap.isOpened():
+            ret, frame = cap.read()
+            if not ret:
+                break
+
+            # 检查是否超时
+            elapsed = time.time() - start_time
+            if elapsed > duration:
+                logger.info("⏰ Time limit reached.")
+                break
+
+            # 执行推理
+            results, fresh = self._infer_frame(frame, conf, gate)
+            annotated_frame = self._apply_hooks(hooks, results[0], results[0].plot(), fresh)
+
+            # 写入视频和显示
+            out.write(annotated_frame)
+            # 服务器环境下注释掉 imshow，否则会报错 Unable to init server
+            # cv2.imshow('YOLOv8 Detection', annotated_frame)
+
+            if cv2.waitKey(1) & 0xFF == ord('q'):
+                logger.info("🛑 User stopped manually.")
+                break
+            
+            frame_count += 1
+            if frame_count % 30 == 0:
+                 print(f"⏳ Recording... {int(elapsed)}/{duration}s", end='\r')
+
+    def _run_video_pipeline(self, cap, out, duration: int, conf: float,
+                            drop_policy: str, queue_size: int,
+                            hooks: Optional[List[Callable]] = None, gate: Optional[MotionGate] = None) -> dict:
+        """
+        流水线模式：采集线程 -> 推理（主线程） -> 绘制编码线程，阶段之间用有界队列连接
+
+        Returns:
+            dict: 各阶段耗时、吞吐与丢帧统计
+        """
+        frame_queue = queue.Queue(maxsize=queue_size)
+        result_queue = queue.Queue(maxsize=queue_size)
+        stop_event = threading.Event()
+        infer_done = threading.Event()
+        stages = {name: StageStats(name) for name in ('capture', 'infer', 'encode')}
+        dropped = {'capture->infer': 0, 'infer->encode': 0}
+
+        def capture():
+            start_time = time.time()
+            while not stop_event.is_set():
+                t0 = time.perf_counter()
                 ret, frame = cap.read()
+                stages['capture'].add(time.perf_counter() - t0)
                 if not ret:
                     break
-
-                # 检查是否超时
-                elapsed = time.time() - start_time
-                if elapsed > duration:
+                if time.time() - start_time > duration:
                     logger.info("⏰ Time limit reached.")
                     break
+                if drop_policy != 'block':
+                    # 丢帧策略下采集不受下游背压限制，会绕过环形缓冲区覆盖推理/编码仍持有的帧
+                    frame = frame.copy()
+                dropped['capture->infer'] += _put_frame(frame_queue, frame, drop_policy, stop_event)
 
-                # 执行推理
-                results = self.model.predict(frame, conf=conf, verbose=False)
-                annotated_frame = results[0].plot()
+        def encode():
+            for results, fresh in _iter_queue(result_queue, infer_done.is_set, stop_event):
+                t0 = time.perf_counter()
+                out.write(self._apply_hooks(hooks, results[0], results[0].plot(), fresh))
+                stages['encode'].add(time.perf_counter() - t0)
+
+        thread_errors = []
+        capture_thread = threading.Thread(target=_guarded(capture, thread_errors, stop_event),
+                                          name='capture', daemon=True)
+        encode_thread = threading.Thread(target=_guarded(encode, thread_errors, stop_event),
+                                         name='encode', daemon=True)
+        wall_start = time.perf_counter()
+        capture_thread.start()
+        encode_thread.start()
 
-                # 写入视频和显示
-                out.write(annotated_frame)
-                # 服务器环境下注释掉 imshow，否则会报错 Unable to init server
-                # cv2.imshow('YOLOv8 Detection', annotated_frame)
+        try:
+            for frame in _iter_queue(frame_queue, lambda: not capture_thread.is_alive(), stop_event):
+                t0 = time.perf_counter()
+                results, fresh = self._infer_frame(frame, conf, gate)
+                stages['infer'].add(time.perf_counter() - t0)
+                dropped['infer->encode'] += _put_frame(result_queue, (results, fresh), drop_policy, stop_event)
+
+                if stages['infer'].count % 30 == 0:
+                    print(f"⏳ Recording... {int(time.perf_counter() - wall_start)}/{duration}s", end='\r')
+        except BaseException:
+            stop_event.set()
+            raise
+        finally:
+            infer_done.set()
+            capture_thread.join()
+            encode_thread.join()
+        if thread_errors:
+            raise thread_errors[0]
 
-                if cv2.waitKey(1) & 0xFF == ord('q'):
-                    logger.info("🛑 User stopped manually.")
+        wall = time.perf_counter() - wall_start
+        return self._report_stage_stats(stages, dropped, wall)
+
+    def _run_video_realtime(self, cap, out, duration: int, conf: float, source_fps: float,
+                            latency_budget: float, queue_size: int, paced: bool,
+                            hooks: Optional[List[Callable]] = None, gate: Optional[MotionGate] = None) -> dict:
+        """
+        实时模式：采集线程持续读帧并只保留最新一帧供推理，推理不过来时跳过旧帧，
+        编码线程用最近一次的检测结果绘制每一帧，输出始终跟上实时画面
+
+        Args:
+            source_fps (float): 视频源帧率
+            latency_budget (float): 延迟预算（秒）
+            paced (bool): 是否按源帧率限速读取（视频文件模拟实时源）
+            hooks (list): 帧回调，每个新的检测结果只以 fresh=True 传入一次
+            gate (MotionGate): 运动门控，被门控的帧不计入新结果
+
+        Returns:
+            dict: 达成 FPS、源 FPS、跳帧/丢帧数与端到端延迟
+        """
+        stop_event = threading.Event()
+        infer_done = threading.Event()
+        new_frame = threading.Condition()
+        latest = {'frame': None, 'idx': -1, 't': 0.0, 'captured': 0}
+        last_result = {'pair': (None, -1, False)}  # (results, 帧序号, 是否新推理)，整体替换保证读取一致
+        encode_queue = queue.Queue(maxsize=queue_size)
+        stages = {name: StageStats(name) for name in ('capture', 'infer', 'encode')}
+        counters = {'stale': 0, 'reused': 0, 'encode_dropped': 0}
+        latencies = []
+
+        def capture():
+            start_time = time.time()
+            frame_interval = 1.0 / source_fps if source_fps else 0.0
+            next_due = time.perf_counter()
+            idx = 0
+            while not stop_event.is_set():
+                t0 = time.perf_counter()
+                ret, frame = cap.read()
+                stages['capture'].add(time.perf_counter() - t0)
+                if not ret:
+                    break
+                if time.time() - start_time > duration:
+                    logger.info("⏰ Time limit reached.")
                     break
-                
-                frame_count += 1
-                if frame_count % 30 == 0:
-                     print(f"⏳ Recording... {int(elapsed)}/{duration}s", end='\r')
 
-        except KeyboardInterrupt:
-            logger.info("🛑 Interrupted by user.")
+                # 采集不等待推理（摄像头不限速），环形缓冲区会被持续覆盖；推理、Results.orig_img
+                # 与编码队列持有的帧必须是独立副本
+                frame = frame.copy()
+                t_capture = time.perf_counter()
+                with new_frame:
+                    latest.update(frame=frame, idx=idx, t=t_capture, captured=idx + 1)
+                    new_frame.notify()
+                counters['encode_dropped'] += _put_frame(encode_queue, (idx, frame), 'drop_oldest', stop_event)
+                idx += 1
+
+                if paced:
+                    next_due += frame_interval
+                    delay = next_due - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+
+        def encode():
+            applied_idx = -1
+            for idx, frame in _iter_queue(encode_queue, infer_done.is_set, stop_event):
+                t0 = time.perf_counter()
+                results, result_idx, result_fresh = last_result['pair']
+                if results is None:
+                    annotated = frame
+                else:
+                    if result_idx == idx:
+                        annotated = results[0].plot()
+                    else:
+                        # 跳过的帧：把上一次的检测框画到当前帧上
+                        annotated = results[0].plot(img=frame)
+                        counters['reused'] += 1
+                    annotated = self._apply_hooks(hooks, results[0], annotated,
+                                                  fresh=result_fresh and result_idx != applied_idx)
+                    applied_idx = result_idx
+                out.write(annotated)
+                stages['encode'].add(time.perf_counter() - t0)
+
+        thread_errors = []
+        capture_thread = threading.Thread(target=_guarded(capture, thread_errors, stop_event),
+                                          name='capture', daemon=True)
+        encode_thread = threading.Thread(target=_guarded(encode, thread_errors, stop_event),
+                                         name='encode', daemon=True)
+        wall_start = time.perf_counter()
+        capture_thread.start()
+        encode_thread.start()
+
+        last_idx = -1
+        try:
+            while not stop_event.is_set():
+                with new_frame:
+                    if latest['idx'] == last_idx:
+                        new_frame.wait(timeout=0.1)
+                    frame, idx, t_capture = latest['frame'], latest['idx'], latest['t']
+                if idx == last_idx:
+                    if not capture_thread.is_alive():
+                        break
+                    continue
+                last_idx = idx
+
+                # 始终取最新帧；若最新帧本身已超出延迟预算（采集端积压），直接丢弃
+                if time.perf_counter() - t_capture > latency_budget:
+                    counters['stale'] += 1
+                    continue
+
+                t0 = time.perf_counter()
+                results, fresh = self._infer_frame(frame, conf, gate)
+                t_done = time.perf_counter()
+                stages['infer'].add(t_done - t0)
+                last_result['pair'] = (results, idx, fresh)
+                latencies.append(t_done - t_capture)
+
+                if stages['infer'].count % 30 == 0:
+                    print(f"⏳ Recording... {int(t_done - wall_start)}/{duration}s", end='\r')
+        except BaseException:
+            stop_event.set()
+            raise
         finally:
-            cap.release()
-            out.release()
-            cv2.destroyAllWindows()
-            logger.info(f"\n✅ Video detection complete. Saved to: {save_path}")
+            infer_done.set()
+            capture_thread.join()
+            encode_thread.join()
+        if thread_errors:
+            raise thread_errors[0]
+
+        wall = time.perf_counter() - wall_start
+        captured = latest['captured']
+        inferred = stages['infer'].count
+        latencies.sort()
+        summary = {
+            'source_fps': round(source_fps, 2),
+            'capture_fps': round(captured / wall, 2) if wall > 0 else 0.0,
+            'inference_fps': round(inferred / wall, 2) if wall > 0 else 0.0,
+            'output_fps': round(stages['encode'].count / wall, 2) if wall > 0 else 0.0,
+            'frames_captured': captured,
+            'frames_inferred': inferred,
+            'frames_skipped': captured - inferred,
+            'frames_stale': counters['stale'],
+            'frames_reused': counters['reused'],
+            'frames_dropped': counters['encode_dropped'],
+            'latency_p50_ms': round(latencies[len(latencies) // 2] * 1000, 1) if latencies else 0.0,
+            'latency_max_ms': round(latencies[-1] * 1000, 1) if latencies else 0.0,
+            'latency_budget_ms': round(latency_budget * 1000, 1),
+            'stages': {name: stage.as_dict(wall) for name, stage in stages.items()},
+        }
+
+        logger.info(f"📊 Real-time stats: inference {summary['inference_fps']} FPS vs source "
+                    f"{summary['source_fps']} FPS (output {summary['output_fps']} FPS)")
+        logger.info(f"   captured {captured} | inferred {inferred} | skipped {summary['frames_skipped']} "
+                    f"(stale {counters['stale']}) | drawn with reused detections {counters['reused']} | "
+                    f"dropped {counters['encode_dropped']}")
+        logger.info(f"   latency p50 {summary['latency_p50_ms']} ms | max {summary['latency_max_ms']} ms | "
+                    f"budget {summary['latency_budget_ms']} ms")
+        return summary
+
+    def _report_stage_stats(self, stages: dict, dropped: dict, wall: float) -> dict:
+        """打印并返回流水线各阶段统计，平均耗时最长的阶段即吞吐瓶颈"""
+        stage_stats = {name: stage.as_dict(wall) for name, stage in stages.items()}
+        bottleneck = max(stages.values(), key=lambda st: st.avg_ms).name
+        written = stages['encode'].count
+        summary = {
+            'wall_seconds': round(wall, 3),
+            'output_fps': round(written / wall, 2) if wall > 0 else 0.0,
+            'stages': stage_stats,
+            'dropped': dropped,
+            'bottleneck': bottleneck,
+        }
+
+        logger.info(f"📊 Pipeline stats: {written} frames in {wall:.1f}s -> {summary['output_fps']} FPS")
+        for name, st in stage_stats.items():
+            marker = '  <- bottleneck' if name == bottleneck else ''
+            logger.info(f"   {name:<8} {st['avg_ms']:>7.2f} ms/frame | max {st['max_fps']:>6.1f} FPS | "
+                        f"busy {st['busy_pct']:>5.1f}%{marker}")
+        logger.info(f"   dropped: {dropped}")
+        return summary
+
+
+# ================= 多进程分片推理 =================
+# 每个工作进程持有一个检测器实例，由进程池 initializer 创建，整个生命周期只加载一次模型
+_WORKER_DETECTOR = None
+
+
+def _init_shard_worker(model_name: str, threads: int, predict_cfg: dict):
+    """工作进程初始化：限制线程数避免核间争抢，并加载模型"""
+    global _WORKER_DETECTOR
+    import torch
+    torch.set_num_threads(threads)
+    cv2.setNumThreads(1)
+    _WORKER_DETECTOR = YOLODetector(model_name=model_name, **predict_cfg)
+
+
+def _run_shard(shard_id: int, image_paths: List[str], shard_output: Optional[str],
+               cache_path: Optional[str], cache_size_mb: float, detect_kwargs: dict) -> dict:
+    """工作进程：处理一个分片，返回该分片的吞吐统计"""
+    detector = _WORKER_DETECTOR
+    cache = None
+    output = None
+    if cache_path:
+        weights = getattr(detector.model, 'ckpt_path', None) or detector.model_name
+        cache = DetectionCache(cache_path, weights, max_size_mb=cache_size_mb)
+    if shard_output:
+        # 分片可能在上次崩溃时写了一半，重新开始前清掉
+        _remove_path(Path(shard_output))
+        output = DetectionWriter(shard_output, names=detector.model.names)
+    try:
+        stats = detector.detect_image_list([Path(p) for p in image_paths], **detect_kwargs)
+    finally:
+        if cache is not None:
+            cache.close()
+        if output is not None:
+            output.close()
+    stats['shard'] = shard_id
+    stats['pid'] = os.getpid()
+    return stats
+
+
+def _remove_path(path: Path):
+    if path.is_dir():
+        shutil.rmtree(path)
+    elif path.exists():
+        path.unlink()
+
+
+def _save_manifest(manifest: dict, manifest_path: Path):
+    """原子写入分片清单，进程崩溃时不会留下损坏的清单"""
+    tmp_path = manifest_path.with_suffix('.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, manifest_path)
+
+
+def _merge_shard_outputs(shard_outputs: List[Path], output_path: Path):
+    """按分片顺序合并结构化输出：JSONL 追加拼接，Parquet 把各分片文件移入输出目录"""
+    if output_path.suffix.lower() == '.parquet':
+        output_path.mkdir(parents=True, exist_ok=True)
+        for shard_out in shard_outputs:
+            for part in sorted(shard_out.glob('*.parquet')):
+                os.replace(part, output_path / f"{shard_out.stem}-{part.name}")
+            _remove_path(shard_out)
+    else:
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(output_path, 'ab') as merged:
+            for shard_out in shard_outputs:
+                if shard_out.exists():
+                    with open(shard_out, 'rb') as f:
+                        shutil.copyfileobj(f, merged)
+                    shard_out.unlink()
+
+
+def run_sharded_detection(model_name: str, source_dir: str, workers: int, shard_size: int = 256,
+                          threads_per_worker: Optional[int] = None, work_dir: str = 'results/task1/shards',
+                          output_path: Optional[str] = None, cache_path: Optional[str] = None,
+                          cache_size_mb: float = 512, predict_cfg: Optional[dict] = None,
+                          **detect_kwargs) -> Optional[dict]:
+    """
+    多进程分片批量检测
+
+    图片列表按 shard_size 切成固定分片，分给 workers 个进程处理；每个进程只加载一次模型。
+    已完成的分片记录在 work_dir/manifest.json 中，崩溃后以相同参数重跑会跳过这些分片。
+
+    Args:
+        model_name (str): 模型权重
+        source_dir (str): 图片目录
+        workers (int): 工作进程数
+        shard_size (int): 每个分片的图片数（也是断点续跑的粒度）
+        threads_per_worker (int): 每个进程的 torch 线程数，默认 CPU 核数 / workers
+        work_dir (str): 分片清单与中间输出目录
+        output_path (str): 合并后的结构化输出路径 (.jsonl 或 .parquet)
+        cache_path (str): 检测结果缓存库路径（各进程共享）
+        predict_cfg (dict): 各进程检测器的推理参数 (iou, imgsz, max_det, half)
+        **detect_kwargs: 透传给 detect_image_list 的参数 (conf, batch, render 等)
+
+    Returns:
+        dict: 合并后的吞吐统计
+    """
+    if not Path(source_dir).exists():
+        logger.error(f"❌ Source path does not exist: {source_dir}")
+        return None
+    images = list_images(source_dir)
+    if not images:
+        logger.warning(f"⚠️ No images found in {source_dir}")
+        return None
+
+    threads = threads_per_worker or max(1, (os.cpu_count() or 1) // workers)
+    predict_cfg = predict_cfg or {}
+    work_path = Path(work_dir)
+    work_path.mkdir(parents=True, exist_ok=True)
+    manifest_path = work_path / 'manifest.json'
+
+    # 运行指纹：图片列表或关键参数变化时不能复用旧的分片记录
+    fingerprint = json.dumps({
+        'model': model_name,
+        'images': [str(p.resolve()) for p in images],
+        'shard_size': shard_size,
+        'output': output_path,
+        'detect': detect_kwargs,
+        'predict': predict_cfg,
+    }, sort_keys=True, default=str)
+    run_key = hashlib.blake2b(fingerprint.encode('utf-8'), digest_size=16).hexdigest()
+
+    manifest = {}
+    if manifest_path.exists():
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    if manifest.get('run_key') != run_key:
+        manifest = {'run_key': run_key, 'source': str(source_dir), 'model': model_name, 'shards': {}}
+
+    shards = [images[i:i + shard_size] for i in range(0, len(images), shard_size)]
+    fmt = Path(output_path).suffix.lower().lstrip('.') if output_path else None
+    shard_outputs = [work_path / f"shard-{i:05d}.{fmt}" for i in range(len(shards))] if fmt else []
+    todo = [i for i in range(len(shards)) if str(i) not in manifest['shards']]
+
+    logger.info(f"🧩 {len(images)} images -> {len(shards)} shards, {workers} workers x {threads} threads")
+    if len(todo) < len(shards):
+        logger.info(f"♻️ Resuming: {len(shards) - len(todo)} shards already completed, {len(todo)} remaining.")
+
+    start_time = time.perf_counter()
+    if todo:
+        ctx = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=ctx, initializer=_init_shard_worker,
+                                 initargs=(model_name, threads, predict_cfg)) as pool:
+            futures = {
+                pool.submit(_run_shard, i, [str(p) for p in shards[i]],
+                            str(shard_outputs[i]) if shard_outputs else None,
+                            cache_path, cache_size_mb, detect_kwargs): i
+                for i in todo
+            }
+            for future in as_completed(futures):
+                shard_id = futures[future]
+                try:
+                    stats = future.result()
+                except Exception as e:
+                    logger.error(f"❌ Shard {shard_id} failed: {e}")
+                    continue
+                manifest['shards'][str(shard_id)] = stats
+                _save_manifest(manifest, manifest_path)
+                logger.info(f"✅ Shard {shard_id} done: {stats['images']} images, "
+                            f"{stats['images_per_sec']} images/s (pid {stats['pid']}) "
+                            f"[{len(manifest['shards'])}/{len(shards)}]")
+    elapsed = time.perf_counter() - start_time
+
+    completed = len(manifest['shards'])
+    if completed < len(shards):
+        logger.warning(f"⚠️ {len(shards) - completed} shards failed. Re-run the same command to resume.")
+    elif output_path and not manifest.get('merged'):
+        _merge_shard_outputs(shard_outputs, Path(output_path))
+        manifest['merged'] = True
+        _save_manifest(manifest, manifest_path)
+        logger.info(f"🗂️ Merged shard outputs into: {output_path}")
+
+    shard_stats = list(manifest['shards'].values())
+    processed_now = sum(manifest['shards'][str(i)]['images'] for i in todo if str(i) in manifest['shards'])
+    summary = {
+        'images': sum(st['images'] for st in shard_stats),
+        'cached': sum(st.get('cached', 0) for st in shard_stats),
+        'shards_completed': completed,
+        'shards_total': len(shards),
+        'workers': workers,
+        'threads_per_worker': threads,
+        'seconds': round(elapsed, 3),
+        'images_per_sec': round(processed_now / elapsed, 2) if elapsed > 0 else 0.0,
+    }
+    logger.info(f"⚡ Aggregate throughput: {summary['images_per_sec']} images/s "
+                f"({processed_now} images this run in {elapsed:.1f}s, {workers} workers)")
+    return summary
 
 
 def main():
@@ -213,29 +1082,194 @@ def main():
                         help="运行模式: image(图片批量), video(视频文件), camera(摄像头)")
     parser.add_argument('--source', type=str, default='data/image',
                         help="输入源路径 (图片目录 或 视频文件路径)")
-    parser.add_argument('--model', type=str, default='yolov8n.pt',
-                        help="YOLOv8 模型版本 (n/s/m/l/x)")
-    parser.add_argument('--conf', type=float, default=0.25,
-                        help="检测置信度阈值")
+    parser.add_argument('--model', type=str, default=None,
+                        help="YOLOv8 模型版本 (n/s/m/l/x)，默认 models.default")
+    parser.add_argument('--conf', type=float, default=None,
+                        help="检测置信度阈值，默认 detection.conf_threshold")
+    parser.add_argument('--iou', type=float, default=None,
+                        help="NMS 的 IoU 阈值，默认 detection.iou_threshold")
+    parser.add_argument('--imgsz', type=int, default=None,
+                        help="推理输入尺寸，默认 detection.img_size")
+    parser.add_argument('--max-det', type=int, default=None,
+                        help="每张图片的最大检测数，默认 detection.max_det")
+    parser.add_argument('--half', action='store_true', default=None,
+                        help="使用 FP16 推理 (仅 GPU)，默认 detection.half")
+    parser.add_argument('--batch', type=int, default=None,
+                        help="图片模式下每次推理的批大小 (>1 启用批量流水线)，默认 detection.batch")
+    parser.add_argument('--readers', type=int, default=4,
+                        help="批量模式下的图片解码线程数")
+    parser.add_argument('--writers', type=int, default=2,
+                        help="批量模式下的结果写出线程数")
+    parser.add_argument('--pipeline', action='store_true',
+                        help="视频/摄像头模式启用 采集/推理/编码 三线程流水线")
+    parser.add_argument('--drop-policy', type=str, default='auto', choices=['auto', 'block', 'drop_oldest'],
+                        help="流水线队列满时的策略 (auto: 摄像头丢旧帧，文件阻塞)")
+    parser.add_argument('--queue-size', type=int, default=8,
+                        help="流水线阶段之间的队列长度")
+    parser.add_argument('--realtime', action='store_true',
+                        help="实时模式：始终推理最新帧，跳帧复用上次检测结果")
+    parser.add_argument('--latency-budget', type=float, default=0.2,
+                        help="实时模式的延迟预算（秒）")
+    parser.add_argument('--cache', type=str, default=None,
+                        help="图片模式的检测结果缓存库路径 (SQLite)，命中的图片跳过推理")
+    parser.add_argument('--cache-size-mb', type=float, default=512,
+                        help="检测结果缓存的大小上限 (MB)，超出按 LRU 淘汰")
+    parser.add_argument('--output', type=str, default=None,
+                        help="图片模式的结构化结果输出路径 (.jsonl 或 .parquet)；计数模式下为周期计数记录 (.jsonl)")
+    parser.add_argument('--no-render', action='store_true',
+                        help="不绘制/保存标注图片，只输出结构化结果")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="图片模式的工作进程数 (>1 启用多进程分片推理，支持断点续跑)")
+    parser.add_argument('--shard-size', type=int, default=256,
+                        help="多进程模式下每个分片的图片数")
+    parser.add_argument('--threads-per-worker', type=int, default=None,
+                        help="多进程模式下每个进程的 torch 线程数 (默认 CPU 核数 / workers)")
+    parser.add_argument('--slice', action='store_true',
+                        help="图片模式启用切片推理 (高分辨率图片的小目标)，参数默认读取 config.yaml slicing")
+    parser.add_argument('--tile', type=int, default=None,
+                        help="切片边长，默认 slicing.tile_size")
+    parser.add_argument('--tile-overlap', type=float, default=None,
+                        help="相邻切片重叠比例，默认 slicing.overlap")
+    parser.add_argument('--tile-batch', type=int, default=None,
+                        help="每次前向的切片数 (0 表示全部切片一次前向)，默认 slicing.tile_batch")
+    parser.add_argument('--tile-bench', type=int, nargs='+', default=None,
+                        help="切片模式下用第一张图测试这些切片批大小的吞吐后退出")
+    parser.add_argument('--decode-backend', type=str, default=None, choices=BACKENDS,
+                        help="视频解码后端，默认读取 config.yaml video_io.backend")
+    parser.add_argument('--decode-size', type=int, default=None,
+                        help="解码端直接缩放到的长边尺寸 (0 为原分辨率)，默认 video_io.decode_size")
+    parser.add_argument('--decode-threads', type=int, default=None,
+                        help="解码线程数 (0 为自动)，默认 video_io.threads")
+    parser.add_argument('--motion-gate', action='store_true',
+                        help="视频/摄像头模式启用运动门控：静止画面跳过推理，只推理 ROI / 运动区域 (参数读取 config.yaml motion)")
+    parser.add_argument('--count', action='store_true',
+                        help="视频/摄像头模式启用越线计数 (类别与计数线位置读取 config.yaml applications.counter)")
+    parser.add_argument('--count-interval', type=float, default=5.0,
+                        help="越线计数的周期输出间隔（秒）")
+    parser.add_argument('--safety', action='store_true',
+                        help="视频/摄像头模式启用安全警报 (规则读取 config.yaml applications.safety)")
+    parser.add_argument('--alert-sink', type=str, action='append', default=None,
+                        help="警报输出，可重复: log[:path] / jsonl:<path> / webhook:<url> (默认 log)")
+    add_config_args(parser)
     
     args = parser.parse_args()
+    cfg = config_from_args(args)
+    get_registry(cfg)
+    det_cfg = cfg['detection']
+    args.model = pick(args.model, cfg['models']['default'])
+    args.conf = pick(args.conf, det_cfg['conf_threshold'])
+    args.batch = pick(args.batch, det_cfg['batch'])
+    predict_cfg = {
+        'iou': pick(args.iou, det_cfg['iou_threshold']),
+        'imgsz': pick(args.imgsz, det_cfg['img_size']),
+        'max_det': pick(args.max_det, det_cfg['max_det']),
+        'half': pick(args.half, det_cfg['half']),
+    }
 
     # 初始化工程
     # 可以选择在这里调用 utils 里的初始化，但为了独立性，这里保持自包含
     
+    tile_options = {'--tile': args.tile, '--tile-overlap': args.tile_overlap, '--tile-batch': args.tile_batch,
+                    '--tile-bench': args.tile_bench}
+    given = [name for name, value in tile_options.items() if value is not None]
+    if given and not args.slice:
+        logger.warning(f"⚠️ {', '.join(given)} only take effect with --slice, ignoring them.")
+
+    if args.mode == 'image' and args.workers > 1 and args.slice:
+        logger.warning("⚠️ --slice runs in a single process, ignoring --workers.")
+    elif args.mode == 'image' and args.workers > 1:
+        # 多进程模式：模型在各工作进程中加载，主进程只负责分片调度与合并
+        run_sharded_detection(args.model, args.source, args.workers, shard_size=args.shard_size,
+                              threads_per_worker=args.threads_per_worker, output_path=args.output,
+                              cache_path=args.cache, cache_size_mb=args.cache_size_mb,
+                              predict_cfg=predict_cfg, conf=args.conf, batch=args.batch, readers=args.readers,
+                              writers=args.writers, render=not args.no_render)
+        return
+
     # 实例化检测器
-    detector = YOLODetector(model_name=args.model)
+    detector = YOLODetector(model_name=args.model, **predict_cfg)
     
     # 根据模式执行
     if args.mode == 'image':
-        detector.detect_images(args.source, args.conf)
-    elif args.mode == 'video':
-        if args.source == 'data/image': # 默认值修正
+        slicer = None
+        if args.slice:
+            slice_cfg = cfg['slicing']
+            slicer = SlicedPredictor(detector.model, tile=pick(args.tile, slice_cfg['tile_size']),
+                                     overlap=pick(args.tile_overlap, slice_cfg['overlap']),
+                                     tile_batch=pick(args.tile_batch, slice_cfg['tile_batch']) or None,
+                                     merge_iou=slice_cfg['merge_iou'], merge_ios=slice_cfg['merge_ios'],
+                                     include_full=slice_cfg['include_full'],
+                                     predict_args={**predict_cfg, 'conf': args.conf})
+            if args.tile_bench:
+                images = list_images(args.source) if Path(args.source).is_dir() else [Path(args.source)]
+                image = cv2.imread(str(images[0])) if images else None
+                if image is None:
+                    logger.error(f"❌ No readable image for tile benchmark in {args.source}")
+                    sys.exit(1)
+                logger.info(f"📐 Tile batch benchmark on {images[0].name} ({image.shape[1]}x{image.shape[0]}):")
+                slicer.benchmark_tile_batches(image, args.tile_bench)
+                return
+
+        cache = None
+        output = None
+        if args.cache:
+            weights = getattr(detector.model, 'ckpt_path', None) or args.model
+            cache = DetectionCache(args.cache, weights, max_size_mb=args.cache_size_mb)
+        if args.output:
+            output = DetectionWriter(args.output, names=detector.model.names)
+        try:
+            detector.detect_images(args.source, args.conf, batch=args.batch,
+                                   readers=args.readers, writers=args.writers, cache=cache,
+                                   output=output, render=not args.no_render, slicer=slicer)
+        finally:
+            if cache is not None:
+                cache.close()
+            if output is not None:
+                output.close()
+    else:
+        if args.mode == 'video' and args.source == 'data/image': # 默认值修正
              logger.error("❌ For video mode, please specify --source path/to/video.mp4")
              sys.exit(1)
-        detector.detect_video_stream(args.source, duration=30, conf=args.conf)
-    elif args.mode == 'camera':
-        detector.detect_video_stream('camera', duration=30, conf=args.conf)
+        source = args.source if args.mode == 'video' else 'camera'
+        hooks = []
+        counter = None
+        safety = None
+        if args.count:
+            counter = LineCounter.from_config(cfg, report_interval=args.count_interval,
+                                              output_path=args.output)
+            logger.info(f"🔢 Line counter enabled (classes: {counter.class_names or 'all'}, "
+                        f"line at {counter.line_position:.2f} of frame height)")
+            hooks.append(counter)
+        if args.safety:
+            sinks = [build_sink(spec) for spec in (args.alert_sink or ['log'])]
+            safety = SafetyMonitor.from_config(cfg, sinks=sinks)
+            logger.info(f"🛡️ Safety alerts enabled (classes: {safety.alert_classes}, "
+                        f"threshold: {safety.alert_threshold}, debounce: {safety.debounce_seconds}s)")
+            hooks.append(safety)
+        io_cfg = cfg['video_io']
+        decode_args = {
+            'backend': pick(args.decode_backend, io_cfg['backend']),
+            'decode_size': pick(args.decode_size, io_cfg['decode_size']),
+            'threads': pick(args.decode_threads, io_cfg['threads']),
+            'hwaccel': io_cfg['hwaccel'],
+        }
+        motion_gate = None
+        if args.motion_gate:
+            motion_gate = MotionGate.from_config(cfg)
+            logger.info(f"🏃 Motion gate enabled (method: {motion_gate.method}, "
+                        f"ROIs: {len(motion_gate.rois) or 'full frame'}, crop: {motion_gate.crop})")
+        try:
+            detector.detect_video_stream(source, duration=30, conf=args.conf, pipeline=args.pipeline,
+                                         drop_policy=args.drop_policy, queue_size=args.queue_size,
+                                         realtime=args.realtime, latency_budget=args.latency_budget,
+                                         frame_hooks=hooks, motion_gate=motion_gate, decode_args=decode_args)
+        finally:
+            if counter is not None:
+                counter.close()
+            if safety is not None:
+                safety.close()
+
+    get_registry().log_metrics()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
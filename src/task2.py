@@ -12,21 +12,55 @@ Task 2: 自定义对象检测 (Custom Object Detection)
     # 模式1: 训练模型
     python task2.py --mode train --data data/custom_dataset/dataset.yaml --epochs 50
 
-    # 模式2: 使用训练好的模型进行预测
-    python task2.py --mode predict --source data/test_images --weights results/task2/train/weights/best.pt
+    # 模式2: 使用训练好的模型进行预测；不指定 --weights 时使用最近一次 train* 训练的 best.pt (--name 指定其他训练名)
+    python task2.py --mode predict --source data/test_images
+    python task2.py --mode predict --source data/test_images --weights results/task2/train3/weights/best.pt
+
+    # 启用检测结果缓存，重复运行时跳过未变化的图片
+    python task2.py --mode predict --source data/test_images --cache results/cache/detections.db
+
+    # 输出结构化检测结果 (JSONL/Parquet)，不保存标注图片
+    python task2.py --mode predict --source data/test_images --output results/task2/detections.jsonl --no-render
+
+    # 训练前会自动校验数据集 (损坏图片/标签越界/重复/类别分布)，有错误时不开始训练；--skip-scan 跳过
+    python task2.py --mode train --data data/custom_dataset/dataset.yaml --skip-scan
+
+    # 训练前把数据集打包为按 imgsz 缩放的内存映射存储，每个 epoch 不再重复解码 JPEG
+    python task2.py --mode train --data data/custom_dataset/dataset.yaml --mmap-cache
+
+    # 对比原始目录与打包存储各训练 2 个 epoch 的耗时
+    python task2.py --mode train --data data/custom_dataset/dataset.yaml --compare-epochs 2
+
+    # 每次训练输出到新的版本目录 (train, train2, ...)；中断后从最近一次训练的 last.pt 续训
+    python task2.py --mode train --data data/custom_dataset/dataset.yaml --save-period 5 --lr0 0.005 --train-cache ram
+    python task2.py --mode train --resume
+    python task2.py --mode train --resume results/task2/train3/weights/last.pt
+
+    # 模式3: 超参数搜索 (并行试验 + 中位数剪枝 + 排行榜)，搜索空间见 sweep.yaml
+    python task2.py --mode sweep --sweep-spec sweep.yaml --sweep-parallel 4
+
+    # 模式4: 知识蒸馏 (yolov8m 教师 -> yolov8n 学生)，输出教师/普通学生/蒸馏学生的 mAP 与延迟对比
+    python task2.py --mode distill --data data/custom_dataset/dataset.yaml --teacher results/task2/train_m/weights/best.pt
+    # 教师只推理一次并缓存，以伪标签形式蒸馏；--baseline 复用已训练的普通学生权重
+    python task2.py --mode distill --data data/custom_dataset/dataset.yaml --teacher-cache --baseline results/task2/train/weights/best.pt
+
+    # 训练/推理参数默认取自 config.yaml (training / detection)，可用 --set 或 MY_YOLO_ 环境变量覆盖
+    python task2.py --mode train --set training.workers=4 --set training.img_size=512
 
 作者: my_yolo Team
 日期: 2023-12-22
 """
 
 import os
+import re
 import sys
+import json
 import argparse
 import logging
 import pandas as pd
 import matplotlib.pyplot as plt
 from pathlib import Path
-from typing import Optional
+from typing import Optional, Union
 
 try:
     from ultralytics import YOLO
@@ -34,6 +68,12 @@ except ImportError:
     print("❌ Error: 'ultralytics' not found. Please install requirements.")
     sys.exit(1)
 
+from detection_cache import DetectionCache, file_digest
+from detection_writer import DetectionWriter
+from config import add_config_args, config_from_args, pick
+from model_registry import get_registry
+from dataset_scanner import DatasetScanner, log_report, resolve_dataset
+
 # 配置日志
 logging.basicConfig(
     level=logging.INFO,
@@ -48,13 +88,41 @@ class YOLOTrainer:
     def __init__(self, model_name: str = 'yolov8n.pt', results_dir: str = 'results/task2'):
         self.model_name = model_name
         self.results_dir = Path(results_dir)
-        self.train_dir = self.results_dir / 'train'
+        self.train_dir = self.latest_run() or self.results_dir / 'train'
         self.predict_dir = self.results_dir / 'predict'
         
         # 确保目录存在
         self.results_dir.mkdir(parents=True, exist_ok=True)
 
-    def train(self, data_yaml: str, epochs: int = 50, batch_size: int = 16, imgsz: int = 640):
+    def latest_run(self, weights: str = 'last.pt', name: str = 'train') -> Optional[Path]:
+        """
+        最近一次（按权重修改时间）包含指定权重文件的训练目录
+
+        Args:
+            weights (str): 目录中必须存在的权重文件名
+            name (str): 训练名，只匹配 name / name2 / name3 ... 目录，
+                        不会选中 bench_* / distill_* 等其他用途或其他模型的训练
+        """
+        pattern = re.compile(rf"{re.escape(name)}\d*")
+        candidates = [p for p in self.results_dir.glob(f"*/weights/{weights}")
+                      if pattern.fullmatch(p.parent.parent.name)]
+        if not candidates:
+            return None
+        return max(candidates, key=lambda p: p.stat().st_mtime).parent.parent
+
+    def find_checkpoint(self, resume: Union[bool, str], name: str = 'train') -> Optional[Path]:
+        """resume 为 True 时取名为 name 的最近一次训练的 last.pt，否则视为 checkpoint 路径"""
+        if resume is True:
+            run_dir = self.latest_run('last.pt', name)
+            return run_dir / 'weights' / 'last.pt' if run_dir else None
+        checkpoint = Path(resume)
+        return checkpoint if checkpoint.exists() else None
+
+    def train(self, data_yaml: str, epochs: int = 50, batch_size: int = 16, imgsz: int = 640,
+              workers: int = 8, patience: int = 50, mmap_cache: bool = False, name: str = 'train',
+              epoch_timer=None, validate: bool = True, save_period: int = -1, lr0: float = 0.01,
+              lrf: float = 0.01, cache: Union[bool, str] = False, resume: Union[bool, str] = False,
+              trainer_cls: Optional[type] = None) -> Optional[Path]:
         """
         执行模型训练
         
@@ -63,44 +131,211 @@ class YOLOTrainer:
             epochs (int): 训练轮数
             batch_size (int): 批次大小
             imgsz (int): 输入图片尺寸
+            workers (int): 数据加载进程数
+            patience (int): 验证指标连续多少轮未提升后早停
+            mmap_cache (bool): 是否从打包的内存映射存储读取图片（首次自动构建，数据集变化时重建）
+            name (str): 本次训练的输出子目录名，已存在时自动递增 (train2, train3, ...)，不覆盖之前的结果
+            epoch_timer (EpochTimer): 若提供，记录每个 epoch 的耗时
+            validate (bool): 训练前扫描数据集，存在错误（损坏图片、标签格式/类别/坐标越界）时终止
+            save_period (int): 每隔多少个 epoch 额外保存一次 epochN.pt，-1 表示只保存 last/best
+            lr0 (float): 初始学习率
+            lrf (float): 最终学习率（相对 lr0 的比例）
+            cache (bool|str): ultralytics 图片缓存: False / 'ram' / 'disk'（启用 mmap_cache 时忽略）
+            resume (bool|str): 续训：True 取最近一次名为 name 的训练的 last.pt，或指定 checkpoint 路径；
+                               续训时训练参数全部从 checkpoint 恢复
+            trainer_cls (type): 自定义 DetectionTrainer 子类（如蒸馏），与 mmap_cache 不能同时使用
+
+        Returns:
+            Path: 本次训练的输出目录，训练未开始时为 None
         """
         if not os.path.exists(data_yaml):
             logger.error(f"❌ Dataset config not found: {data_yaml}")
             logger.info("👉 Please refer to docs/data_annotation_guide.md to prepare your dataset.")
             return
 
+        if validate:
+            # 增量扫描：只重新校验变化过的文件，未变化的数据集几乎不增加耗时
+            report = DatasetScanner(data_yaml, index_path=self.results_dir / 'dataset_scan.json').scan()
+            log_report(report)
+            if report['errors']:
+                logger.error(f"❌ Dataset has {report['errors']} errors, aborting before training. "
+                             f"See {report['report_path']}")
+                return
+
         logger.info(f"🚀 Starting training with model: {self.model_name}")
         logger.info(f"📂 Data config: {data_yaml}")
         
         try:
-            # 加载预训练模型
-            model = YOLO(self.model_name)
+            extra_args = {}
+            if trainer_cls is not None:
+                if mmap_cache:
+                    logger.warning("⚠️ Custom trainer in use, ignoring mmap_cache.")
+                    mmap_cache = False
+                extra_args['trainer'] = trainer_cls
+            elif mmap_cache:
+                from packed_dataset import mmap_trainer
+                extra_args['trainer'] = mmap_trainer(self.results_dir / 'mmap_cache', workers=max(1, workers))
+
+            if resume:
+                checkpoint = self.find_checkpoint(resume, name)
+                if checkpoint is None:
+                    logger.error(f"❌ No checkpoint to resume from ({resume if resume is not True else self.results_dir})")
+                    return
+                logger.info(f"⏯️ Resuming training from: {checkpoint}")
+                # 续训：轮数、学习率、输出目录等全部从 checkpoint 中的训练参数恢复
+                model = YOLO(str(checkpoint))
+                train_args = {'resume': True}
+            else:
+                # 加载预训练模型
+                model = YOLO(self.model_name)
+                # project: 保存的根目录
+                # name: 本次训练的子目录名，exist_ok=False 时自动递增，每次训练保留独立结果
+                train_args = dict(
+                    data=data_yaml,
+                    epochs=epochs,
+                    batch=batch_size,
+                    imgsz=imgsz,
+                    workers=workers,
+                    patience=patience,
+                    save_period=save_period,
+                    lr0=lr0,
+                    lrf=lrf,
+                    cache=False if mmap_cache else cache,
+                    project=str(self.results_dir),
+                    name=name,
+                    exist_ok=False,
+                    pretrained=True, # 明确开启迁移学习
+                    plots=True       # 自动生成图表
+                )
+            if epoch_timer is not None:
+                epoch_timer.attach(model)
             
             # 开始训练
-            # project: 保存的根目录
-            # name: 本次训练的子目录名
-            results = model.train(
-                data=data_yaml,
-                epochs=epochs,
-                batch=batch_size,
-                imgsz=imgsz,
-                project=str(self.results_dir),
-                name='train',
-                exist_ok=True,  # 允许覆盖，方便调试
-                pretrained=True, # 明确开启迁移学习
-                plots=True       # 自动生成图表
-            )
+            results = model.train(**train_args, **extra_args)
+            self.train_dir = Path(model.trainer.save_dir)
             
             logger.info(f"🎉 Training complete!")
             logger.info(f"💾 Best weights saved to: {self.train_dir / 'weights' / 'best.pt'}")
             
             # 手动绘制自定义分析图表（增强分析）
-            self.plot_training_metrics()
+            if not self.train_dir.name.startswith('bench_'):
+                self.plot_training_metrics()
+            return self.train_dir
             
         except Exception as e:
             logger.error(f"❌ Training failed: {e}")
             raise e
 
+    def distill(self, data_yaml: str, teacher: str = 'yolov8m.pt', epochs: int = 50, alpha: float = 1.0,
+                temperature: float = 2.0, teacher_cache: bool = False, pseudo_conf: float = 0.5,
+                match_iou: float = 0.5, teacher_epochs: int = 0, baseline: Optional[str] = None,
+                validate: bool = True, warmup_runs: int = 10, test_runs: int = 50, **train_kwargs) -> Optional[dict]:
+        """
+        以大模型为教师蒸馏训练当前模型（学生），并对比精度与推理延迟
+
+        Args:
+            data_yaml (str): 数据集配置文件路径
+            teacher (str): 教师权重；类别数与数据集不一致时（如 COCO 预训练的 yolov8m.pt）先在数据集上微调
+            epochs (int): 学生训练轮数
+            alpha (float): 在线蒸馏损失权重
+            temperature (float): 在线蒸馏软化温度
+            teacher_cache (bool): 教师只推理一次并缓存，以伪标签方式蒸馏（训练中不再运行教师）
+            pseudo_conf (float): 伪标签最低置信度 (teacher_cache)
+            match_iou (float): 与同类标注框 IoU 不低于该值的教师检测不作为伪标签 (teacher_cache)
+            teacher_epochs (int): 教师微调轮数，0 表示与 epochs 相同
+            baseline (str): 普通训练的学生权重，None 时以相同参数训练一个作为对照
+            validate (bool): 第一次训练前是否校验数据集
+            warmup_runs (int): 延迟测量预热次数
+            test_runs (int): 延迟测量次数
+            **train_kwargs: 透传给 train 的 batch_size / imgsz / workers / patience 等
+
+        Returns:
+            dict: 教师、普通学生、蒸馏学生的指标与 recovered 比例，同时写入学生训练目录的 distill_report.md
+        """
+        if not os.path.exists(data_yaml):
+            logger.error(f"❌ Dataset config not found: {data_yaml}")
+            return None
+        from distill import TeacherCache, distill_trainer, report_distillation
+
+        imgsz = train_kwargs.get('imgsz', 640)
+        _, names = resolve_dataset(data_yaml)
+        teacher_model = YOLO(teacher)
+        teacher_path = Path(teacher_model.ckpt_path or teacher)
+        teacher_nc = teacher_model.model.model[-1].nc
+        if names and teacher_nc != len(names):
+            teacher_epochs = teacher_epochs or epochs
+            logger.info(f"🧑‍🏫 Teacher has {teacher_nc} classes, dataset has {len(names)}: "
+                        f"fine-tuning {teacher} for {teacher_epochs} epochs first...")
+            run = YOLOTrainer(teacher, str(self.results_dir)).train(
+                data_yaml, **{**train_kwargs, 'epochs': teacher_epochs}, name='distill_teacher', validate=validate)
+            if run is None:
+                return None
+            teacher_path, validate = run / 'weights' / 'best.pt', False
+        del teacher_model
+
+        if baseline is None:
+            logger.info(f"📚 Training baseline {self.model_name} without distillation...")
+            run = self.train(data_yaml, epochs=epochs, name='distill_baseline', validate=validate, **train_kwargs)
+            if run is None:
+                return None
+            baseline, validate = run / 'weights' / 'best.pt', False
+
+        logger.info(f"🧪 Distilling {teacher_path} -> {self.model_name} "
+                    f"({'cached teacher pseudo-labels' if teacher_cache else 'online logit distillation'})")
+        if teacher_cache:
+            batch = train_kwargs.get('batch_size', 16)
+            student_data = TeacherCache(teacher_path, data_yaml, self.results_dir / 'distill_cache', imgsz=imgsz,
+                                        conf=pseudo_conf, match_iou=match_iou, batch=batch if batch > 0 else 16).build()
+            run = self.train(str(student_data), epochs=epochs, name='distill_student', validate=validate,
+                             **train_kwargs)
+        else:
+            run = self.train(data_yaml, epochs=epochs, name='distill_student', validate=validate,
+                             trainer_cls=distill_trainer(teacher_path, alpha, temperature), **train_kwargs)
+        if run is None:
+            return None
+
+        # 在原始验证集上统一评估（CPU、batch=1，与 task3 的基准一致）
+        return report_distillation(str(teacher_path), str(baseline), str(run / 'weights' / 'best.pt'), data_yaml,
+                                   output_dir=run, imgsz=imgsz, warmup_runs=warmup_runs, test_runs=test_runs)
+
+    def compare_dataset_cache(self, data_yaml: str, epochs: int = 2, validate: bool = True, **train_kwargs) -> dict:
+        """
+        分别从原始图片目录与打包存储训练相同轮数，对比每个 epoch 的耗时
+
+        Args:
+            data_yaml (str): 数据集配置文件路径
+            epochs (int): 每种方式训练的轮数（建议 >= 2，首个 epoch 含一次性开销）
+            validate (bool): 第一次训练前是否校验数据集
+            **train_kwargs: 透传给 train 的 batch_size / imgsz / workers
+
+        Returns:
+            dict: 两种方式的 epoch 耗时与加速比，同时写入 results_dir/dataset_cache_benchmark.json
+        """
+        from packed_dataset import EpochTimer
+
+        report = {}
+        for i, (label, use_mmap) in enumerate((('raw', False), ('mmap', True))):
+            timer = EpochTimer()
+            logger.info(f"⏱️ Timing {epochs} epochs with {label} dataset...")
+            self.train(data_yaml, epochs=epochs, patience=epochs, mmap_cache=use_mmap,
+                       name=f"bench_{label}", epoch_timer=timer, validate=validate and i == 0, **train_kwargs)
+            report[label] = timer.summary()
+
+        raw, mmap = report['raw']['mean_epoch_seconds'], report['mmap']['mean_epoch_seconds']
+        report['speedup'] = round(raw / mmap, 2) if mmap else None
+        logger.info("=" * 60)
+        logger.info(f"{'dataset':<8} {'epochs':>6} {'mean epoch (s)':>15}  per-epoch (s)")
+        for label in ('raw', 'mmap'):
+            r = report[label]
+            logger.info(f"{label:<8} {r['epochs']:>6} {r['mean_epoch_seconds']:>15}  {r['epoch_seconds']}")
+        logger.info(f"🚀 Packed dataset speedup: {report['speedup']}x")
+
+        output = self.results_dir / 'dataset_cache_benchmark.json'
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        logger.info(f"💾 Benchmark saved to: {output}")
+        return report
+
     def plot_training_metrics(self):
         """读取训练日志并绘制 Loss 曲线"""
         csv_path = self.train_dir / 'results.csv'
@@ -145,13 +380,23 @@ class YOLOTrainer:
         except Exception as e:
             logger.error(f"❌ Failed to plot metrics: {e}")
 
-    def predict(self, weights_path: str, source: str, conf: float = 0.25):
+    def predict(self, weights_path: str, source: str, conf: float = 0.25, iou: float = 0.7,
+                imgsz: int = 640, max_det: int = 300, half: bool = False, cache_path: Optional[str] = None,
+                cache_size_mb: float = 512, output_path: Optional[str] = None, render: bool = True):
         """
         使用训练好的权重进行推理验证
         
         Args:
             weights_path (str):权重文件路径 (.pt)
             source (str): 待检测图片或文件夹路径
+            iou (float): NMS 的 IoU 阈值
+            imgsz (int): 推理输入尺寸
+            max_det (int): 每张图片的最大检测数
+            half (bool): 是否使用 FP16 推理（仅 GPU）
+            cache_path (str): 检测结果缓存库路径，命中的图片跳过推理
+            cache_size_mb (float): 缓存大小上限 (MB)
+            output_path (str): 结构化结果输出路径 (.jsonl 或 .parquet)
+            render (bool): 是否保存标注图片
         """
         if not os.path.exists(weights_path):
             logger.error(f"❌ Weights not found: {weights_path}")
@@ -162,53 +407,222 @@ class YOLOTrainer:
             return
 
         logger.info(f"🔍 Loading weights: {weights_path}")
+        cache = DetectionCache(cache_path, weights_path, max_size_mb=cache_size_mb) if cache_path else None
+        output = None
         try:
-            model = YOLO(weights_path)
+            model = get_registry().get(weights_path, imgsz=imgsz)
+            if output_path:
+                output = DetectionWriter(output_path, names=model.names)
             
             logger.info(f"🖼️ Predicting on: {source}")
-            model.predict(
-                source=source,
+            predict_source = source
+            image_hashes = {}
+            if cache is not None:
+                predict_source = self._filter_cached(source, cache, conf, iou, imgsz, image_hashes, output,
+                                                     max_det=max_det, half=half)
+                if not predict_source:
+                    logger.info("✅ All images served from cache, nothing to predict.")
+                    return
+
+            results = model.predict(
+                source=predict_source,
                 conf=conf,
-                save=True,
+                iou=iou,
+                imgsz=imgsz,
+                max_det=max_det,
+                half=half,
+                save=render,
                 project=str(self.results_dir),
                 name='predict',
-                exist_ok=True
+                exist_ok=True,
+                stream=True
             )
-            logger.info(f"✅ Prediction results saved to: {self.predict_dir}")
+            for result in results:
+                if cache is not None:
+                    cache.put_result(image_hashes[str(Path(result.path).resolve())], result, conf, iou, imgsz,
+                                     max_det=max_det, half=half)
+                if output is not None:
+                    output.write_result(Path(result.path).name, result)
+            if render:
+                logger.info(f"✅ Prediction results saved to: {self.predict_dir}")
             
         except Exception as e:
             logger.error(f"❌ Prediction failed: {e}")
+        finally:
+            if cache is not None:
+                cache.close()
+            if output is not None:
+                output.close()
+
+    @staticmethod
+    def _filter_cached(source: str, cache: DetectionCache, conf: float, iou: float, imgsz: int,
+                       image_hashes: dict, output: Optional[DetectionWriter] = None, max_det: int = 300,
+                       half: bool = False) -> list:
+        """
+        列出输入源中的图片，过滤掉缓存命中的部分
+
+        Args:
+            image_hashes (dict): 输出参数，记录待推理图片路径 -> 内容哈希
+            output (DetectionWriter): 若提供，缓存命中的结果直接写入结构化输出
+            max_det (int): 每张图片的最大检测数（参与缓存键）
+            half (bool): 是否 FP16 推理（参与缓存键）
+
+        Returns:
+            list: 需要推理的图片路径列表
+        """
+        img_extensions = {'.jpg', '.jpeg', '.png', '.bmp', '.webp'}
+        source_path = Path(source)
+        if source_path.is_dir():
+            images = sorted(p for p in source_path.iterdir() if p.suffix.lower() in img_extensions)
+        else:
+            images = [source_path]
+
+        pending = []
+        for img_path in images:
+            image_hash = file_digest(img_path)
+            entry = cache.get(image_hash, conf, iou, imgsz, max_det=max_det, half=half)
+            if entry is None:
+                image_hashes[str(img_path.resolve())] = image_hash
+                pending.append(str(img_path))
+            elif output is not None:
+                output.write(img_path.name, str(img_path), entry['boxes'], entry['classes'],
+                             entry['scores'], entry['shape'], cached=True)
+        logger.info(f"💾 Cache hits: {len(images) - len(pending)}, to predict: {len(pending)}")
+        return pending
 
 
 def main():
     parser = argparse.ArgumentParser(description="Task 2: Custom YOLOv8 Training")
-    parser.add_argument('--mode', type=str, required=True, choices=['train', 'predict'],
-                        help="运行模式: train(训练), predict(验证)")
+    parser.add_argument('--mode', type=str, required=True, choices=['train', 'predict', 'sweep', 'distill'],
+                        help="运行模式: train(训练), predict(验证), sweep(超参数搜索), distill(知识蒸馏)")
     
     # 训练参数
     parser.add_argument('--data', type=str, default='data/custom_dataset/dataset.yaml',
                         help="数据集配置文件路径 (yaml)")
-    parser.add_argument('--epochs', type=int, default=50, help="训练轮数")
-    parser.add_argument('--batch', type=int, default=16, help="Batch size")
+    parser.add_argument('--epochs', type=int, default=None, help="训练轮数，默认 training.epochs")
+    parser.add_argument('--batch', type=int, default=None, help="Batch size，默认 training.batch_size")
+    parser.add_argument('--imgsz', type=int, default=None,
+                        help="输入尺寸，默认 training.img_size (train) / detection.img_size (predict)")
+    parser.add_argument('--workers', type=int, default=None, help="数据加载进程数，默认 training.workers")
+    parser.add_argument('--patience', type=int, default=None, help="早停耐心值，默认 training.patience")
+    parser.add_argument('--mmap-cache', action='store_true', default=None,
+                        help="从打包的内存映射数据集读取图片 (首次自动构建)，默认 training.mmap_cache")
+    parser.add_argument('--save-period', type=int, default=None,
+                        help="每隔多少个 epoch 额外保存 checkpoint (-1 关闭)，默认 training.save_period")
+    parser.add_argument('--lr0', type=float, default=None, help="初始学习率，默认 training.lr0")
+    parser.add_argument('--lrf', type=float, default=None, help="最终学习率比例，默认 training.lrf")
+    parser.add_argument('--train-cache', type=str, default=None, choices=['ram', 'disk', 'none'],
+                        help="ultralytics 训练图片缓存 (for train)，默认 training.cache")
+    parser.add_argument('--name', type=str, default='train',
+                        help="训练输出目录名，已存在时自动递增 (train2, train3, ...)；"
+                             "--resume 与 predict 自动选择权重时只在该名称的训练中查找")
+    parser.add_argument('--resume', nargs='?', const=True, default=False,
+                        help="从最近一次训练的 last.pt 续训，或指定 checkpoint 路径 (训练参数从 checkpoint 恢复)")
+    parser.add_argument('--skip-scan', action='store_true', help="训练前不校验数据集")
+
+    # 超参数搜索参数
+    parser.add_argument('--sweep-spec', type=str, default='sweep.yaml', help="搜索配置文件 (for sweep)")
+    parser.add_argument('--sweep-parallel', type=int, default=None, help="并行试验数，默认取搜索配置 parallel")
+
+    # 知识蒸馏参数
+    parser.add_argument('--teacher', type=str, default=None, help="教师权重 (for distill)，默认 distillation.teacher")
+    parser.add_argument('--teacher-cache', action='store_true', default=None,
+                        help="教师只推理一次并缓存为伪标签 (否则在线蒸馏)，默认 distillation.teacher_cache")
+    parser.add_argument('--distill-alpha', type=float, default=None, help="在线蒸馏损失权重，默认 distillation.alpha")
+    parser.add_argument('--distill-temperature', type=float, default=None,
+                        help="在线蒸馏温度，默认 distillation.temperature")
+    parser.add_argument('--teacher-epochs', type=int, default=None,
+                        help="教师需先微调时的轮数 (0 与 --epochs 相同)，默认 distillation.teacher_epochs")
+    parser.add_argument('--baseline', type=str, default=None,
+                        help="普通训练的学生权重 (for distill)，不指定时训练一个作为对照")
+    parser.add_argument('--compare-epochs', type=int, default=None,
+                        help="分别用原始目录与打包存储训练 N 个 epoch 并对比耗时后退出")
     
     # 预测/通用参数
-    parser.add_argument('--model', type=str, default='yolov8n.pt', help="预训练模型 (for train)")
+    parser.add_argument('--model', type=str, default=None, help="预训练模型 (for train)，默认 models.default")
+    parser.add_argument('--conf', type=float, default=None, help="置信度阈值，默认 detection.conf_threshold")
+    parser.add_argument('--iou', type=float, default=None, help="NMS IoU 阈值，默认 detection.iou_threshold")
+    parser.add_argument('--max-det', type=int, default=None, help="最大检测数，默认 detection.max_det")
+    parser.add_argument('--half', action='store_true', default=None, help="FP16 推理 (仅 GPU)，默认 detection.half")
     parser.add_argument('--weights', type=str, default=None, help="训练好的权重路径 (for predict)")
     parser.add_argument('--source', type=str, default=None, help="预测输入源 (for predict)")
+    parser.add_argument('--cache', type=str, default=None, help="检测结果缓存库路径 (for predict)")
+    parser.add_argument('--cache-size-mb', type=float, default=512, help="检测结果缓存大小上限 (MB)")
+    parser.add_argument('--output', type=str, default=None, help="结构化结果输出路径 .jsonl/.parquet (for predict)")
+    parser.add_argument('--no-render', action='store_true', help="不保存标注图片 (for predict)")
+    add_config_args(parser)
     
     args = parser.parse_args()
+    cfg = config_from_args(args)
+    get_registry(cfg)
+    train_cfg, det_cfg, distill_cfg = cfg['training'], cfg['detection'], cfg['distillation']
     
-    trainer = YOLOTrainer(model_name=args.model)
+    trainer = YOLOTrainer(model_name=pick(args.model, cfg['models']['default']))
     
-    if args.mode == 'train':
-        trainer.train(data_yaml=args.data, epochs=args.epochs, batch_size=args.batch)
+    if args.mode == 'sweep':
+        from sweep import run_sweep
+        if not args.skip_scan:
+            report = DatasetScanner(args.data, index_path=trainer.results_dir / 'dataset_scan.json').scan()
+            log_report(report)
+            if report['errors']:
+                logger.error(f"❌ Dataset has {report['errors']} errors, aborting sweep.")
+                sys.exit(1)
+        run_sweep(args.sweep_spec, results_dir=trainer.results_dir / 'sweeps', parallel=args.sweep_parallel,
+                  data=args.data)
+
+    elif args.mode == 'distill':
+        report = trainer.distill(args.data, teacher=pick(args.teacher, distill_cfg['teacher']),
+                                 epochs=pick(args.epochs, train_cfg['epochs']),
+                                 alpha=pick(args.distill_alpha, distill_cfg['alpha']),
+                                 temperature=pick(args.distill_temperature, distill_cfg['temperature']),
+                                 teacher_cache=pick(args.teacher_cache, distill_cfg['teacher_cache']),
+                                 pseudo_conf=distill_cfg['pseudo_conf'],
+                                 match_iou=distill_cfg['match_iou'],
+                                 teacher_epochs=pick(args.teacher_epochs, distill_cfg['teacher_epochs']),
+                                 baseline=args.baseline,
+                                 validate=not args.skip_scan,
+                                 warmup_runs=cfg['benchmark']['warmup_runs'],
+                                 test_runs=cfg['benchmark']['test_runs'],
+                                 batch_size=pick(args.batch, train_cfg['batch_size']),
+                                 imgsz=pick(args.imgsz, train_cfg['img_size']),
+                                 workers=pick(args.workers, train_cfg['workers']),
+                                 patience=pick(args.patience, train_cfg['patience']),
+                                 lr0=pick(args.lr0, train_cfg['lr0']),
+                                 lrf=pick(args.lrf, train_cfg['lrf']))
+        if report is None:
+            sys.exit(1)
+
+    elif args.mode == 'train' and args.compare_epochs:
+        trainer.compare_dataset_cache(args.data, epochs=args.compare_epochs,
+                                      batch_size=pick(args.batch, train_cfg['batch_size']),
+                                      imgsz=pick(args.imgsz, train_cfg['img_size']),
+                                      workers=pick(args.workers, train_cfg['workers']),
+                                      validate=not args.skip_scan)
+
+    elif args.mode == 'train':
+        train_cache = pick(args.train_cache, train_cfg['cache'])
+        train_cache = False if train_cache in (False, 'none') else train_cache
+        trainer.train(data_yaml=args.data,
+                      epochs=pick(args.epochs, train_cfg['epochs']),
+                      batch_size=pick(args.batch, train_cfg['batch_size']),
+                      imgsz=pick(args.imgsz, train_cfg['img_size']),
+                      workers=pick(args.workers, train_cfg['workers']),
+                      patience=pick(args.patience, train_cfg['patience']),
+                      mmap_cache=pick(args.mmap_cache, train_cfg['mmap_cache']),
+                      validate=not args.skip_scan and not args.resume,
+                      save_period=pick(args.save_period, train_cfg['save_period']),
+                      lr0=pick(args.lr0, train_cfg['lr0']),
+                      lrf=pick(args.lrf, train_cfg['lrf']),
+                      cache=train_cache,
+                      name=args.name,
+                      resume=args.resume)
         
     elif args.mode == 'predict':
         if not args.weights:
-            # 尝试自动寻找最近一次训练的最佳权重
-            potential_weights = Path('results/task2/train/weights/best.pt')
-            if potential_weights.exists():
-                args.weights = str(potential_weights)
+            # 尝试自动寻找最近一次同名训练 (默认 train*) 的最佳权重
+            latest = trainer.latest_run('best.pt', args.name)
+            if latest is not None:
+                args.weights = str(latest / 'weights' / 'best.pt')
                 logger.info(f"ℹ️ Auto-selected best weights: {args.weights}")
             else:
                 logger.error("❌ Please specify --weights path/to/best.pt")
@@ -218,7 +632,14 @@ def main():
              logger.error("❌ Please specify --source path/to/images")
              sys.exit(1)
              
-        trainer.predict(weights_path=args.weights, source=args.source)
+        trainer.predict(weights_path=args.weights, source=args.source,
+                        conf=pick(args.conf, det_cfg['conf_threshold']),
+                        iou=pick(args.iou, det_cfg['iou_threshold']),
+                        imgsz=pick(args.imgsz, det_cfg['img_size']),
+                        max_det=pick(args.max_det, det_cfg['max_det']),
+                        half=pick(args.half, det_cfg['half']),
+                        cache_path=args.cache, cache_size_mb=args.cache_size_mb,
+                        output_path=args.output, render=not args.no_render)
 
 if __name__ == "__main__":
     main()
@@ -6,9 +6,11 @@ Features: 纯代码生成粒子流星 | 零外部图片依赖 | 赛博朋克霓
 """
 
 import sys
-import tempfile
 import time
+import uuid
 import random
+import weakref
+import threading
 from pathlib import Path
 import cv2
 import numpy as np
@@ -16,6 +18,17 @@ import pandas as pd
 import streamlit as st
 from PIL import Image
 
+from config import load_config
+from model_registry import current_rss_mb, get_registry
+from slicing import SlicedPredictor
+from upload_store import UploadStore
+from video_job import VideoJob
+
+# 视频分析时 UI 的最高刷新频率 (Hz)：后台全速处理，前端只按此频率轮询进度与预览
+UI_REFRESH_HZ = 2
+VIDEO_JOB_DIR = Path('results/task4/jobs')
+UPLOAD_DIR = Path('results/task4/uploads')
+
 # ================= 1. 页面基础配置 =================
 st.set_page_config(
     page_title="深度学习作业展示 - 黄永庆",
@@ -223,6 +236,61 @@ except ImportError:
     st.error("❌ 错误: 未安装 'ultralytics' 库。")
     st.stop()
 
+# 默认参数取自 config.yaml（可用 MY_YOLO_ 环境变量覆盖）
+cfg = load_config()
+det_cfg = cfg['detection']
+
+
+@st.cache_resource
+def upload_stores():
+    """进程内共享的上传目录：按内容哈希存储，数量有界，过期自动清理"""
+    return {
+        'weights': UploadStore(UPLOAD_DIR / 'weights', max_entries=2 * cfg['model_pool']['max_models']),
+        'videos': UploadStore(UPLOAD_DIR / 'videos', max_entries=4),
+        'jobs': UploadStore(VIDEO_JOB_DIR, max_entries=5),
+    }
+
+
+@st.cache_resource
+def video_jobs():
+    """
+    进程内所有会话的视频任务（弱引用：任务结束且不再被任何会话持有时自动移除）；
+    上传视频与任务输出由各会话共用的存储清理，清理时这些任务的输入与输出全部豁免
+    """
+    return {'jobs': weakref.WeakSet(), 'lock': threading.Lock()}
+
+
+def register_video_job(job: VideoJob):
+    registry = video_jobs()
+    with registry['lock']:
+        registry['jobs'].add(job)
+
+
+def active_video_jobs() -> list:
+    registry = video_jobs()
+    with registry['lock']:
+        return list(registry['jobs'])
+
+
+def save_upload(kind: str, uploaded, suffix: str) -> str:
+    """
+    把上传文件保存到内容寻址目录；同一会话内重跑时不重复读取与哈希
+
+    Args:
+        kind (str): 'weights' 或 'videos'
+        uploaded (UploadedFile): Streamlit 上传对象
+        suffix (str): 保存的文件后缀
+    """
+    state_key = f"upload_{kind}"
+    ident = (uploaded.name, uploaded.size)
+    cached = st.session_state.get(state_key)
+    if cached and cached[0] == ident and Path(cached[1]).exists():
+        upload_stores()[kind].touch(cached[1])
+        return cached[1]
+    path = str(upload_stores()[kind].save(uploaded.getvalue(), suffix=suffix))
+    st.session_state[state_key] = (ident, path)
+    return path
+
 # ================= 3. 侧边栏：作者与控制 =================
 with st.sidebar:
     # --- 全息作者卡片 ---
@@ -244,27 +312,32 @@ with st.sidebar:
     model_source = st.radio("模型来源 (Source)", ["官方预训练 (COCO)", "自定义权重 (My Best)"])
     
     if model_source == "官方预训练 (COCO)":
-        model_name = st.selectbox("选择版本 (Version)", ["yolov8n.pt", "yolov8s.pt", "yolov8m.pt"], index=2)
+        model_options = list(dict.fromkeys(p for k, p in cfg['models'].items() if k != 'default'))
+        default_model = cfg['models']['default']
+        model_name = st.selectbox("选择版本 (Version)", model_options,
+                                  index=model_options.index(default_model) if default_model in model_options else 0)
         model_path = model_name
     else:
         st.info("💡 提示：请上传 Task 2 训练好的 best.pt")
         uploaded_model = st.file_uploader("上传权重文件 (.pt)", type=['pt'])
         if uploaded_model:
-            tfile = tempfile.NamedTemporaryFile(delete=False, suffix='.pt')
-            tfile.write(uploaded_model.read())
-            model_path = tfile.name
+            # 相同内容的权重始终映射到同一路径，模型池不会为重复上传加载新副本
+            model_path = save_upload('weights', uploaded_model, '.pt')
+            upload_stores()['weights'].prune(keep={model_path})
         else:
             model_path = None
 
     st.markdown("---")
     st.markdown("### 🎛️ 参数微调")
-    conf_thres = st.slider("置信度 (Confidence)", 0.0, 1.0, 0.40, 0.05)
-    iou_thres = st.slider("IoU 阈值 (NMS)", 0.0, 1.0, 0.45, 0.05)
+    conf_thres = st.slider("置信度 (Confidence)", 0.0, 1.0, float(det_cfg['conf_threshold']), 0.05)
+    iou_thres = st.slider("IoU 阈值 (NMS)", 0.0, 1.0, float(det_cfg['iou_threshold']), 0.05)
+    # 所有推理调用共用的参数
+    predict_args = {'conf': conf_thres, 'iou': iou_thres, 'imgsz': det_cfg['img_size'],
+                    'max_det': det_cfg['max_det'], 'half': det_cfg['half']}
 
-# 加载模型
-@st.cache_resource
+# 加载模型（进程级模型池：各会话共享、按 imgsz 预热、超出上限按 LRU 淘汰）
 def load_yolo_model(path):
-    return YOLO(path)
+    return get_registry(cfg).get(path, imgsz=det_cfg['img_size'])
 
 # ================= 4. 主界面逻辑 =================
 
@@ -282,6 +355,15 @@ except Exception as e:
     st.error(f"模型加载失败: {e}")
     st.stop()
 
+with st.sidebar:
+    st.markdown("---")
+    st.markdown("### 🧠 内存占用")
+    st.caption(f"进程常驻内存: {current_rss_mb():.0f} MB")
+    for usage in get_registry(cfg).memory_usage():
+        st.caption(f"• 模型 {Path(usage['weights']).name}: {usage['param_mb']} MB")
+    upload_mb = sum(store.size_mb() for store in upload_stores().values())
+    st.caption(f"上传与任务文件: {upload_mb:.1f} MB")
+
 tab1, tab2, tab3 = st.tabs(["🖼️ 图片分析", "🎥 视频分析", "📷 实时拍摄"])
 
 # --- 图片检测 ---
@@ -301,11 +383,36 @@ with tab1:
             st.image(image, caption="原始输入")
 
         with col2:
+            # 高分辨率图片整图缩放后小目标会消失，切片推理逐块检测再合并
+            slice_cfg = cfg['slicing']
+            use_slicing = st.checkbox("切片推理 (高分辨率)", value=False,
+                                      help="将大图切成带重叠的切片一次组批推理，跨切片 NMS 合并，适合小目标")
+            if use_slicing:
+                tile_size = st.select_slider("切片尺寸", options=[320, 480, 640, 960, 1280],
+                                             value=slice_cfg['tile_size'] if slice_cfg['tile_size'] in
+                                             (320, 480, 640, 960, 1280) else 640)
             if st.button("🚀 启动神经网路 (Analyze)", key="btn_img", use_container_width=True):
                 with st.spinner("🌌 正在进行张量运算..."):
                     start_time = time.time()
-                    res = model.predict(image, conf=conf_thres, iou=iou_thres)
+                    # 模型实例由各会话与后台视频任务共享，推理需持有该模型的锁
+                    with get_registry(cfg).predict_lock(model):
+                        if use_slicing:
+                            slicer = SlicedPredictor(model, tile=tile_size, overlap=slice_cfg['overlap'],
+                                                     tile_batch=slice_cfg['tile_batch'] or None,
+                                                     merge_iou=slice_cfg['merge_iou'],
+                                                     merge_ios=slice_cfg['merge_ios'],
+                                                     include_full=slice_cfg['include_full'],
+                                                     predict_args=predict_args)
+                            bgr = np.array(image.convert('RGB'))[:, :, ::-1].copy()
+                            res = [slicer.predict(bgr, path=uploaded_file.name)]
+                        else:
+                            res = model.predict(image, **predict_args)
                     end_time = time.time()
+                    if use_slicing:
+                        stats = slicer.last_stats
+                        st.caption(f"🧩 {stats['tiles']} 个切片 · {stats['forward_passes']} 次前向 · "
+                                   f"{stats['raw_detections']} → {stats['merged_detections']} 个目标 · "
+                                   f"合并 {stats['merge_ms']:.1f}ms")
                     
                     st.session_state['res_img'] = res
                     
@@ -340,33 +447,63 @@ with tab2:
     video_file = st.file_uploader("上传视频", type=['mp4', 'avi', 'mov'])
     
     if video_file:
-        tfile = tempfile.NamedTemporaryFile(delete=False)
-        tfile.write(video_file.read())
+        video_path = save_upload('videos', video_file, Path(video_file.name).suffix or '.mp4')
         
-        st.video(tfile.name)
+        st.video(video_path)
         
+        job = st.session_state.get('video_job')
         if st.button("▶️ 启动视频流分析", key="btn_video", use_container_width=True):
-            cap = cv2.VideoCapture(tfile.name)
+            if job is not None and not job.finished:
+                job.cancel()
+            # 后台线程全速处理整段视频，不随页面重跑中断；目录名带随机后缀，同一秒启动的任务互不覆盖
+            job_dir = VIDEO_JOB_DIR / f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+            job = VideoJob(model, video_path, job_dir, predict_args,
+                           batch=det_cfg['batch'], preview_interval=1.0 / UI_REFRESH_HZ,
+                           decode_args=cfg['video_io'], predict_lock=get_registry(cfg).predict_lock(model))
+            register_video_job(job)
+            job.start()
+            st.session_state['video_job'] = job
+
+        # 清理旧的上传视频与任务输出；保留当前视频，以及任一会话仍在运行或展示的任务的输入与输出
+        jobs = active_video_jobs()
+        upload_stores()['videos'].prune(keep={video_path} | {j.video_path for j in jobs})
+        upload_stores()['jobs'].prune(keep={j.output_dir for j in jobs})
+
+        if job is not None:
+            st_progress = st.progress(0.0)
+            st_status = st.empty()
             st_frame = st.empty()
-            st_progress = st.progress(0)
-            total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-            current_frame = 0
-            
-            while cap.isOpened():
-                ret, frame = cap.read()
-                if not ret: break
-                
-                current_frame += 1
-                if total_frames > 0:
-                    st_progress.progress(current_frame / total_frames)
-
-                frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                results = model.predict(frame, conf=conf_thres, verbose=False)
-                res_plotted = results[0].plot()
-                st_frame.image(res_plotted, caption=f"Frame: {current_frame}/{total_frames}")
-            
-            cap.release()
-            st.success("🎉 分析完成！")
+            # 按固定频率轮询；用户操作触发重跑时本循环被中断，后台任务继续，下次运行时重新接上
+            while not job.finished:
+                st_progress.progress(job.progress)
+                st_status.caption(f"⏳ {job.frames_done}/{job.total_frames or '?'} 帧 | {job.fps:.1f} FPS")
+                if job.preview is not None:
+                    st_frame.image(job.preview, caption="实时预览 (缩略图)")
+                time.sleep(1.0 / UI_REFRESH_HZ)
+
+            st_progress.progress(1.0 if job.status == 'done' else job.progress)
+            if job.preview is not None:
+                st_frame.image(job.preview, caption="最后一帧预览 (缩略图)")
+            if job.status == 'done':
+                st.success(f"🎉 分析完成！共 {job.frames_done} 帧、{job.detections} 个目标，"
+                           f"总耗时 {job.elapsed:.1f}s（{job.fps:.1f} FPS）")
+                decode = job.decode_stats
+                st.caption(f"🎞️ 解码 ({decode['backend']}): {decode['decode_ms']} ms/帧 · 缩放 {decode['resize_ms']} ms · "
+                           f"颜色转换 {decode['convert_ms']} ms · 拷贝 {decode['copy_ms']} ms ｜ "
+                           f"推理 {job.infer_ms_per_frame:.1f} ms/帧")
+                col_video, col_dets = st.columns(2)
+                with col_video:
+                    with open(job.output_video, 'rb') as f:
+                        st.download_button("⬇️ 下载标注视频", f.read(), file_name='annotated.mp4',
+                                           mime='video/mp4', use_container_width=True)
+                with col_dets:
+                    with open(job.detections_path, 'rb') as f:
+                        st.download_button("⬇️ 下载逐帧检测 (JSONL)", f.read(), file_name='detections.jsonl',
+                                           mime='application/json', use_container_width=True)
+            elif job.status == 'failed':
+                st.error(f"视频分析失败: {job.error}")
+            else:
+                st.warning("视频分析已取消。")
     st.markdown('</div>', unsafe_allow_html=True)
 
 # --- 摄像头 ---
@@ -386,7 +523,8 @@ with tab3:
         frame_rgb = cv2.cvtColor(cv2_img, cv2.COLOR_BGR2RGB)
         
         with st.spinner("🤖 正在识别..."):
-            res = model.predict(frame_rgb, conf=conf_thres)
+            with get_registry(cfg).predict_lock(model):
+                res = model.predict(frame_rgb, **predict_args)
             res_plotted = res[0].plot()
             st.image(res_plotted, caption="实时结果")
             
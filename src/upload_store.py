@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""
+上传文件存储 (Content-Addressed Upload Store)
+
+功能描述:
+    1. 按内容哈希保存上传文件：同一文件重复上传只落盘一次，路径稳定（模型池据此复用已加载模型）
+    2. 有界保留：超过 max_entries 时按最近使用时间淘汰，超过 ttl_hours 未使用的条目自动清理
+    3. 正在使用的文件（如后台任务的输入视频）可通过 keep 参数豁免清理
+
+使用方法:
+    store = UploadStore('results/task4/uploads/weights', max_entries=4)
+    path = store.save(uploaded.getvalue(), suffix='.pt')
+    store.prune(keep={path})
+
+作者: my_yolo Team
+日期: 2026-10-16
+"""
+
+import os
+import time
+import shutil
+import hashlib
+import logging
+from pathlib import Path
+from typing import Iterable, Union
+
+logger = logging.getLogger(__name__)
+
+
+class UploadStore:
+    """以内容哈希命名的本地上传目录，条目可以是文件或目录"""
+
+    def __init__(self, root: Union[str, Path], max_entries: int = 8, ttl_hours: float = 24.0):
+        """
+        Args:
+            root (str): 存储目录
+            max_entries (int): 最多保留的条目数
+            ttl_hours (float): 超过该时长未使用的条目会被清理
+        """
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max(1, max_entries)
+        self.ttl_seconds = ttl_hours * 3600
+
+    def save(self, data: bytes, suffix: str = '') -> Path:
+        """
+        保存内容并返回路径；内容已存在时只刷新使用时间
+
+        Args:
+            data (bytes): 文件内容
+            suffix (str): 文件后缀（如 .pt / .mp4），ultralytics 依据后缀识别格式
+        """
+        digest = hashlib.blake2b(data, digest_size=16).hexdigest()
+        path = self.root / f"{digest}{suffix}"
+        if path.exists():
+            self.touch(path)
+        else:
+            # 先写临时文件再改名，避免并发会话读到写了一半的文件
+            tmp_path = path.with_name(path.name + f".{os.getpid()}.tmp")
+            tmp_path.write_bytes(data)
+            os.replace(tmp_path, path)
+        return path
+
+    def touch(self, path: Union[str, Path]):
+        """刷新条目的最近使用时间"""
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+
+    def entries(self) -> list:
+        """全部条目，按最近使用时间从新到旧排序（跳过其他会话正在删除的条目）"""
+        items = []
+        for path in self.root.iterdir():
+            if path.name.endswith('.tmp'):
+                continue
+            try:
+                items.append((path.stat().st_mtime, path))
+            except FileNotFoundError:
+                continue
+        return [path for _, path in sorted(items, key=lambda item: item[0], reverse=True)]
+
+    def prune(self, keep: Iterable[Union[str, Path]] = ()) -> int:
+        """
+        清理过期与超量条目
+
+        Args:
+            keep (iterable): 无论如何都保留的路径
+
+        Returns:
+            int: 删除的条目数
+        """
+        keep = {Path(p).resolve() for p in keep}
+        now = time.time()
+        removed = 0
+        for i, path in enumerate(self.entries()):
+            if path.resolve() in keep:
+                continue
+            try:
+                mtime = path.stat().st_mtime
+            except FileNotFoundError:
+                continue
+            if i >= self.max_entries or now - mtime > self.ttl_seconds:
+                self.remove(path)
+                removed += 1
+        if removed:
+            logger.info(f"🧹 Removed {removed} stale uploads from {self.root}")
+        return removed
+
+    @staticmethod
+    def remove(path: Union[str, Path]):
+        path = Path(path)
+        if path.is_dir():
+            shutil.rmtree(path, ignore_errors=True)
+        elif path.exists():
+            path.unlink()
+
+    def size_mb(self) -> float:
+        total = 0
+        for path in self.entries():
+            if path.is_dir():
+                total += sum(f.stat().st_size for f in path.rglob('*') if f.is_file())
+            else:
+                total += path.stat().st_size
+        return total / 1024 / 1024
@@ -0,0 +1,313 @@
+# -*- coding: utf-8 -*-
+"""
+视频解码后端 (Video Decode Backends)
+
+功能描述:
+    1. 统一的 VideoCapture 风格读取接口 (isOpened / read / get / set / release)，可直接替换 cv2.VideoCapture
+    2. 三种后端: opencv（默认）、pyav（libav 多线程解码）、ffmpeg（子进程管道，可开启硬件解码）
+    3. 可在解码端直接缩放到模型输入尺寸（长边 = decode_size），省去全分辨率帧的后续搬运与缩放
+    4. 帧写入预分配的环形缓冲区并循环复用，避免每帧分配新数组
+    5. 分别统计解码、缩放、颜色转换、拷贝各环节的每帧耗时，便于与推理耗时对比
+
+使用方法:
+    reader = open_video('data/video/test.mp4', backend='pyav', decode_size=640, threads=4)
+    while True:
+        ret, frame = reader.read()   # BGR，指向环形缓冲区，需在 buffers 帧内用完
+        if not ret:
+            break
+    reader.release()
+    print(reader.timing())
+
+    python task1.py --mode video --source data/video/test.mp4 --decode-backend ffmpeg --decode-size 640
+
+作者: my_yolo Team
+日期: 2026-10-16
+"""
+
+import json
+import time
+import shutil
+import logging
+import subprocess
+from typing import Optional, Tuple, Union
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ('opencv', 'pyav', 'ffmpeg')
+
+
+def fit_size(width: int, height: int, decode_size: int) -> Tuple[int, int]:
+    """按长边缩放到 decode_size（只缩小不放大），宽高取偶数以兼容 YUV420"""
+    if not decode_size or max(width, height) <= decode_size:
+        return width, height
+    scale = decode_size / max(width, height)
+    return max(2, int(round(width * scale / 2)) * 2), max(2, int(round(height * scale / 2)) * 2)
+
+
+class BaseReader:
+    """环形缓冲区与分环节计时，子类实现 _open 与 _read_into"""
+
+    stages = ('decode', 'resize', 'convert', 'copy')
+
+    def __init__(self, source: Union[str, int], decode_size: int = 0, threads: int = 0, buffers: int = 8):
+        """
+        Args:
+            source (str|int): 视频文件路径、流地址或摄像头 ID
+            decode_size (int): 输出帧长边尺寸，0 表示保持原始分辨率
+            threads (int): 解码线程数，0 表示由解码器自动决定
+            buffers (int): 环形缓冲区帧数，应大于下游同时持有的帧数（各级队列长度之和）
+        """
+        self.source = source
+        self.decode_size = decode_size
+        self.threads = threads
+        self.num_buffers = max(2, buffers)
+        self.opened = False
+        self.fps = 0.0
+        self.frame_count = 0
+        self.src_size = (0, 0)
+        self.size = (0, 0)
+        self.frames = 0
+        self.seconds = {stage: 0.0 for stage in self.stages}
+        self._ring = []
+        self._next = 0
+        self._open()
+        if self.opened:
+            width, height = self.size
+            self._ring = [np.empty((height, width, 3), dtype=np.uint8) for _ in range(self.num_buffers)]
+
+    def _open(self):
+        raise NotImplementedError
+
+    def _read_into(self, buf: np.ndarray) -> bool:
+        raise NotImplementedError
+
+    def isOpened(self) -> bool:
+        return self.opened
+
+    def read(self) -> Tuple[bool, Optional[np.ndarray]]:
+        """读取下一帧；返回的数组在之后第 buffers 次 read 时被覆盖，持有更久的调用方需自行 copy"""
+        if not self.opened:
+            return False, None
+        buf = self._ring[self._next]
+        if not self._read_into(buf):
+            return False, None
+        self._next = (self._next + 1) % self.num_buffers
+        self.frames += 1
+        return True, buf
+
+    def get(self, prop: int) -> float:
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return float(self.size[0])
+        if prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return float(self.size[1])
+        if prop == cv2.CAP_PROP_FPS:
+            return float(self.fps)
+        if prop == cv2.CAP_PROP_FRAME_COUNT:
+            return float(self.frame_count)
+        return 0.0
+
+    def set(self, prop: int, value) -> bool:
+        return False
+
+    def release(self):
+        self.opened = False
+
+    def _tick(self, stage: str, t0: float) -> float:
+        now = time.perf_counter()
+        self.seconds[stage] += now - t0
+        return now
+
+    def timing(self) -> dict:
+        """各环节每帧平均耗时 (ms)"""
+        n = max(1, self.frames)
+        stats = {'backend': self.backend, 'frames': self.frames,
+                 'source_size': list(self.src_size), 'output_size': list(self.size)}
+        stats.update({f"{stage}_ms": round(self.seconds[stage] / n * 1000, 3) for stage in self.stages})
+        stats['total_ms'] = round(sum(self.seconds.values()) / n * 1000, 3)
+        return stats
+
+
+class OpenCVReader(BaseReader):
+    """cv2.VideoCapture 解码（输出即 BGR），按需 cv2.resize 写入缓冲区"""
+
+    backend = 'opencv'
+
+    def _open(self):
+        self.cap = cv2.VideoCapture(self.source)
+        self.opened = self.cap.isOpened()
+        if not self.opened:
+            return
+        self.src_size = (int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+                         int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+        self.size = fit_size(*self.src_size, self.decode_size)
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS)
+        self.frame_count = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        self._full = None
+
+    def _read_into(self, buf: np.ndarray) -> bool:
+        t0 = time.perf_counter()
+        if self.size == self.src_size:
+            # 尺寸一致时直接解码进缓冲区（read 复用形状匹配的输出数组）
+            ret, frame = self.cap.read(buf)
+            self._tick('decode', t0)
+            if ret and frame is not buf:
+                # 个别后端忽略输出数组，此时退化为一次拷贝
+                t1 = time.perf_counter()
+                np.copyto(buf, frame)
+                self._tick('copy', t1)
+            return ret
+        ret, self._full = self.cap.read(self._full)
+        t1 = self._tick('decode', t0)
+        if not ret:
+            return False
+        cv2.resize(self._full, self.size, dst=buf, interpolation=cv2.INTER_AREA)
+        self._tick('resize', t1)
+        return True
+
+    def get(self, prop: int) -> float:
+        if prop in (cv2.CAP_PROP_FRAME_WIDTH, cv2.CAP_PROP_FRAME_HEIGHT, cv2.CAP_PROP_FPS,
+                    cv2.CAP_PROP_FRAME_COUNT):
+            return super().get(prop)
+        return self.cap.get(prop)
+
+    def set(self, prop: int, value) -> bool:
+        return self.cap.set(prop, value)
+
+    def release(self):
+        super().release()
+        self.cap.release()
+
+
+class PyAVReader(BaseReader):
+    """PyAV (libav) 多线程解码：先在 YUV 域缩放，再转换为 BGR，最后拷入缓冲区"""
+
+    backend = 'pyav'
+
+    def _open(self):
+        import av
+
+        self.container = av.open(str(self.source))
+        self.stream = self.container.streams.video[0]
+        self.stream.thread_type = 'AUTO'
+        if self.threads:
+            self.stream.thread_count = self.threads
+        ctx = self.stream.codec_context
+        self.src_size = (ctx.width, ctx.height)
+        self.size = fit_size(*self.src_size, self.decode_size)
+        self.fps = float(self.stream.average_rate or 0)
+        self.frame_count = int(self.stream.frames or 0)
+        self._decoder = self.container.decode(self.stream)
+        self.opened = True
+
+    def _read_into(self, buf: np.ndarray) -> bool:
+        t0 = time.perf_counter()
+        try:
+            frame = next(self._decoder)
+        except StopIteration:
+            return False
+        t1 = self._tick('decode', t0)
+        if self.size != self.src_size:
+            frame = frame.reformat(width=self.size[0], height=self.size[1])
+            t1 = self._tick('resize', t1)
+        array = frame.to_ndarray(format='bgr24')
+        t1 = self._tick('convert', t1)
+        np.copyto(buf, array)
+        self._tick('copy', t1)
+        return True
+
+    def release(self):
+        super().release()
+        self.container.close()
+
+
+class FFmpegReader(BaseReader):
+    """
+    ffmpeg 子进程解码：缩放与 BGR 转换在 ffmpeg 内完成（可用硬件解码），
+    原始帧经管道直接 readinto 预分配缓冲区；各环节在子进程中重叠执行，只统计取帧等待耗时
+    """
+
+    backend = 'ffmpeg'
+
+    def __init__(self, source: Union[str, int], decode_size: int = 0, threads: int = 0, buffers: int = 8,
+                 hwaccel: bool = False):
+        self.hwaccel = hwaccel
+        self.proc = None
+        super().__init__(source, decode_size, threads, buffers)
+
+    def _probe(self):
+        cmd = ['ffprobe', '-v', 'error', '-select_streams', 'v:0', '-show_entries',
+               'stream=width,height,avg_frame_rate,nb_frames', '-of', 'json', str(self.source)]
+        info = json.loads(subprocess.run(cmd, capture_output=True, check=True, text=True).stdout)['streams'][0]
+        num, _, den = info.get('avg_frame_rate', '0/1').partition('/')
+        self.fps = float(num) / float(den) if float(den or 0) else 0.0
+        self.frame_count = int(info.get('nb_frames') or 0)   # 部分容器不记录帧数，此时为 0
+        self.src_size = (int(info['width']), int(info['height']))
+
+    def _open(self):
+        if shutil.which('ffmpeg') is None or shutil.which('ffprobe') is None:
+            raise FileNotFoundError("ffmpeg/ffprobe not found in PATH")
+        self._probe()
+        self.size = fit_size(*self.src_size, self.decode_size)
+        cmd = ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-nostdin']
+        if self.hwaccel:
+            cmd += ['-hwaccel', 'auto']
+        if self.threads:
+            cmd += ['-threads', str(self.threads)]
+        cmd += ['-i', str(self.source)]
+        if self.size != self.src_size:
+            cmd += ['-vf', f"scale={self.size[0]}:{self.size[1]}:flags=area"]
+        cmd += ['-f', 'rawvideo', '-pix_fmt', 'bgr24', 'pipe:1']
+        self.frame_bytes = self.size[0] * self.size[1] * 3
+        self.proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, bufsize=self.frame_bytes * 2)
+        self.opened = True
+
+    def _read_into(self, buf: np.ndarray) -> bool:
+        t0 = time.perf_counter()
+        view = memoryview(buf).cast('B')
+        filled = 0
+        while filled < self.frame_bytes:
+            n = self.proc.stdout.readinto(view[filled:])
+            if not n:
+                break
+            filled += n
+        self._tick('decode', t0)
+        return filled == self.frame_bytes
+
+    def release(self):
+        super().release()
+        if self.proc is not None:
+            self.proc.stdout.close()
+            self.proc.terminate()
+            self.proc.wait()
+
+
+def open_video(source: Union[str, int], backend: str = 'opencv', decode_size: int = 0, threads: int = 0,
+               buffers: int = 8, hwaccel: bool = False) -> BaseReader:
+    """
+    按后端打开视频源；摄像头、后端不可用（未安装 av / 无 ffmpeg）或后端打开失败（容器无法解析、
+    ffprobe 输出异常等）时回退到 opencv
+
+    Args:
+        source (str|int): 视频文件路径、流地址或摄像头 ID
+        backend (str): opencv / pyav / ffmpeg
+        decode_size (int): 输出帧长边尺寸，0 表示原始分辨率
+        threads (int): 解码线程数，0 表示自动
+        buffers (int): 环形缓冲区帧数
+        hwaccel (bool): ffmpeg 后端是否尝试硬件解码
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"unknown decode backend: {backend} (choose from {BACKENDS})")
+    if backend != 'opencv' and isinstance(source, int):
+        logger.warning(f"⚠️ Decode backend '{backend}' does not support camera input, using opencv.")
+        backend = 'opencv'
+    try:
+        if backend == 'pyav':
+            return PyAVReader(source, decode_size, threads, buffers)
+        if backend == 'ffmpeg':
+            return FFmpegReader(source, decode_size, threads, buffers, hwaccel=hwaccel)
+    except Exception as e:
+        logger.warning(f"⚠️ Decode backend '{backend}' unavailable ({e}), using opencv.")
+    return OpenCVReader(source, decode_size, threads, buffers)
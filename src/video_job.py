@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+"""
+后台视频分析任务 (Background Video Analysis Job)
+
+功能描述:
+    1. 在后台线程中全速处理整段视频：按批推理、绘制并编码为标注视频
+    2. 逐帧检测结果写入 JSONL（复用 DetectionWriter），便于下载与离线分析
+    3. 只按固定间隔生成缩小的预览帧，UI 轮询进度与预览而不是接收每一帧
+    4. 记录总处理耗时与平均处理 FPS，支持中途取消
+    5. 解码后端可选 (video_io)，解码各环节耗时与推理耗时分开统计
+
+使用方法:
+    job = VideoJob(model, 'input.mp4', 'results/task4/jobs/xxx', predict_args)
+    job.start()
+    while job.is_alive():
+        print(job.progress, job.fps)
+        time.sleep(0.5)
+
+作者: my_yolo Team
+日期: 2026-10-16
+"""
+
+import time
+import logging
+import threading
+from pathlib import Path
+from typing import Optional, Union
+
+import cv2
+import numpy as np
+
+from detection_writer import DetectionWriter
+from video_io import open_video
+
+logger = logging.getLogger(__name__)
+
+
+class VideoJob(threading.Thread):
+    """后台视频推理线程，状态字段可被 UI 线程随时读取"""
+
+    def __init__(self, model, video_path: Union[str, Path], output_dir: Union[str, Path], predict_args: dict,
+                 batch: int = 4, preview_width: int = 480, preview_interval: float = 0.5,
+                 decode_args: Optional[dict] = None, predict_lock: Optional[threading.RLock] = None):
+        """
+        Args:
+            model (YOLO): 已加载的模型
+            video_path (str): 输入视频路径
+            output_dir (str): 输出目录（标注视频 annotated.mp4 与 detections.jsonl）
+            predict_args (dict): 推理参数 (conf, iou, imgsz, max_det, half)
+            batch (int): 每次送入模型的帧数
+            preview_width (int): 预览帧缩放后的宽度
+            preview_interval (float): 预览帧最短更新间隔（秒）
+            decode_args (dict): 解码后端参数 (backend, decode_size, threads, hwaccel)，见 video_io.open_video
+            predict_lock (RLock): 模型被其他线程共享时的推理锁（model_registry.predict_lock），每批推理在锁内执行
+        """
+        super().__init__(name='video-job', daemon=True)
+        self.model = model
+        self.video_path = str(video_path)
+        self.output_dir = Path(output_dir)
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.output_video = self.output_dir / 'annotated.mp4'
+        self.detections_path = self.output_dir / 'detections.jsonl'
+        self.predict_args = predict_args
+        self.batch = max(1, batch)
+        self.preview_width = preview_width
+        self.preview_interval = preview_interval
+        self.decode_args = decode_args or {}
+        self.predict_lock = predict_lock or threading.RLock()
+        self.decode_stats = {}
+        self.infer_seconds = 0.0
+
+        self.status = 'pending'
+        self.error = None
+        self.total_frames = 0
+        self.frames_done = 0
+        self.detections = 0
+        self.elapsed = 0.0
+        self.preview: Optional[np.ndarray] = None   # RGB，已缩小
+        self._last_preview = 0.0
+        self._cancel = threading.Event()
+
+    @property
+    def progress(self) -> float:
+        return min(1.0, self.frames_done / self.total_frames) if self.total_frames > 0 else 0.0
+
+    @property
+    def fps(self) -> float:
+        return self.frames_done / self.elapsed if self.elapsed > 0 else 0.0
+
+    @property
+    def infer_ms_per_frame(self) -> float:
+        return self.infer_seconds / self.frames_done * 1000 if self.frames_done else 0.0
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ('done', 'failed', 'cancelled')
+
+    def cancel(self):
+        self._cancel.set()
+
+    def run(self):
+        self.status = 'running'
+        start = time.perf_counter()
+        cap = None
+        out = None
+        writer = None
+        try:
+            # 一批帧在推理结束前都引用环形缓冲区，缓冲区需多于批大小
+            cap = open_video(self.video_path, buffers=self.batch + 2, **self.decode_args)
+            if not cap.isOpened():
+                raise RuntimeError(f"cannot open video: {self.video_path}")
+            self.total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+            fps = cap.get(cv2.CAP_PROP_FPS) or 30
+            width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+            height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+            out = cv2.VideoWriter(str(self.output_video), cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+            writer = DetectionWriter(self.detections_path, batch_size=512)
+
+            frames = []
+            while not self._cancel.is_set():
+                ret, frame = cap.read()
+                if ret:
+                    frames.append(frame)
+                if frames and (not ret or len(frames) >= self.batch):
+                    self._process_batch(frames, out, writer)
+                    frames = []
+                    self.elapsed = time.perf_counter() - start
+                if not ret:
+                    break
+
+            self.status = 'cancelled' if self._cancel.is_set() else 'done'
+        except Exception as e:
+            self.error = str(e)
+            self.status = 'failed'
+            logger.error(f"❌ Video job failed: {e}")
+        finally:
+            if cap is not None:
+                cap.release()
+                self.decode_stats = cap.timing()
+            if out is not None:
+                out.release()
+            if writer is not None:
+                writer.close()
+            self.elapsed = time.perf_counter() - start
+            # 部分视频的 CAP_PROP_FRAME_COUNT 不准确，结束时以实际帧数为准
+            if self.status == 'done':
+                self.total_frames = self.frames_done
+            decode = (f"{self.decode_stats['total_ms']} ms/frame ({self.decode_stats['backend']})"
+                      if self.decode_stats else 'n/a')
+            logger.info(f"🎬 Video job {self.status}: {self.frames_done} frames in {self.elapsed:.1f}s "
+                        f"({self.fps:.1f} FPS) | decode {decode} | inference {self.infer_ms_per_frame:.1f} ms/frame")
+
+    def _process_batch(self, frames: list, out, writer: DetectionWriter):
+        t0 = time.perf_counter()
+        with self.predict_lock:
+            results = self.model.predict(frames, verbose=False, **self.predict_args)
+        self.infer_seconds += time.perf_counter() - t0
+        for result in results:
+            annotated = result.plot()
+            out.write(annotated)
+            writer.write_result(f"frame_{self.frames_done:06d}", result, path=self.video_path)
+            self.detections += len(result.boxes)
+            self.frames_done += 1
+
+        now = time.perf_counter()
+        if now - self._last_preview >= self.preview_interval:
+            self._last_preview = now
+            h, w = annotated.shape[:2]
+            scale = min(1.0, self.preview_width / w)
+            small = cv2.resize(annotated, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA)
+            self.preview = cv2.cvtColor(small, cv2.COLOR_BGR2RGB)
@@ -0,0 +1,14 @@
+# -*- coding: utf-8 -*-
+"""
+测试公共配置：src/ 下的模块以脚本方式互相导入（from config import ...），测试时同样把 src 加入搜索路径
+
+运行:
+    python -m pytest -q tests
+"""
+
+import sys
+from pathlib import Path
+
+SRC_DIR = Path(__file__).resolve().parent.parent / 'src'
+if str(SRC_DIR) not in sys.path:
+    sys.path.insert(0, str(SRC_DIR))
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""config: 覆盖优先级（--set > 环境变量 > config.yaml > 默认值）与校验"""
+
+import os
+import argparse
+
+import pytest
+import yaml
+
+from config import DEFAULT_CONFIG, add_config_args, config_from_args, load_config, pick
+
+
+@pytest.fixture
+def config_file(tmp_path):
+    path = tmp_path / 'config.yaml'
+    path.write_text(yaml.safe_dump({'detection': {'max_det': 200, 'img_size': 960}}), encoding='utf-8')
+    return path
+
+
+@pytest.fixture(autouse=True)
+def clean_env(monkeypatch):
+    """测试不受运行环境中 MY_YOLO_ 变量的影响"""
+    for name in list(os.environ):
+        if name.startswith('MY_YOLO_'):
+            monkeypatch.delenv(name)
+
+
+def test_missing_file_uses_defaults(tmp_path):
+    cfg = load_config(str(tmp_path / 'missing.yaml'))
+    assert cfg['detection'] == DEFAULT_CONFIG['detection']
+
+
+def test_file_overrides_defaults_and_keeps_missing_keys(config_file):
+    cfg = load_config(str(config_file))
+    assert cfg['detection']['max_det'] == 200
+    assert cfg['detection']['img_size'] == 960
+    assert cfg['detection']['conf_threshold'] == DEFAULT_CONFIG['detection']['conf_threshold']
+
+
+def test_env_overrides_file(config_file, monkeypatch):
+    monkeypatch.setenv('MY_YOLO_DETECTION__MAX_DET', '150')
+    assert load_config(str(config_file))['detection']['max_det'] == 150
+    assert load_config(str(config_file), use_env=False)['detection']['max_det'] == 200
+
+
+def test_set_overrides_env(config_file, monkeypatch):
+    monkeypatch.setenv('MY_YOLO_DETECTION__MAX_DET', '150')
+    parser = argparse.ArgumentParser()
+    add_config_args(parser)
+    args = parser.parse_args(['--config', str(config_file), '--set', 'detection.max_det=100',
+                              '--set', 'applications.counter.classes=[person, car]'])
+    cfg = config_from_args(args)
+    assert cfg['detection']['max_det'] == 100
+    assert cfg['applications']['counter']['classes'] == ['person', 'car']
+
+
+def test_command_line_option_beats_config():
+    assert pick(None, 300) == 300
+    assert pick(50, 300) == 50
+    assert pick(0, 300) == 0
+
+
+def test_file_changes_are_picked_up(config_file):
+    assert load_config(str(config_file))['detection']['max_det'] == 200
+    config_file.write_text(yaml.safe_dump({'detection': {'max_det': 250, 'img_size': 960}}), encoding='utf-8')
+    st = os.stat(config_file)
+    os.utime(config_file, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+    assert load_config(str(config_file))['detection']['max_det'] == 250
+
+
+def test_returned_config_is_an_independent_copy(config_file):
+    load_config(str(config_file))['detection']['max_det'] = 1
+    assert load_config(str(config_file))['detection']['max_det'] == 200
+
+
+def test_int_is_accepted_for_float_fields(tmp_path):
+    cfg = load_config(str(tmp_path / 'missing.yaml'), ['detection.conf_threshold=1'])
+    assert cfg['detection']['conf_threshold'] == 1.0
+    assert isinstance(cfg['detection']['conf_threshold'], float)
+
+
+def test_training_cache_true_means_ram(tmp_path):
+    assert load_config(str(tmp_path / 'missing.yaml'), ['training.cache=true'])['training']['cache'] == 'ram'
+
+
+def test_all_errors_are_reported_together(tmp_path):
+    with pytest.raises(ValueError) as excinfo:
+        load_config(str(tmp_path / 'missing.yaml'),
+                    ['detection.max_det=0', 'detection.half=maybe', 'video_io.backend=gstreamer'])
+    message = str(excinfo.value)
+    assert 'detection.max_det' in message
+    assert 'detection.half' in message
+    assert 'video_io.backend' in message
+
+
+def test_malformed_override_is_rejected(tmp_path):
+    with pytest.raises(ValueError, match='expected section.key=value'):
+        load_config(str(tmp_path / 'missing.yaml'), ['detection.max_det'])
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""counter: IoU 跟踪与越线计数（每个轨迹只计一次）"""
+
+import json
+
+import pytest
+
+np = pytest.importorskip('numpy')
+pytest.importorskip('cv2')
+
+from counter import IoUTracker, LineCounter, box_iou, greedy_match  # noqa: E402
+
+HEIGHT = 100
+NAMES = {0: 'person', 1: 'car'}
+
+
+def _box(cy, cx=50.0, size=10.0):
+    return [cx - size / 2, cy - size / 2, cx + size / 2, cy + size / 2]
+
+
+def _counter(**kwargs):
+    counter = LineCounter(report_interval=1e9, **kwargs)
+    counter._resolve_classes(NAMES)
+    return counter
+
+
+def _run(counter, frames):
+    """frames: 每帧 [(cy, cls), ...]；物体每帧移动 2 像素，相邻帧的框高度重叠"""
+    for dets in frames:
+        boxes = [_box(cy, cx=cx) for cy, cls, cx in dets]
+        classes = [cls for _, cls, _ in dets]
+        counter.update(np.array(boxes, dtype=np.float32), np.array(classes), HEIGHT)
+    return counter.counts
+
+
+def _track(ys, cls=0, cx=50.0):
+    return [(y, cls, cx) for y in ys]
+
+
+def test_box_iou():
+    a = np.array([[0, 0, 10, 10]], dtype=np.float32)
+    b = np.array([[0, 0, 10, 10], [5, 0, 15, 10], [20, 20, 30, 30]], dtype=np.float32)
+    np.testing.assert_allclose(box_iou(a, b), [[1.0, 50 / 150, 0.0]], rtol=1e-6)
+
+
+def test_greedy_match_prefers_highest_iou():
+    iou = np.array([[0.9, 0.8], [0.85, 0.1]])
+    rows, cols = greedy_match(iou, 0.3)
+    assert sorted(zip(rows.tolist(), cols.tolist())) == [(0, 0)]
+
+
+def test_tracker_keeps_identity_and_expires_tracks():
+    tracker = IoUTracker(max_age=1)
+    first = tracker.update(np.array([_box(20)]), np.array([0]))
+    assert len(first['ids']) == 0 and len(tracker) == 1
+    second = tracker.update(np.array([_box(22)]), np.array([0]))
+    assert second['ids'].tolist() == [1]
+    tracker.update(np.zeros((0, 4)), np.zeros(0))
+    removed = tracker.update(np.zeros((0, 4)), np.zeros(0))['removed']
+    assert removed.tolist() == [1] and len(tracker) == 0
+
+
+def test_tracker_does_not_match_across_classes():
+    tracker = IoUTracker()
+    tracker.update(np.array([_box(20)]), np.array([0]))
+    assert len(tracker.update(np.array([_box(20)]), np.array([1]))['ids']) == 0
+    assert len(tracker) == 2
+
+
+def test_counts_downward_and_upward_crossings():
+    counter = _counter()
+    down = _track(range(40, 62, 2))
+    up = _track(range(60, 38, -2), cls=1, cx=10.0)
+    counts = _run(counter, [[d, u] for d, u in zip(down, up)])
+    assert counts == {'person': {'in': 1, 'out': 0}, 'car': {'in': 0, 'out': 1}}
+
+
+def test_each_track_is_counted_once_even_when_it_jitters_on_the_line():
+    counter = _counter()
+    ys = [44, 46, 48, 50, 48, 50, 52, 50, 52, 54]
+    assert _run(counter, [[x] for x in _track(ys)]) == {'person': {'in': 1, 'out': 0}}
+
+
+def test_only_configured_classes_are_counted():
+    counter = _counter(classes=['car'])
+    frames = [[p, c] for p, c in zip(_track(range(40, 62, 2)), _track(range(40, 62, 2), cls=1, cx=10.0))]
+    assert _run(counter, frames) == {'car': {'in': 1, 'out': 0}}
+
+
+def test_line_position_is_normalized_to_frame_height():
+    counter = _counter(line_position=0.8)
+    assert _run(counter, [[x] for x in _track(range(40, 62, 2))]) == {}
+    assert _run(counter, [[x] for x in _track(range(70, 92, 2), cx=80.0)]) == {'person': {'in': 1, 'out': 0}}
+
+
+def test_report_writes_jsonl(tmp_path):
+    output = tmp_path / 'counts.jsonl'
+    counter = _counter(output_path=output)
+    _run(counter, [[x] for x in _track(range(40, 62, 2))])
+    counter.close()
+    record = json.loads(output.read_text(encoding='utf-8').splitlines()[-1])
+    assert record['counts'] == {'person': {'in': 1, 'out': 0}}
+    assert record['frames'] == 11
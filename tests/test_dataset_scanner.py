@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""dataset_scanner: 单张图片/标签的问题分类与增量扫描"""
+
+import os
+
+import pytest
+
+pytest.importorskip('numpy')
+Image = pytest.importorskip('PIL.Image')
+
+from dataset_scanner import DatasetScanner, label_path_for, scan_file  # noqa: E402
+
+
+def _make_image(path, size=(64, 48), color=(120, 80, 40)):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    Image.new('RGB', size, color).save(path)
+    return path
+
+
+def _scan(tmp_path, label_text, nc=3, name='a.jpg', color=(120, 80, 40)):
+    image = _make_image(tmp_path / 'images' / name, color=color)
+    if label_text is not None:
+        label = tmp_path / 'labels' / (image.stem + '.txt')
+        label.parent.mkdir(parents=True, exist_ok=True)
+        label.write_text(label_text, encoding='utf-8')
+    return scan_file((str(image), nc))
+
+
+def _kinds(record):
+    return [issue.split(':', 1)[0] for issue in record['issues']]
+
+
+def test_label_path_follows_ultralytics_rule():
+    path = os.path.join('data', 'images', 'train', 'images', 'x.jpg')
+    assert label_path_for(path) == os.path.join('data', 'images', 'train', 'labels', 'x.txt')
+
+
+def test_valid_label(tmp_path):
+    record = _scan(tmp_path, "0 0.5 0.5 0.2 0.4\n2 0.1 0.1 0.1 0.1\n")
+    assert record['issues'] == []
+    assert (record['width'], record['height']) == (64, 48)
+    assert sorted(box[0] for box in record['boxes']) == [0, 2]
+
+
+@pytest.mark.parametrize('label_text, kind', [
+    (None, 'missing_label'),
+    ('', 'empty_label'),
+    ('0 0.5 0.5 abc 0.4\n', 'bad_label_format'),
+    ('0 0.5 0.5 0.2\n', 'bad_label_format'),
+    ('0 nan 0.5 0.2 0.4\n', 'bad_label_format'),
+    ('inf 0.5 0.5 0.2 0.4\n', 'bad_label_format'),
+    ('nan 0.5 0.5 0.2 0.4\n', 'bad_label_format'),
+    ('3 0.5 0.5 0.2 0.4\n', 'class_out_of_range'),
+    ('-1 0.5 0.5 0.2 0.4\n', 'class_out_of_range'),
+    ('1.5 0.5 0.5 0.2 0.4\n', 'class_out_of_range'),
+    ('0 1.2 0.5 0.2 0.4\n', 'coords_out_of_range'),
+    ('0 0.5 0.5 0.0 0.4\n', 'zero_size_box'),
+    ('0 0.5 0.5 0.2 0.4\n0 0.5 0.5 0.2 0.4\n', 'duplicate_labels'),
+])
+def test_issue_classification(tmp_path, label_text, kind):
+    assert _kinds(_scan(tmp_path, label_text)) == [kind]
+
+
+def test_segment_label_uses_polygon_extent(tmp_path):
+    record = _scan(tmp_path, "1 0.1 0.2 0.5 0.2 0.5 0.6\n")
+    assert record['issues'] == []
+    cls, w, h = record['boxes'][0]
+    assert (cls, w, h) == (1, pytest.approx(0.4), pytest.approx(0.4))
+
+
+def test_corrupt_image(tmp_path):
+    image = tmp_path / 'images' / 'broken.jpg'
+    image.parent.mkdir(parents=True)
+    image.write_bytes(b'not a jpeg')
+    assert _kinds(scan_file((str(image), 3))) == ['corrupt_image']
+
+
+def test_rescan_reuses_unchanged_files(tmp_path):
+    for name, color in (('a.jpg', (0, 0, 0)), ('b.jpg', (255, 255, 255))):
+        _scan(tmp_path / 'ds', "0 0.5 0.5 0.2 0.4\n", name=name, color=color)
+    scanner = DatasetScanner(tmp_path / 'ds' / 'images', index_path=tmp_path / 'index.json', workers=1, nc=3)
+    first = scanner.scan()
+    assert (first['scan']['rescanned'], first['errors']) == (2, 0)
+
+    label = tmp_path / 'ds' / 'labels' / 'b.txt'
+    label.write_text("7 0.5 0.5 0.2 0.4\n", encoding='utf-8')   # 大小不变，只有 mtime 变化
+    st = os.stat(label)
+    os.utime(label, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+    second = scanner.scan()
+    assert (second['scan']['rescanned'], second['scan']['reused']) == (1, 1)
+    assert second['errors'] == 1
+    assert list(second['issues']) == ['class_out_of_range']
+
+
+def test_duplicate_images_are_reported(tmp_path):
+    for name in ('a.jpg', 'b.jpg'):
+        _scan(tmp_path / 'ds', "0 0.5 0.5 0.2 0.4\n", name=name)
+    report = DatasetScanner(tmp_path / 'ds' / 'images', index_path=tmp_path / 'index.json', workers=1, nc=3).scan()
+    assert report['errors'] == 0
+    assert len(report['issues']['duplicate_image']) == 1
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""DetectionCache: 缓存键、LRU 淘汰与库内总大小"""
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+import detection_cache  # noqa: E402
+from detection_cache import DetectionCache  # noqa: E402
+
+
+def _boxes(n: int):
+    boxes = np.arange(n * 4, dtype=np.float32).reshape(n, 4)
+    return boxes, np.arange(n) % 3, np.linspace(0.3, 0.9, n, dtype=np.float32)
+
+
+@pytest.fixture
+def weights(tmp_path):
+    path = tmp_path / 'model.pt'
+    path.write_bytes(b'weights-v1')
+    return path
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """单调递增的假时钟，保证 last_access 的先后顺序确定"""
+    now = [1000.0]
+
+    def fake_time():
+        now[0] += 1.0
+        return now[0]
+
+    monkeypatch.setattr(detection_cache.time, 'time', fake_time)
+    return now
+
+
+def test_round_trip(tmp_path, weights):
+    boxes, classes, scores = _boxes(3)
+    with DetectionCache(tmp_path / 'cache.db', weights) as cache:
+        cache.put('img', 0.25, 0.7, 640, boxes, classes, scores, (480, 640))
+        hit = cache.get('img', 0.25, 0.7, 640)
+    assert hit is not None
+    np.testing.assert_array_equal(hit['boxes'], boxes)
+    np.testing.assert_array_equal(hit['classes'], classes)
+    np.testing.assert_allclose(hit['scores'], scores)
+    assert hit['shape'] == (480, 640)
+
+
+@pytest.mark.parametrize('changed', [
+    {'conf': 0.3}, {'iou': 0.5}, {'imgsz': 1280}, {'max_det': 100}, {'half': True},
+])
+def test_every_predict_arg_is_part_of_the_key(tmp_path, weights, changed):
+    args = {'conf': 0.25, 'iou': 0.7, 'imgsz': 640, 'max_det': 300, 'half': False}
+    with DetectionCache(tmp_path / 'cache.db', weights) as cache:
+        cache.put('img', args['conf'], args['iou'], args['imgsz'], *_boxes(2), (10, 10),
+                  max_det=args['max_det'], half=args['half'])
+        args.update(changed)
+        assert cache.get('img', **args) is None
+        assert cache.misses == 1
+
+
+def test_weights_change_invalidates_entries(tmp_path, weights):
+    db = tmp_path / 'cache.db'
+    with DetectionCache(db, weights) as cache:
+        cache.put('img', 0.25, 0.7, 640, *_boxes(2), (10, 10))
+    weights.write_bytes(b'weights-v2')
+    with DetectionCache(db, weights) as cache:
+        assert cache.get('img', 0.25, 0.7, 640) is None
+        assert cache.total_bytes == 0
+
+
+def test_lru_eviction_keeps_total_bytes_consistent(tmp_path, weights, clock):
+    boxes, classes, scores = _boxes(4)
+    entry_bytes = boxes.nbytes + classes.astype(np.int16).nbytes + scores.nbytes
+    # 上限容纳 3 条；第 4 条写入后淘汰到上限的 90% 以下，即只剩 2 条
+    with DetectionCache(tmp_path / 'cache.db', weights, max_size_mb=3.2 * entry_bytes / 1024 / 1024) as cache:
+        for name in ('a', 'b', 'c'):
+            cache.put(name, 0.25, 0.7, 640, boxes, classes, scores, (10, 10))
+        assert cache.get('a', 0.25, 0.7, 640) is not None     # a 变为最近使用
+        cache.put('d', 0.25, 0.7, 640, boxes, classes, scores, (10, 10))
+
+        assert cache.get('b', 0.25, 0.7, 640) is None
+        assert cache.get('c', 0.25, 0.7, 640) is None
+        assert cache.get('a', 0.25, 0.7, 640) is not None
+        assert cache.get('d', 0.25, 0.7, 640) is not None
+        stored = cache._conn.execute("SELECT SUM(nbytes) FROM detections").fetchone()[0]
+        assert cache.total_bytes == stored == 2 * entry_bytes
+
+
+def test_replacing_an_entry_does_not_double_count(tmp_path, weights):
+    with DetectionCache(tmp_path / 'cache.db', weights) as cache:
+        cache.put('img', 0.25, 0.7, 640, *_boxes(5), (10, 10))
+        cache.put('img', 0.25, 0.7, 640, *_boxes(2), (10, 10))
+        stored = cache._conn.execute("SELECT SUM(nbytes) FROM detections").fetchone()[0]
+        assert cache.total_bytes == stored
+
+
+def test_two_connections_share_one_database(tmp_path, weights):
+    db = tmp_path / 'cache.db'
+    with DetectionCache(db, weights) as first, DetectionCache(db, weights) as second:
+        first.put('a', 0.25, 0.7, 640, *_boxes(1), (10, 10))
+        second.put('b', 0.25, 0.7, 640, *_boxes(1), (10, 10))
+        assert second.get('a', 0.25, 0.7, 640) is not None
+        assert first.get('b', 0.25, 0.7, 640) is not None
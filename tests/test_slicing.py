@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""slicing: 切片窗口、截断框识别与跨切片合并"""
+
+import pytest
+
+torch = pytest.importorskip('torch')
+pytest.importorskip('torchvision')
+pytest.importorskip('numpy')
+
+from slicing import merge_cut_boxes, merge_detections, tile_grid, touches_tile_edge  # noqa: E402
+
+
+def _t(rows):
+    return torch.tensor(rows, dtype=torch.float32)
+
+
+@pytest.mark.parametrize('height, width', [(1080, 1920), (640, 640), (700, 1300), (3000, 4000)])
+def test_tile_grid_covers_image_with_full_size_tiles(height, width):
+    tile, overlap = 640, 0.2
+    windows = tile_grid(height, width, tile, overlap)
+    covered = torch.zeros(height, width, dtype=torch.bool)
+    for x0, y0, x1, y1 in windows:
+        assert (x1 - x0, y1 - y0) == (min(tile, width), min(tile, height))
+        assert 0 <= x0 and 0 <= y0 and x1 <= width and y1 <= height
+        covered[y0:y1, x0:x1] = True
+    assert bool(covered.all())
+
+
+def test_tile_grid_overlap_and_small_images():
+    windows = tile_grid(640, 1200, 640, 0.25)
+    assert [w[0] for w in windows] == [0, 480, 560]    # 步长 480，末尾切片向内对齐
+    assert tile_grid(300, 400, 640, 0.2) == [(0, 0, 400, 300)]
+
+
+def test_touches_tile_edge_ignores_image_border():
+    boxes = _t([[0, 100, 50, 150],        # 贴住原图左边界：不算截断
+                [590, 100, 639, 150],     # 贴住切片右边界（内部边界）
+                [200, 200, 300, 300]])    # 切片内部
+    cut = touches_tile_edge(boxes, (0, 0, 640, 640), width=1200, height=640)
+    assert cut.tolist() == [False, True, False]
+
+
+def test_cut_halves_are_merged_into_one_box():
+    # 目标 x 跨 [560, 700]，左切片 [0, 640) 只看到 [560, 640]，右切片 [560, 1200) 看到完整目标
+    boxes = _t([[560, 100, 640, 200], [560, 100, 700, 200]])
+    scores = _t([0.6, 0.9])
+    classes = _t([0, 0])
+    cut = torch.tensor([True, False])
+    # 两框 IoU 只有 0.57，普通 NMS (iou=0.7) 无法去重
+    assert len(merge_detections(boxes, scores, classes, iou=0.7)) == 2
+    merged = merge_detections(boxes, scores, classes, iou=0.7, cut=cut, merge_ios=0.6)
+    assert merged.tolist() == [[560, 100, 700, 200, pytest.approx(0.9), 0.0]]
+
+
+def test_two_partial_boxes_become_their_union():
+    boxes = _t([[500, 100, 640, 200], [560, 100, 760, 200]])
+    merged, scores, _ = merge_cut_boxes(boxes, _t([0.8, 0.7]), _t([1, 1]),
+                                        torch.tensor([True, True]), ios=0.5)
+    assert merged.tolist() == [[500, 100, 760, 200]]
+    assert scores.tolist() == [pytest.approx(0.8)]
+
+
+def test_uncut_overlapping_boxes_are_left_to_nms():
+    # 同类目标互相包含，但都不贴切片边界：保留两者，交给 NMS
+    boxes = _t([[100, 100, 300, 300], [150, 150, 200, 200]])
+    merged, _, _ = merge_cut_boxes(boxes, _t([0.9, 0.8]), _t([0, 0]), torch.tensor([False, False]), ios=0.6)
+    assert len(merged) == 2
+
+
+def test_different_classes_are_never_merged():
+    boxes = _t([[560, 100, 640, 200], [560, 100, 700, 200]])
+    merged, _, _ = merge_cut_boxes(boxes, _t([0.6, 0.9]), _t([0, 1]), torch.tensor([True, False]), ios=0.6)
+    assert len(merged) == 2
+
+
+def test_merge_disabled_with_zero_threshold():
+    boxes = _t([[560, 100, 640, 200], [560, 100, 700, 200]])
+    merged, _, _ = merge_cut_boxes(boxes, _t([0.6, 0.9]), _t([0, 0]), torch.tensor([True, False]), ios=0.0)
+    assert len(merged) == 2
+
+
+def test_merge_detections_output_format_and_max_det():
+    boxes = _t([[i * 20, 0, i * 20 + 10, 10] for i in range(5)])
+    scores = _t([0.1, 0.5, 0.3, 0.9, 0.7])
+    out = merge_detections(boxes, scores, _t([0, 1, 0, 1, 0]), iou=0.5, max_det=3)
+    assert out.shape == (3, 6)
+    assert out[:, 4].tolist() == pytest.approx([0.9, 0.7, 0.5])
+    assert merge_detections(torch.zeros((0, 4)), torch.zeros(0), torch.zeros(0), iou=0.5).shape == (0, 6)
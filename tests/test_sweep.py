@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""sweep: 试验生成、增强强度换算、指标读取与中位数剪枝"""
+
+import csv
+import math
+
+import pytest
+import yaml
+
+from sweep import AUG_PRESETS, MedianPruner, aug_args, generate_trials, load_spec, read_metric_history
+
+METRIC = 'metrics/mAP50-95(B)'
+
+
+def _spec(tmp_path, **spec):
+    path = tmp_path / 'sweep.yaml'
+    path.write_text(yaml.safe_dump(spec), encoding='utf-8')
+    return load_spec(path)
+
+
+def _write_history(sweep_dir, trial_id, values):
+    path = sweep_dir / trial_id / 'results.csv'
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['epoch', f"   {METRIC}"])   # ultralytics 的列名带前导空格
+        for epoch, value in enumerate(values, 1):
+            writer.writerow([epoch, value])
+
+
+class FakeTrainer:
+    def __init__(self):
+        self.metrics = {}
+        self.stop = False
+
+
+def test_grid_enumerates_every_combination(tmp_path):
+    spec = _spec(tmp_path, space={'lr0': [0.01, 0.001], 'batch': [8, 16, 32]})
+    trials = generate_trials(spec)
+    assert len(trials) == 6
+    assert [t['id'] for t in trials[:2]] == ['trial_000', 'trial_001']
+    assert {(t['params']['lr0'], t['params']['batch']) for t in trials} == \
+        {(lr, b) for lr in (0.01, 0.001) for b in (8, 16, 32)}
+
+
+def test_grid_rejects_ranges(tmp_path):
+    with pytest.raises(ValueError, match='value lists'):
+        _spec(tmp_path, space={'lr0': {'low': 0.001, 'high': 0.1}})
+
+
+def test_random_is_seeded_unique_and_in_range(tmp_path):
+    space = {'lr0': {'low': 1e-4, 'high': 1e-1, 'log': True},
+             'batch': {'low': 4, 'high': 64, 'int': True},
+             'aug': ['light', 'heavy']}
+    spec = _spec(tmp_path, strategy='random', trials=12, seed=7, space=space)
+    trials = generate_trials(spec)
+    assert trials == generate_trials(spec)
+    assert len(trials) == 12
+    assert len({tuple(sorted(t['params'].items())) for t in trials}) == 12
+    for t in trials:
+        assert 1e-4 <= t['params']['lr0'] <= 1e-1
+        assert isinstance(t['params']['batch'], int) and 4 <= t['params']['batch'] <= 64
+        assert t['params']['aug'] in ('light', 'heavy')
+
+
+def test_random_stops_when_discrete_space_is_exhausted(tmp_path):
+    spec = _spec(tmp_path, strategy='random', trials=10, space={'batch': [8, 16]})
+    assert sorted(t['params']['batch'] for t in generate_trials(spec)) == [8, 16]
+
+
+def test_aug_presets_and_numeric_strength():
+    assert aug_args('default') == AUG_PRESETS['default']
+    with pytest.raises(ValueError):
+        aug_args('extreme')
+    strong = aug_args(2.0)
+    assert strong['fliplr'] == 0.5            # 翻转概率不随强度缩放
+    assert strong['mosaic'] == 1.0 and strong['hsv_s'] == 1.0   # 概率类参数截断到 1
+    assert strong['degrees'] == 0.0 and strong['translate'] == pytest.approx(0.2)
+    assert aug_args(0.5)['fliplr'] == 0.5
+    assert aug_args(0)['fliplr'] == 0.0
+
+
+def test_read_metric_history_strips_header_and_marks_bad_rows(tmp_path):
+    _write_history(tmp_path, 'trial_000', [0.1, 'oops', 0.3])
+    history = read_metric_history(tmp_path / 'trial_000' / 'results.csv', METRIC)
+    assert history[0] == 0.1 and math.isnan(history[1]) and history[2] == 0.3
+    assert read_metric_history(tmp_path / 'missing.csv', METRIC) == []
+
+
+def _run_pruner(tmp_path, own, peers, **kwargs):
+    for i, values in enumerate(peers, 1):
+        _write_history(tmp_path, f"trial_{i:03d}", values)
+    pruner = MedianPruner(tmp_path, 'trial_000', METRIC, **{'min_epochs': 3, 'min_trials': 3, **kwargs})
+    trainer = FakeTrainer()
+    for value in own:
+        if trainer.stop:
+            break
+        trainer.metrics = {METRIC: value}
+        pruner(trainer)
+    return pruner, trainer
+
+
+def test_pruner_stops_trial_below_peer_median(tmp_path):
+    peers = [[0.2, 0.4, 0.5, 0.6]] * 3
+    pruner, trainer = _run_pruner(tmp_path, [0.1, 0.1, 0.1, 0.1], peers)
+    assert trainer.stop and pruner.pruned_at == 3
+
+
+def test_pruner_waits_for_min_epochs_and_peers(tmp_path):
+    # 只有两个同伴达到该 epoch，不足 min_trials，不剪枝
+    peers = [[0.5, 0.5, 0.5, 0.5], [0.5, 0.5, 0.5, 0.5], [0.5]]
+    pruner, trainer = _run_pruner(tmp_path, [0.1, 0.1, 0.1, 0.1], peers)
+    assert not trainer.stop and pruner.pruned_at is None
+
+
+def test_pruner_compares_best_so_far(tmp_path):
+    # 当前 epoch 回落，但至今最佳仍不低于同伴中位数
+    peers = [[0.2, 0.3, 0.3], [0.2, 0.3, 0.35], [0.2, 0.3, 0.4]]
+    pruner, trainer = _run_pruner(tmp_path, [0.5, 0.2, 0.1], peers)
+    assert not trainer.stop
+
+
+def test_pruner_ignores_its_own_results(tmp_path):
+    _write_history(tmp_path, 'trial_000', [0.9, 0.9, 0.9])
+    peers = [[0.2, 0.2, 0.2]] * 2
+    pruner, trainer = _run_pruner(tmp_path, [0.1, 0.1, 0.1], peers)
+    assert not trainer.stop    # 只有 2 个同伴，自身的 results.csv 不计入